@@ -1,80 +1,75 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext
-from datetime import datetime
-import os
-import webbrowser
-
-# File names for data storage
-MENU_FILE = "cafe_menu.txt"
-ORDERS_FILE = "cafe_orders.txt"
-INVENTORY_FILE = "cafe_inventory.txt"
+from tkinter import ttk, messagebox
+from datetime import datetime, timedelta
+import time
+
+import coordinator
+import metrics
+from menu_index import MenuIndex
+import money
+import order_log
+import persistence
+import startup_cache
+import storage
+from order_book import OrderError, TicketManager, make_order
+from order_table import OrderTable
+
+# webbrowser, tkinter.scrolledtext, kitchen and reports (which loads NumPy) are imported
+# where they are used, so the login screen doesn't wait for them
+
+# Storage backend (text files or SQLite), opened by initialize_files()
+store = None
 
 # Global variables
-current_order_items = []
-current_order_total = 0.0
+tickets = None  # TicketManager with the open orders, created in main()
 order_counter = 1
+ORDER_PAGE_SIZE = 100  # Orders fetched at a time by the history window
+MENU_MATCHES = 200  # Items listed at most while searching the menu
 
 
 # Initialize files if they don't exist
 def initialize_files():
-    # Menu file
-    if not os.path.exists(MENU_FILE):
-        with open(MENU_FILE, "w") as file:
-            file.write("Coffee,50\nTea,30\nSandwich,120\nCake,80\nBurger,150\nFries,60\nJuice,70\nWater,20\n")
-
-    # Orders file
-    if not os.path.exists(ORDERS_FILE):
-        with open(ORDERS_FILE, "w") as file:
-            file.write("")
-
-    # Inventory file
-    if not os.path.exists(INVENTORY_FILE):
-        with open(INVENTORY_FILE, "w") as file:
-            file.write("Coffee,100\nTea,100\nSandwich,50\nCake,30\nBurger,50\nFries,80\nJuice,60\nWater,100\n")
+    global store
+    if store is None:
+        store = storage.open_storage()
+    store.initialize()
 
 
 # Load menu from file
+@metrics.timed("cafe_load_menu_seconds")
 def load_menu():
-    menu_items = {}
     try:
-        with open(MENU_FILE, "r") as file:
-            for line in file:
-                line = line.strip()
-                if line:
-                    parts = line.split(",")
-                    if len(parts) >= 2:
-                        item_name = parts[0].strip()
-                        price = float(parts[1].strip())
-                        menu_items[item_name] = price
+        return store.load_menu()
     except Exception as e:
         messagebox.showerror("Error", f"Failed to load menu: {e}")
-    return menu_items
+        return {}
 
 
 # Load inventory from file
+@metrics.timed("cafe_load_inventory_seconds")
 def load_inventory():
-    inventory = {}
     try:
-        with open(INVENTORY_FILE, "r") as file:
-            for line in file:
-                line = line.strip()
-                if line:
-                    parts = line.split(",")
-                    if len(parts) >= 2:
-                        item_name = parts[0].strip()
-                        quantity = int(parts[1].strip())
-                        inventory[item_name] = quantity
+        return store.load_inventory()
     except Exception as e:
         messagebox.showerror("Error", f"Failed to load inventory: {e}")
-    return inventory
+        return {}
+
+
+# Load recipes (menu item -> ingredients) from file
+@metrics.timed("cafe_load_recipes_seconds")
+def load_recipes():
+    try:
+        return store.load_recipes()
+    except Exception as e:
+        messagebox.showerror("Error", f"Failed to load recipes: {e}")
+        return {}
 
 
 # Save inventory to file
+@metrics.timed("cafe_save_inventory_seconds")
 def save_inventory(inventory):
     try:
-        with open(INVENTORY_FILE, "w") as file:
-            for item, quantity in inventory.items():
-                file.write(f"{item},{quantity}\n")
+        store.save_inventory(inventory)
         return True
     except Exception as e:
         messagebox.showerror("Error", f"Failed to save inventory: {e}")
@@ -82,68 +77,91 @@ def save_inventory(inventory):
 
 
 # Save order to file
+@metrics.timed("cafe_save_order_seconds")
 def save_order(order_id, customer_name, items, total_amount, status):
     try:
-        with open(ORDERS_FILE, "a") as file:
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            items_str = ";".join([f"{item['name']}:{item['quantity']}:{item['price']}" for item in items])
-            file.write(f"{order_id},{timestamp},{customer_name},{items_str},{total_amount},{status}\n")
+        store.append_order(make_order(order_id, customer_name, items, total_amount, status))
+        return True
+    except Exception as e:
+        messagebox.showerror("Error", f"Failed to save order: {e}")
+        return False
+
+
+# Save a sale: the stock change and the order are committed together
+@metrics.timed("cafe_commit_order_seconds")
+def commit_order(order):
+    try:
+        store.commit_order(order)
         return True
+    except storage.StockError as e:
+        messagebox.showwarning("Warning", str(e))
+        return False
     except Exception as e:
         messagebox.showerror("Error", f"Failed to save order: {e}")
         return False
 
 
-# Load orders from file
-def load_orders():
-    orders = []
+# Load orders from file, held as compact columns (see order_table) but read like dicts
+@metrics.timed("cafe_load_orders_seconds")
+def load_orders(since=None, until=None, customer=None, status=None):
+    return OrderTable(iter_orders(since=since, until=until, customer=customer, status=status))
+
+
+# Stream orders one at a time, filtered by date range, customer and status
+def iter_orders(since=None, until=None, customer=None, status=None):
+    try:
+        yield from store.iter_orders(since=since, until=until, customer=customer, status=status)
+    except Exception as e:
+        messagebox.showerror("Error", f"Failed to load orders: {e}")
+
+
+# Load one page of order summaries for the history window, sorted and filtered by the backend
+def load_order_page(offset, limit, since=None, until=None, customer=None, status=None, sort="time", descending=True,
+                    search=None):
     try:
-        with open(ORDERS_FILE, "r") as file:
-            for line in file:
-                line = line.strip()
-                if line:
-                    parts = line.split(",")
-                    if len(parts) >= 6:
-                        order_id = parts[0].strip()
-                        timestamp = parts[1].strip()
-                        customer_name = parts[2].strip()
-                        items_str = parts[3].strip()
-                        total_amount = float(parts[4].strip())
-                        status = parts[5].strip()
-
-                        # Parse items
-                        items = []
-                        if items_str:
-                            item_parts = items_str.split(";")
-                            for item_part in item_parts:
-                                item_details = item_part.split(":")
-                                if len(item_details) >= 3:
-                                    item_name = item_details[0]
-                                    quantity = int(item_details[1])
-                                    price = float(item_details[2])
-                                    items.append({
-                                        "name": item_name,
-                                        "quantity": quantity,
-                                        "price": price
-                                    })
-
-                        orders.append({
-                            "id": order_id,
-                            "timestamp": timestamp,
-                            "customer": customer_name,
-                            "items": items,
-                            "total": total_amount,
-                            "status": status
-                        })
+        return store.order_page(offset, limit, since=since, until=until, customer=customer,
+                                status=status, sort=sort, descending=descending, search=search)
     except Exception as e:
         messagebox.showerror("Error", f"Failed to load orders: {e}")
-    return orders
+        return []
+
+
+# Today's sales from the rollup tables, no need to scan the orders
+def load_today_totals():
+    try:
+        today = datetime.now().strftime("%Y-%m-%d")
+        for day, orders, quantity, revenue in store.daily_totals(since=today):
+            if day == today:
+                return orders, revenue
+        return 0, 0
+    except Exception:
+        return None
+
+
+# Sales figures for the reports window
+def load_sales_report(since=None, until=None):
+    try:
+        import reports
+        return reports.sales_report(reports.columns_for(store), since=since, until=until)
+    except Exception as e:
+        messagebox.showerror("Error", f"Failed to build the report: {e}")
+        return None
+
+
+# Load a single order without reading the rest of the history
+def load_order(order_id):
+    try:
+        return store.read_order(order_id)
+    except Exception as e:
+        messagebox.showerror("Error", f"Failed to load order {order_id}: {e}")
+        return None
 
 
 # Generate QR Code for payment
 def generate_qr_code():
     """Generate a QR code for the current order total"""
-    if not current_order_items:
+    current_order = tickets.active
+    if not current_order:
         messagebox.showwarning("Warning", "No items in the order. Please add items first.")
         return
 
@@ -156,13 +174,14 @@ def generate_qr_code():
     transaction_id = f"TXN{datetime.now().strftime('%Y%m%d%H%M%S')}"
 
     # Create payment details
-    payment_amount = current_order_total
+    payment_amount = current_order.total
+    order_items = current_order.items()
     payment_text = f"""
     CAFE BILL PAYMENT
 
     Transaction ID: {transaction_id}
     Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-    Total Amount: PKR {payment_amount:.2f}
+    Total Amount: PKR {money.text(payment_amount)}
 
     Please scan to pay
 
@@ -237,9 +256,11 @@ def generate_qr_code():
 
     # Create buttons for different payment methods
     def open_jazzcash():
+        import webbrowser
         webbrowser.open("https://www.jazzcash.com.pk/")
 
     def open_easypaisa():
+        import webbrowser
         webbrowser.open("https://www.easypaisa.com.pk/")
 
     tk.Button(methods_frame, text="JazzCash", command=open_jazzcash, bg="#FF6B00", fg="white", width=12).grid(row=0,
@@ -263,12 +284,12 @@ def generate_qr_code():
         ----------------------
         Items:
         """
-        for item in current_order_items:
-            receipt_text += f"{item['name']} x{item['quantity']}: PKR {item['total']:.2f}\n"
+        for item in order_items:
+            receipt_text += f"{item['name']} x{item['quantity']}: PKR {money.text(item['total'])}\n"
 
         receipt_text += f"""
         ----------------------
-        Total: PKR {payment_amount:.2f}
+        Total: PKR {money.text(payment_amount)}
         ======================
         Thank you for your payment!
         """
@@ -278,6 +299,7 @@ def generate_qr_code():
         receipt_window.title("Payment Receipt")
         receipt_window.geometry("400x400")
 
+        from tkinter import scrolledtext
         receipt_display = scrolledtext.ScrolledText(receipt_window, width=45, height=20)
         receipt_display.pack(padx=10, pady=10)
         receipt_display.insert(tk.END, receipt_text)
@@ -378,20 +400,40 @@ def login():
 
 # Main application
 def main():
+    startup_started = time.perf_counter()
+
     # Initialize data files
     initialize_files()
 
-    # Load data
-    menu_items = load_menu()
-    inventory = load_inventory()
-    orders = load_orders()
-
     # Global variables
-    global current_order_items
-    global current_order_total
+    global tickets
     global order_counter
 
-    order_counter = len(orders) + 1
+    # Load data: from the startup snapshot when none of the files changed since it was taken
+    snapshot = startup_cache.load(store)
+    if snapshot is not None:
+        menu_items = snapshot["menu"]
+        recipes = snapshot["recipes"]
+        inventory = snapshot["inventory"]
+        order_counter = snapshot["next_order_seq"]
+    else:
+        menu_items = load_menu()
+        recipes = load_recipes()
+        inventory = load_inventory()
+
+        # The storage backend knows the last order ID, no need to read the whole log
+        try:
+            order_counter = store.next_order_seq()
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to read order index: {e}")
+            order_counter = len(load_orders()) + 1
+
+        # Next time start from a snapshot, written off the main thread
+        startup_cache.refresh_in_background(store.name)
+    metrics.increment("cafe_startup_snapshot_hits" if snapshot is not None else "cafe_startup_snapshot_misses")
+
+    # Stock is per ingredient, tickets.stock keeps the units left of every menu item
+    tickets = TicketManager(menu_items, inventory, recipes)
 
     # Create main window
     root = tk.Tk()
@@ -399,32 +441,165 @@ def main():
     root.geometry("900x700")
     root.configure(bg="#f0f0f0")
 
+    # Saves run on a background thread, results come back through the Tk loop
+    writer = persistence.BackgroundWriter(lambda: storage.open_storage(store.name))
+    writer.attach(root)
+
+    # With CAFE_METRICS set, timings are written to a file every few seconds
+    metrics.attach(root)
+
+    # Other stations may share the data files: order IDs come from a shared
+    # counter and stock changes they make show up here
+    station = coordinator.Station(store, inventory, recipes=recipes)
+
+    def on_close():
+        """Finish pending saves before closing"""
+        writer.close()
+        # What the next start will read instead of the files
+        try:
+            startup_cache.save(startup_cache.build(store))
+        except Exception:
+            pass
+        metrics.write()
+        root.destroy()
+
+    root.protocol("WM_DELETE_WINDOW", on_close)
+
     # Functions for the application
 
-    def update_menu_display():
-        """Update the menu display in the GUI"""
-        menu_text.delete(1.0, tk.END)
-        for item, price in menu_items.items():
-            stock = inventory.get(item, 0)
-            menu_text.insert(tk.END, f"{item:20} PKR {price:6.2f}  (Stock: {stock})\n")
+    def update_menu_display(names=None):
+        """Redraw the menu rows (all of them, or just ``names``) whose price or units left changed"""
+        added = False
+        for item in menu_items if names is None else names:
+            if item not in menu_items:
+                continue
+            values = (f"PKR {money.text(menu_items[item])}", tickets.stock.get(item))
+            shown = menu_rows.get(item)
+            if shown == values:
+                continue
+            if shown is None:
+                menu_tree.insert("", tk.END, iid=item, text=item, values=values)
+                added = True
+            else:
+                menu_tree.item(item, values=values)
+            menu_rows[item] = values
+        if added and menu_search_var.get().strip():
+            filter_menu()
+
+    def filter_menu(*args):
+        """Show the items matching the search box, highlight the first one"""
+        text = menu_search_var.get()
+        # The item is picked once the box holds its full name
+        item_var.set(menu_search.exact(text) or "")
+        if not text.strip():
+            if menu_view["filtered"]:
+                menu_tree.detach(*menu_tree.get_children())
+                for index, item in enumerate(menu_rows):
+                    menu_tree.move(item, "", index)
+                menu_view["filtered"] = False
+            return
+
+        matches = menu_search.matches(text, MENU_MATCHES)
+        menu_tree.detach(*menu_tree.get_children())
+        for index, item in enumerate(matches):
+            menu_tree.move(item, "", index)
+        menu_view["filtered"] = True
+        if matches:
+            menu_tree.selection_set(matches[0])
+            menu_tree.see(matches[0])
+
+    def choose_menu_item(item):
+        menu_search_var.set(item)
+        quantity_entry.focus_set()
+        quantity_entry.select_range(0, tk.END)
+
+    def on_menu_search_key(event):
+        rows = menu_tree.get_children()
+        if not rows:
+            return "break"
+        selected = menu_tree.selection()
+        position = rows.index(selected[0]) if selected and selected[0] in rows else -1
+        if event.keysym == "Return":
+            choose_menu_item(rows[max(position, 0)])
+            return "break"
+        position = min(position + 1, len(rows) - 1) if event.keysym == "Down" else max(position - 1, 0)
+        menu_tree.selection_set(rows[position])
+        menu_tree.see(rows[position])
+        return "break"
+
+    def on_menu_click(event):
+        item = menu_tree.identify_row(event.y)
+        if item:
+            choose_menu_item(item)
 
     def update_order_display():
         """Update the current order display in the GUI"""
         order_text.delete(1.0, tk.END)
-        if not current_order_items:
+        current_order = tickets.active
+        if not current_order:
             order_text.insert(tk.END, "No items in the order.\n")
             return
 
-        for item in current_order_items:
-            order_text.insert(tk.END, f"{item['name']} x{item['quantity']} = PKR {item['total']:.2f}\n")
+        for item in current_order.items():
+            order_text.insert(tk.END, f"{item['name']} x{item['quantity']} = PKR {money.text(item['total'])}\n")
+
+        order_text.insert(tk.END, f"\n{'Total:':25} PKR {money.text(current_order.total)}")
+
+    def ticket_label(ticket):
+        customer = ticket.customer.strip() or "New customer"
+        return f"#{ticket.ticket_id} {customer} - {len(ticket)} items, PKR {money.text(ticket.total)}"
+
+    def update_ticket_list():
+        """Update the list of open tickets in the GUI"""
+        ticket_ids.clear()
+        ticket_list.delete(0, tk.END)
+        for ticket in tickets:
+            ticket_ids.append(ticket.ticket_id)
+            ticket_list.insert(tk.END, ticket_label(ticket))
+            if ticket is tickets.active:
+                ticket_list.selection_set(tk.END)
+                ticket_list.see(tk.END)
+
+    def show_active_ticket():
+        """Show the active ticket in the order display and customer field"""
+        if customer_var.get() != tickets.active.customer:
+            customer_var.set(tickets.active.customer)
+        update_order_display()
+        update_ticket_list()
+
+    def new_ticket(event=None):
+        """Park the current order and start another one"""
+        tickets.open()
+        show_active_ticket()
+
+    def close_ticket():
+        """Drop the active ticket and release its stock"""
+        if tickets.active and not messagebox.askyesno("Confirm", "Close this ticket and discard its items?"):
+            return
+        tickets.close()
+        show_active_ticket()
+
+    def switch_ticket(ticket_id):
+        tickets.switch(ticket_id)
+        show_active_ticket()
+
+    def on_ticket_select(event):
+        selection = ticket_list.curselection()
+        if selection and ticket_ids[selection[0]] != tickets.active.ticket_id:
+            switch_ticket(ticket_ids[selection[0]])
+
+    def on_ticket_key(event):
+        """Ctrl+1..9 jumps to the n-th open ticket"""
+        position = int(event.keysym) - 1
+        if position < len(ticket_ids):
+            switch_ticket(ticket_ids[position])
 
-        order_text.insert(tk.END, f"\n{'Total:':25} PKR {current_order_total:.2f}")
+    def on_customer_change(*args):
+        tickets.active.customer = customer_var.get()
+        update_ticket_list()
 
     def add_to_order():
         """Add selected item to the current order"""
-        global current_order_total
-        global current_order_items
-
         selected_item = item_var.get()
         if not selected_item:
             messagebox.showwarning("Warning", "Please select an item from the menu.")
@@ -432,161 +607,319 @@ def main():
 
         try:
             quantity = int(quantity_var.get())
-            if quantity <= 0:
-                messagebox.showwarning("Warning", "Quantity must be greater than 0.")
-                return
         except:
             messagebox.showwarning("Warning", "Please enter a valid quantity.")
             return
 
-        # Check inventory
-        if selected_item in inventory and inventory[selected_item] < quantity:
-            messagebox.showwarning("Warning", f"Not enough stock. Only {inventory[selected_item]} available.")
+        try:
+            tickets.active.add(selected_item, quantity)
+        except OrderError as e:
+            messagebox.showwarning("Warning", str(e))
             return
 
-        # Add to order
-        price = menu_items[selected_item]
-        item_total = price * quantity
-
-        # Check if item already in order
-        item_found = False
-        for item in current_order_items:
-            if item['name'] == selected_item:
-                item['quantity'] += quantity
-                item['total'] = item['price'] * item['quantity']
-                item_found = True
-                break
-
-        if not item_found:
-            current_order_items.append({
-                'name': selected_item,
-                'price': price,
-                'quantity': quantity,
-                'total': item_total
-            })
-
-        # Update total
-        current_order_total = 0.0
-        for item in current_order_items:
-            current_order_total += item['total']
-
         # Update displays
         update_order_display()
+        update_ticket_list()
 
         # Reset quantity
         quantity_var.set("1")
 
     def remove_from_order():
         """Remove selected item from the current order"""
-        global current_order_total
-        global current_order_items
-
-        selected_item = item_var.get()
-        if not selected_item:
-            messagebox.showwarning("Warning", "Please select an item from the menu.")
+        try:
+            tickets.active.remove(item_var.get())
+        except OrderError as e:
+            messagebox.showwarning("Warning", str(e))
             return
 
-        # Find and remove the item
-        for i, item in enumerate(current_order_items):
-            if item['name'] == selected_item:
-                current_order_items.pop(i)
-                break
-
-        # Update total
-        current_order_total = 0.0
-        for item in current_order_items:
-            current_order_total += item['total']
-
         # Update displays
         update_order_display()
+        update_ticket_list()
 
+    @metrics.timed("cafe_place_order_seconds", "Time the till is busy placing an order")
     def place_order():
         """Place the current order"""
-        global current_order_total
-        global current_order_items
         global order_counter
+        started = time.perf_counter()
 
-        if not current_order_items:
-            messagebox.showwarning("Warning", "No items in the order.")
+        try:
+            tickets.active.validate()
+        except OrderError as e:
+            messagebox.showwarning("Warning", str(e))
             return
 
-        customer_name = customer_var.get().strip()
-        if not customer_name:
-            messagebox.showwarning("Warning", "Please enter customer name.")
+        # Generate order ID from the counter shared by all stations
+        try:
+            order_seq = station.allocate_order_seq()
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to get an order ID: {e}")
             return
-
-        # Check inventory and update
-        for item in current_order_items:
-            item_name = item['name']
-            if item_name in inventory:
-                if inventory[item_name] < item['quantity']:
-                    messagebox.showwarning("Warning",
-                                           f"Not enough stock for {item_name}. Only {inventory[item_name]} available.")
-                    return
-                inventory[item_name] -= item['quantity']
-            else:
-                messagebox.showwarning("Warning", f"{item_name} not found in inventory.")
+        order_id = f"ORD{order_seq:04d}"
+        order_counter = order_seq + 1
+
+        # The ticket takes the stock and closes
+        order = tickets.place(order_id)
+        station.sale_submitted(order)
+
+        def on_saved(error):
+            station.sale_finished(order)
+            metrics.observe("cafe_checkout_latency_seconds", time.perf_counter() - started,
+                            help_text="From placing an order until it is saved")
+            if error is None:
+                update_today_label()
+                metrics.increment("cafe_orders_saved_total")
+                metrics.tick_per_minute("cafe_orders_per_minute", "Orders saved per minute")
+                status_label.config(text=f"Order {order_id} saved (PKR {money.text(order['total'])})")
                 return
 
-        # Save inventory
-        if not save_inventory(inventory):
-            return
-
-        # Generate order ID
-        order_id = f"ORD{order_counter:04d}"
-        order_counter += 1
-
-        # Save order
-        if save_order(order_id, customer_name, current_order_items, current_order_total, "Completed"):
-            # Clear current order
-            current_order_items = []
-            current_order_total = 0.0
+            # Nothing was saved, give the stock back
+            metrics.increment("cafe_orders_failed_total")
+            tickets.restore(order)
+            status_label.config(text=f"Order {order_id} NOT saved")
+            if isinstance(error, storage.StockError):
+                messagebox.showwarning("Warning", f"Order {order_id} was not placed: {error}")
+            else:
+                messagebox.showerror("Error", f"Failed to save order {order_id}: {error}")
 
-            # Update displays
-            update_order_display()
-            update_menu_display()
+        # The save runs in the background, the cashier can start the next order straight away
+        writer.submit_order(order, on_saved)
 
-            # Update order counter display
-            status_orders_label.config(text=f"Total Orders: {order_counter - 1}")
+        # Update displays, the next ticket is already active (menu rows follow tickets.stock)
+        show_active_ticket()
 
-            # Show success message
-            messagebox.showinfo("Success",
-                                f"Order placed successfully!\nOrder ID: {order_id}\nTotal: PKR {current_order_total:.2f}")
-
-            # Reset customer name
-            customer_var.set("")
+        # Update order counter display
+        status_orders_label.config(text=f"Total Orders: {order_counter - 1}")
+        status_label.config(text=f"Saving order {order_id}...")
 
     def view_orders():
-        """View all orders in a new window"""
-        orders = load_orders()
-
+        """View the order history a page at a time"""
         # Create new window
         orders_window = tk.Toplevel(root)
         orders_window.title("Order History")
-        orders_window.geometry("800x500")
-
-        # Create text widget with scrollbar
-        orders_text = scrolledtext.ScrolledText(orders_window, width=90, height=25)
-        orders_text.pack(padx=10, pady=10)
-
-        if not orders:
-            orders_text.insert(tk.END, "No orders found.")
-        else:
-            for order in orders:
-                orders_text.insert(tk.END, f"Order ID: {order['id']}\n")
-                orders_text.insert(tk.END, f"Time: {order['timestamp']}\n")
-                orders_text.insert(tk.END, f"Customer: {order['customer']}\n")
-                orders_text.insert(tk.END, "Items:\n")
-
-                for item in order['items']:
-                    orders_text.insert(tk.END,
-                                       f"  - {item['name']} x{item['quantity']} @ PKR {item['price']:.2f} = PKR {item['price'] * item['quantity']:.2f}\n")
+        orders_window.geometry("800x530")
+
+        # Search box, answered from the search index (see search_index.py for the query words)
+        search_frame = tk.Frame(orders_window)
+        search_frame.pack(fill="x", padx=10, pady=(10, 0))
+        tk.Label(search_frame, text="Search:").pack(side="left")
+        search_var = tk.StringVar()
+        search_entry = tk.Entry(search_frame, textvariable=search_var, width=40)
+        search_entry.pack(side="left", padx=(0, 8))
+        tk.Label(search_frame, text="e.g. ali cake, item:latte, 2024-01-31, status:cancelled",
+                 fg="gray").pack(side="left")
+
+        # Filters, applied by the storage backend
+        filter_frame = tk.Frame(orders_window)
+        filter_frame.pack(fill="x", padx=10, pady=(10, 0))
+
+        tk.Label(filter_frame, text="From (YYYY-MM-DD):").pack(side="left")
+        since_var = tk.StringVar()
+        tk.Entry(filter_frame, textvariable=since_var, width=11).pack(side="left", padx=(0, 8))
+        tk.Label(filter_frame, text="To:").pack(side="left")
+        until_var = tk.StringVar()
+        tk.Entry(filter_frame, textvariable=until_var, width=11).pack(side="left", padx=(0, 8))
+        tk.Label(filter_frame, text="Customer:").pack(side="left")
+        customer_filter_var = tk.StringVar()
+        customer_filter_entry = tk.Entry(filter_frame, textvariable=customer_filter_var, width=14)
+        customer_filter_entry.pack(side="left", padx=(0, 8))
+        tk.Label(filter_frame, text="Status:").pack(side="left")
+        status_var = tk.StringVar(value="All")
+        ttk.Combobox(filter_frame, textvariable=status_var, values=["All", "Completed", "Cancelled"],
+                     width=10, state="readonly").pack(side="left", padx=(0, 8))
+
+        # Orders as rows, their items are fetched when a row is expanded
+        tree_frame = tk.Frame(orders_window)
+        tree_frame.pack(fill="both", expand=True, padx=10, pady=10)
+        columns = ("timestamp", "customer", "total", "status")
+        orders_tree = ttk.Treeview(tree_frame, columns=columns)
+        orders_scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=orders_tree.yview)
+        orders_scrollbar.pack(side="right", fill="y")
+        orders_tree.pack(side="left", fill="both", expand=True)
+
+        orders_tree.heading("#0", text="Order ID")
+        orders_tree.column("#0", width=160)
+        orders_tree.column("timestamp", width=160)
+        orders_tree.column("customer", width=180)
+        orders_tree.column("total", width=110, anchor="e")
+        orders_tree.column("status", width=100)
+
+        info_label = tk.Label(orders_window, text="")
+        info_label.pack(pady=(0, 10))
+
+        view = {"filters": {}, "sort": "time", "descending": True, "loaded": 0, "done": False, "pending": False}
+        headings = {"#0": ("Order ID", "time"), "timestamp": ("Time", "time"), "customer": ("Customer", "customer"),
+                    "total": ("Total", "total"), "status": ("Status", None)}
+
+        def show_headings():
+            for column, (text, sort) in headings.items():
+                if sort == view["sort"]:
+                    text += " ▼" if view["descending"] else " ▲"
+                orders_tree.heading(column, text=text,
+                                    command=(lambda sort=sort: sort_by(sort)) if sort else "")
+
+        def load_page():
+            """Fetch the next page of orders and add it to the bottom of the list"""
+            view["pending"] = False
+            if view["done"]:
+                return
+            page = load_order_page(view["loaded"], ORDER_PAGE_SIZE, sort=view["sort"],
+                                   descending=view["descending"], **view["filters"])
+            for order in page:
+                row = orders_tree.insert("", tk.END, text=order["id"],
+                                         values=(order["timestamp"], order["customer"],
+                                                 f"PKR {money.text(order['total'])}", order["status"]))
+                # Placeholder so the row can be expanded
+                orders_tree.insert(row, tk.END, text="...")
+            view["loaded"] += len(page)
+            view["done"] = len(page) < ORDER_PAGE_SIZE
+            if view["loaded"] == 0:
+                info_label.config(text="No orders found.")
+            else:
+                more = "" if view["done"] else " (scroll for more)"
+                info_label.config(text=f"Showing {view['loaded']} orders{more}")
+
+        def reload():
+            orders_tree.delete(*orders_tree.get_children())
+            view["loaded"] = 0
+            view["done"] = False
+            show_headings()
+            load_page()
+
+        def on_scroll(first, last):
+            orders_scrollbar.set(first, last)
+            # Near the bottom: fetch the next page
+            if float(last) > 0.9 and view["loaded"] and not view["done"] and not view["pending"]:
+                view["pending"] = True
+                orders_window.after_idle(load_page)
+
+        def on_open(event):
+            row = orders_tree.focus()
+            children = orders_tree.get_children(row)
+            if len(children) != 1 or orders_tree.item(children[0], "text") != "...":
+                return
+            orders_tree.delete(children[0])
+            order = load_order(orders_tree.item(row, "text"))
+            if order is None:
+                return
+            for item in order["items"]:
+                orders_tree.insert(row, tk.END, text=f"  {item['name']}",
+                                   values=(f"x{item['quantity']} @ PKR {money.text(item['price'])}", "",
+                                           f"PKR {money.text(item['price'] * item['quantity'])}", ""))
+
+        def sort_by(sort):
+            if sort == view["sort"]:
+                view["descending"] = not view["descending"]
+            else:
+                view["sort"] = sort
+                view["descending"] = sort != "customer"
+            reload()
+
+        def apply_filters(event=None):
+            filters = {}
+            for key, var in (("since", since_var), ("until", until_var)):
+                text = var.get().strip()
+                if text:
+                    try:
+                        datetime.strptime(text, "%Y-%m-%d")
+                    except ValueError:
+                        messagebox.showwarning("Warning", "Please enter dates as YYYY-MM-DD.", parent=orders_window)
+                        return
+                    filters[key] = text
+            if "until" in filters:
+                # The "To" day is included
+                until_day = datetime.strptime(filters["until"], "%Y-%m-%d") + timedelta(days=1)
+                filters["until"] = until_day.strftime("%Y-%m-%d")
+            if customer_filter_var.get().strip():
+                filters["customer"] = customer_filter_var.get().strip()
+            if status_var.get() != "All":
+                filters["status"] = status_var.get()
+            if search_var.get().strip():
+                filters["search"] = search_var.get().strip()
+            view["filters"] = filters
+            reload()
+
+        tk.Button(filter_frame, text="Apply", command=apply_filters).pack(side="left")
+        customer_filter_entry.bind("<Return>", apply_filters)
+        search_entry.bind("<Return>", apply_filters)
+        orders_tree.configure(yscrollcommand=on_scroll)
+        orders_tree.bind("<<TreeviewOpen>>", on_open)
+
+        reload()
+
+    def view_reports():
+        """Show sales figures for a date range"""
+        reports_window = tk.Toplevel(root)
+        reports_window.title("Reports")
+        reports_window.geometry("700x500")
+
+        range_frame = tk.Frame(reports_window)
+        range_frame.pack(fill="x", padx=10, pady=(10, 0))
+        tk.Label(range_frame, text="From (YYYY-MM-DD):").pack(side="left")
+        since_var = tk.StringVar()
+        tk.Entry(range_frame, textvariable=since_var, width=11).pack(side="left", padx=(0, 8))
+        tk.Label(range_frame, text="To:").pack(side="left")
+        until_var = tk.StringVar()
+        tk.Entry(range_frame, textvariable=until_var, width=11).pack(side="left", padx=(0, 8))
+
+        summary_label = tk.Label(reports_window, text="", font=("Arial", 11, "bold"))
+        summary_label.pack(pady=5)
+
+        notebook = ttk.Notebook(reports_window)
+        notebook.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+
+        def add_table(title, headings):
+            frame = tk.Frame(notebook)
+            notebook.add(frame, text=title)
+            table = ttk.Treeview(frame, columns=headings, show="headings")
+            scrollbar = ttk.Scrollbar(frame, orient="vertical", command=table.yview)
+            table.configure(yscrollcommand=scrollbar.set)
+            scrollbar.pack(side="right", fill="y")
+            table.pack(side="left", fill="both", expand=True)
+            for heading in headings:
+                table.heading(heading, text=heading)
+                table.column(heading, width=150, anchor="w" if heading == headings[0] else "e")
+            return table
+
+        day_table = add_table("By Day", ("Day", "Orders", "Revenue"))
+        hour_table = add_table("By Hour", ("Hour", "Orders", "Revenue"))
+        items_table = add_table("Top Items", ("Item", "Sold", "Revenue"))
+        customers_table = add_table("Customers", ("Customer", "Orders", "Spent"))
+
+        def fill(table, rows):
+            table.delete(*table.get_children())
+            for row in rows:
+                table.insert("", tk.END, values=row)
+
+        def show_report(event=None):
+            dates = {}
+            for key, var in (("since", since_var), ("until", until_var)):
+                text = var.get().strip()
+                if text:
+                    try:
+                        day = datetime.strptime(text, "%Y-%m-%d")
+                    except ValueError:
+                        messagebox.showwarning("Warning", "Please enter dates as YYYY-MM-DD.", parent=reports_window)
+                        return
+                    # The "To" day is included
+                    dates[key] = day + timedelta(days=1) if key == "until" else day
+
+            reports_window.config(cursor="watch")
+            reports_window.update_idletasks()
+            report = load_sales_report(**dates)
+            reports_window.config(cursor="")
+            if report is None:
+                return
 
-                orders_text.insert(tk.END, f"Total: PKR {order['total']:.2f}\n")
-                orders_text.insert(tk.END, f"Status: {order['status']}\n")
-                orders_text.insert(tk.END, "-" * 50 + "\n\n")
+            summary_label.config(text=f"Orders: {report['orders']}    Revenue: PKR {money.text(report['revenue'])}    "
+                                      f"Average ticket: PKR {money.text(report['average_ticket'])}")
+            # Newest day first
+            fill(day_table, [(day, orders, money.text(revenue)) for day, orders, revenue in reversed(report["by_day"])])
+            fill(hour_table, [(f"{hour:02d}:00", orders, money.text(revenue)) for hour, orders, revenue in report["by_hour"]])
+            fill(items_table, [(name, sold, money.text(revenue)) for name, sold, revenue in report["top_items"]])
+            fill(customers_table, [(name, orders, money.text(spent)) for name, orders, spent in report["customers"]])
 
-        orders_text.configure(state='disabled')
+        tk.Button(range_frame, text="Show", command=show_report).pack(side="left")
+        show_report()
 
     def add_menu_item():
         """Add a new item to the menu"""
@@ -617,11 +950,15 @@ def main():
                 messagebox.showwarning("Warning", "Please fill all fields.")
                 return
 
+            if order_log.has_separator(name):
+                messagebox.showwarning("Warning", "Item name can't contain , ; : or line breaks.")
+                return
+
             try:
-                price_float = float(price)
+                price_paisa = money.parse(price)
                 stock_int = int(stock)
 
-                if price_float <= 0:
+                if price_paisa <= 0:
                     messagebox.showwarning("Warning", "Price must be greater than 0.")
                     return
 
@@ -632,32 +969,31 @@ def main():
                 messagebox.showwarning("Warning", "Please enter valid numbers for price and stock.")
                 return
 
+            if name in menu_items and not messagebox.askyesno(
+                    "Already on the menu", f"{name} is already on the menu. Change its price and stock?"):
+                return
+
             # Add to menu
-            menu_items[name] = price_float
+            menu_items[name] = price_paisa
 
-            # Add to inventory
+            # Add to inventory, the item is its own ingredient until it gets a recipe
             inventory[name] = stock_int
 
+            def on_saved(error):
+                if error is not None:
+                    messagebox.showerror("Error", f"Failed to save item {name}: {error}")
+
             # Save to files
             try:
-                # Save to menu file
-                with open(MENU_FILE, "a") as file:
-                    file.write(f"{name},{price_float}\n")
-
-                # Save to inventory file
-                with open(INVENTORY_FILE, "a") as file:
-                    file.write(f"{name},{stock_int}\n")
+                writer.submit_menu_item(name, price_paisa, stock_int, on_saved)
 
                 # Update displays
-                update_menu_display()
-
-                # Update item dropdown
-                item_menu['menu'].delete(0, 'end')
-                for item in menu_items:
-                    item_menu['menu'].add_command(label=item, command=tk._setit(item_var, item))
+                menu_search.add(name)
+                tickets.stock.set_item(name)
+                tickets.stock.update([name])
 
                 # Set the new item as selected
-                item_var.set(name)
+                menu_search_var.set(name)
 
                 # Close window
                 add_window.destroy()
@@ -678,20 +1014,104 @@ def main():
 
     def reset_order():
         """Reset the current order"""
-        global current_order_items
-        global current_order_total
-
-        if not current_order_items:
+        if not tickets.active:
             messagebox.showinfo("Info", "Order is already empty.")
             return
 
         if messagebox.askyesno("Confirm", "Are you sure you want to clear the current order?"):
-            current_order_items = []
-            current_order_total = 0.0
+            tickets.active.clear()
             update_order_display()
             customer_var.set("")
             messagebox.showinfo("Success", "Order cleared.")
 
+    def import_items():
+        """Import a price list or a restock sheet (CSV or JSON) in one go"""
+        import bulk_import
+        from tkinter import filedialog
+
+        import_window = tk.Toplevel(root)
+        import_window.title("Import Menu / Stock")
+        import_window.geometry("560x380")
+
+        kind_var = tk.StringVar(value=bulk_import.MENU)
+        kind_frame = tk.Frame(import_window)
+        kind_frame.pack(fill="x", padx=10, pady=(10, 0))
+        tk.Radiobutton(kind_frame, text="Price list (name, price, stock)", variable=kind_var,
+                       value=bulk_import.MENU).pack(side="left")
+        tk.Radiobutton(kind_frame, text="Restock sheet (name, quantity)", variable=kind_var,
+                       value=bulk_import.RESTOCK).pack(side="left", padx=10)
+
+        file_frame = tk.Frame(import_window)
+        file_frame.pack(fill="x", padx=10, pady=10)
+        path_var = tk.StringVar()
+        tk.Label(file_frame, text="File:").pack(side="left")
+        tk.Entry(file_frame, textvariable=path_var, width=45).pack(side="left", padx=5)
+
+        def browse():
+            path = filedialog.askopenfilename(parent=import_window, filetypes=[
+                ("CSV or JSON", "*.csv *.json"), ("All files", "*.*")])
+            if path:
+                path_var.set(path)
+                check()
+
+        tk.Button(file_frame, text="Browse...", command=browse).pack(side="left")
+
+        summary_text = tk.Text(import_window, height=14, width=68, state="disabled")
+        summary_text.pack(padx=10, fill="both", expand=True)
+
+        def show(text):
+            summary_text.config(state="normal")
+            summary_text.delete("1.0", tk.END)
+            summary_text.insert(tk.END, text)
+            summary_text.config(state="disabled")
+
+        def check():
+            """Check the whole file against the menu and stock as they are now"""
+            if not path_var.get().strip():
+                messagebox.showwarning("Warning", "Please choose a file.", parent=import_window)
+                return None
+            plan = bulk_import.plan_file(path_var.get().strip(), kind_var.get(), menu_items, inventory)
+            show(plan.summary())
+            return plan
+
+        def do_import():
+            # Checked again, the menu may have changed since the preview
+            plan = check()
+            if plan is None or plan.problems:
+                return
+            if not plan:
+                messagebox.showinfo("Import", "Nothing to change.", parent=import_window)
+                return
+
+            def on_imported(error):
+                if error is not None:
+                    messagebox.showerror("Error", f"Failed to save the import: {error}")
+
+            changed = plan.apply(menu_items, inventory)
+            writer.submit_import(plan.prices, plan.new_stock, plan.restocks, on_imported)
+
+            # Update displays
+            menu_search.add_many(plan.new_items)
+            tickets.stock.add_items(plan.new_items)
+            tickets.stock.update(changed)
+            update_menu_display(list(plan.prices))
+
+            import_window.destroy()
+            messagebox.showinfo("Success", f"Imported: {plan.summary()}")
+
+        buttons_frame = tk.Frame(import_window)
+        buttons_frame.pack(pady=10)
+        tk.Button(buttons_frame, text="Check", command=check, width=15).pack(side="left", padx=5)
+        tk.Button(buttons_frame, text="Import", command=do_import, bg="#4CAF50", fg="white",
+                  width=15).pack(side="left", padx=5)
+        tk.Button(buttons_frame, text="Cancel", command=import_window.destroy, bg="#f44336", fg="white",
+                  width=15).pack(side="left", padx=5)
+
+    def view_kitchen():
+        """Open the kitchen/bar display (it can also run on its own screen: python kitchen.py display)"""
+        import kitchen
+        kitchen.KitchenDisplay(tk.Toplevel(root), store)
+
     def view_inventory():
         """View current inventory in a new window"""
         inventory = load_inventory()
@@ -702,6 +1122,7 @@ def main():
         inv_window.geometry("400x500")
 
         # Create text widget with scrollbar
+        from tkinter import scrolledtext
         inv_text = scrolledtext.ScrolledText(inv_window, width=45, height=25)
         inv_text.pack(padx=10, pady=10)
 
@@ -738,12 +1159,29 @@ def main():
 
     tk.Label(left_frame, text="Menu", font=("Arial", 16, "bold"), bg="white").pack(pady=10)
 
-    # Menu display
-    menu_text = tk.Text(left_frame, width=30, height=15, font=("Courier", 10))
-    menu_text.pack(padx=10, pady=5)
-
-    # Update menu display
-    update_menu_display()
+    # Menu display, one row per item keyed by its name
+    menu_tree_frame = tk.Frame(left_frame, bg="white")
+    menu_tree_frame.pack(fill="both", expand=True, padx=10, pady=5)
+    menu_tree = ttk.Treeview(menu_tree_frame, columns=("price", "stock"), height=14, selectmode="browse")
+    menu_scrollbar = ttk.Scrollbar(menu_tree_frame, orient="vertical", command=menu_tree.yview)
+    menu_tree.configure(yscrollcommand=menu_scrollbar.set)
+    menu_scrollbar.pack(side="right", fill="y")
+    menu_tree.pack(side="left", fill="both", expand=True)
+    menu_tree.heading("#0", text="Item")
+    menu_tree.heading("price", text="Price")
+    menu_tree.heading("stock", text="Stock")
+    menu_tree.column("#0", width=170)
+    menu_tree.column("price", width=90, anchor="e")
+    menu_tree.column("stock", width=60, anchor="e")
+    menu_tree.bind("<ButtonRelease-1>", on_menu_click)
+
+    # Rows as last drawn, and the prefix index behind the item search
+    menu_rows = {}
+    menu_view = {"filtered": False}
+    menu_search = MenuIndex(menu_items)
+
+    # Rows are redrawn whenever the units left of their items change
+    tickets.stock.listener = update_menu_display
 
     # Right frame - Order
     right_frame = tk.Frame(main_frame, bg="white", relief="groove", borderwidth=2)
@@ -751,13 +1189,30 @@ def main():
 
     tk.Label(right_frame, text="Current Order", font=("Arial", 16, "bold"), bg="white").pack(pady=10)
 
+    # Open tickets, click one (or press Ctrl+1..9) to switch to it
+    ticket_frame = tk.Frame(right_frame, bg="white")
+    ticket_frame.pack(fill="x", padx=10)
+
+    ticket_ids = []
+    ticket_list = tk.Listbox(ticket_frame, height=4, exportselection=False, font=("Courier", 9))
+    ticket_list.pack(side="left", fill="x", expand=True)
+    ticket_list.bind("<<ListboxSelect>>", on_ticket_select)
+
+    ticket_buttons = tk.Frame(ticket_frame, bg="white")
+    ticket_buttons.pack(side="left", padx=5)
+    tk.Button(ticket_buttons, text="New Ticket", command=new_ticket, bg="#2196F3", fg="white",
+              width=12).pack(pady=2)
+    tk.Button(ticket_buttons, text="Close Ticket", command=close_ticket, bg="#f44336", fg="white",
+              width=12).pack(pady=2)
+
+    root.bind("<Control-n>", new_ticket)
+    for number in range(1, 10):
+        root.bind(f"<Control-Key-{number}>", on_ticket_key)
+
     # Order display
-    order_text = tk.Text(right_frame, width=35, height=15, font=("Courier", 10))
+    order_text = tk.Text(right_frame, width=35, height=11, font=("Courier", 10))
     order_text.pack(padx=10, pady=5)
 
-    # Update order display
-    update_order_display()
-
     # Bottom frame - Controls
     bottom_frame = tk.Frame(main_frame, bg="#f0f0f0")
     bottom_frame.grid(row=1, column=0, columnspan=2, pady=10, sticky="ew")
@@ -768,14 +1223,25 @@ def main():
 
     tk.Label(control_frame, text="Item:", bg="#f0f0f0").grid(row=0, column=0, padx=5, pady=5)
 
+    # Type to search the menu, Up/Down to move, Enter to pick; Enter again in Quantity adds it
     item_var = tk.StringVar()
-    item_menu = ttk.OptionMenu(control_frame, item_var, "", *menu_items.keys())
-    item_menu.grid(row=0, column=1, padx=5, pady=5)
+    menu_search_var = tk.StringVar()
+    menu_search_entry = tk.Entry(control_frame, textvariable=menu_search_var, width=22)
+    menu_search_entry.grid(row=0, column=1, padx=5, pady=5)
+    menu_search_var.trace_add("write", filter_menu)
+    for key in ("<Return>", "<Down>", "<Up>"):
+        menu_search_entry.bind(key, on_menu_search_key)
+    menu_search_entry.bind("<Escape>", lambda event: menu_search_var.set(""))
 
     tk.Label(control_frame, text="Quantity:", bg="#f0f0f0").grid(row=0, column=2, padx=5, pady=5)
 
     quantity_var = tk.StringVar(value="1")
-    tk.Entry(control_frame, textvariable=quantity_var, width=10).grid(row=0, column=3, padx=5, pady=5)
+    quantity_entry = tk.Entry(control_frame, textvariable=quantity_var, width=10)
+    quantity_entry.grid(row=0, column=3, padx=5, pady=5)
+    quantity_entry.bind("<Return>", lambda event: add_to_order())
+
+    # Fill the menu display
+    update_menu_display()
 
     tk.Button(control_frame, text="Add to Order", command=add_to_order, bg="#2196F3", fg="white", width=15).grid(row=0,
                                                                                                                  column=4,
@@ -791,8 +1257,12 @@ def main():
     tk.Label(customer_frame, text="Customer Name:", bg="#f0f0f0").grid(row=0, column=0, padx=5, pady=5)
 
     customer_var = tk.StringVar()
+    customer_var.trace_add("write", on_customer_change)
     tk.Entry(customer_frame, textvariable=customer_var, width=30).grid(row=0, column=1, padx=5, pady=5)
 
+    # Update order display
+    show_active_ticket()
+
     tk.Button(customer_frame, text="Place Order", command=place_order, bg="#4CAF50", fg="white", width=15).grid(row=0,
                                                                                                                 column=2,
                                                                                                                 padx=5,
@@ -812,10 +1282,16 @@ def main():
               width=20).grid(row=0, column=0, padx=5)
     tk.Button(menu_buttons_frame, text="View Order History", command=view_orders, bg="#607D8B", fg="white",
               width=20).grid(row=0, column=1, padx=5)
-    tk.Button(menu_buttons_frame, text="View Inventory", command=view_inventory, bg="#FF9800", fg="white",
+    tk.Button(menu_buttons_frame, text="Reports", command=view_reports, bg="#3F51B5", fg="white",
               width=20).grid(row=0, column=2, padx=5)
-    tk.Button(menu_buttons_frame, text="Refresh Menu", command=update_menu_display, bg="#00BCD4", fg="white",
+    tk.Button(menu_buttons_frame, text="View Inventory", command=view_inventory, bg="#FF9800", fg="white",
               width=20).grid(row=0, column=3, padx=5)
+    tk.Button(menu_buttons_frame, text="Refresh Menu", command=lambda: update_menu_display(), bg="#00BCD4", fg="white",
+              width=20).grid(row=0, column=4, padx=5)
+    tk.Button(menu_buttons_frame, text="Kitchen Display", command=view_kitchen, bg="#795548", fg="white",
+              width=20).grid(row=1, column=2, padx=5, pady=5)
+    tk.Button(menu_buttons_frame, text="Import...", command=import_items, bg="#8BC34A", fg="white",
+              width=20).grid(row=1, column=1, padx=5, pady=5)
 
     # Configure grid weights
     main_frame.columnconfigure(0, weight=1)
@@ -826,14 +1302,31 @@ def main():
     status_frame = tk.Frame(root, bg="#4CAF50", height=30)
     status_frame.pack(fill="x", side="bottom", padx=10, pady=5)
 
-    tk.Label(status_frame, text="Ready", bg="#4CAF50", fg="white").pack(side="left", padx=10)
+    status_label = tk.Label(status_frame, text="Ready", bg="#4CAF50", fg="white")
+    status_label.pack(side="left", padx=10)
     status_orders_label = tk.Label(status_frame, text=f"Total Orders: {order_counter - 1}", bg="#4CAF50", fg="white")
     status_orders_label.pack(side="right", padx=10)
+    status_today_label = tk.Label(status_frame, text="", bg="#4CAF50", fg="white")
+    status_today_label.pack(side="right", padx=10)
+
+    def update_today_label(totals=None):
+        totals = totals or load_today_totals()
+        if totals is not None:
+            status_today_label.config(text=f"Today: {totals[0]} orders, PKR {money.text(totals[1])}")
+
+    update_today_label(tuple(snapshot["today"][1:]) if snapshot is not None and snapshot["today"] else None)
+
+    # Pick up stock changes made by other stations, only the rows of items using them are redrawn
+    station.attach(root, tickets.stock.update)
 
     # Set initial menu item if available
     if menu_items:
         first_item = list(menu_items.keys())[0]
         item_var.set(first_item)
+        menu_tree.selection_set(first_item)
+
+    # Window is ready, the time from here to the first sale is up to the cashier
+    metrics.observe("cafe_startup_seconds", time.perf_counter() - startup_started)
 
     # Start the application
     root.mainloop()
@@ -0,0 +1,334 @@
+"""Order intake API for kiosks and tablets.
+
+A small asyncio HTTP/JSON server that works as one more station next to the
+Tk tills (it shares their data files, order counter and stock):
+
+    GET  /menu                      menu items with price and units left
+    GET  /inventory                 stock per ingredient
+    GET  /orders?page=&page_size=   order history, oldest first
+                                    (filters: since, until, customer, status)
+    GET  /orders/<order id>         one order
+    POST /orders                    {"customer": "Ali",
+                                     "items": [{"name": "Tea", "quantity": 2}]}
+
+Orders get the same checks as ``place_order()`` in the GUI and are answered
+once they are safely on disk. Prices and totals are given in rupees as
+before, and exactly as ints in ``price_paisa`` and ``total_paisa``. Run it with ``python api_server.py``.
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import coordinator
+import money
+import persistence
+import storage
+from ingredients import Availability
+from order_book import OrderBook, OrderError
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+MAX_BODY_SIZE = 1024 * 1024
+# Threads (each with its own store) for reading orders
+READ_THREADS = 4
+
+REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large",
+           500: "Internal Server Error"}
+
+
+class ApiError(Exception):
+    """An error answered to the client as {"error": message}"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class StoreThread:
+    """A thread with a store of its own, for store calls made from the event loop
+
+    The store is opened, used and closed on that one thread (SQLite
+    connections belong to the thread that opened them) and stays open
+    between calls, so a request doesn't pay for opening it.
+    """
+
+    def __init__(self, backend, name):
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self.store = self.executor.submit(storage.open_storage, backend).result()
+
+    async def run(self, function, *args):
+        """Call ``function(store, *args)`` on the thread"""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, self.store, *args)
+
+    def close(self):
+        self.executor.submit(self.store.close).result()
+        self.executor.shutdown()
+
+
+class OrderApi:
+    """Request handling, kept apart from the HTTP plumbing"""
+
+    def __init__(self, store, loop):
+        self.store = store
+        self.loop = loop
+        self.menu_items = store.load_menu()
+        self.inventory = store.load_inventory()
+        self.recipes = store.load_recipes()
+        # Units left per menu item, counting stock held by orders that are being placed right now
+        self.stock = Availability(self.menu_items, self.recipes, self.inventory)
+        # The station's file locks and reads happen on its own thread, never on the loop
+        self.station_thread = StoreThread(store.name, "cafe-station")
+        self.station = self.station_thread.executor.submit(
+            lambda: coordinator.Station(self.station_thread.store, self.inventory, recipes=self.recipes)).result()
+        self.readers = asyncio.Queue()
+        for _ in range(READ_THREADS):
+            self.readers.put_nowait(StoreThread(store.name, "cafe-reader"))
+        self.writer = persistence.BackgroundWriter(lambda: storage.open_storage(store.name),
+                                                   notify=self._wake)
+
+    def _wake(self):
+        try:
+            self.loop.call_soon_threadsafe(self.writer.poll)
+        except RuntimeError:
+            # The loop is gone, we are shutting down
+            pass
+
+    def close(self):
+        self.writer.close()
+        self.station_thread.close()
+        while not self.readers.empty():
+            self.readers.get_nowait().close()
+
+    async def sync_stock(self, interval=coordinator.SYNC_INTERVAL / 1000):
+        """Pick up stock changes made by the tills and other stations"""
+        def read_changes(store):
+            stock = self.station.read_stock()
+            # New items added at a till show up in the menu too
+            return stock, (store.load_menu() if stock is not None else None)
+
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                stock, menu = await self.station_thread.run(read_changes)
+                if stock is None:
+                    continue
+                changed = self.station.apply_stock(*stock)
+                if changed:
+                    for name, price in menu.items():
+                        new_item = name not in self.menu_items
+                        self.menu_items[name] = price
+                        if new_item:
+                            self.stock.set_item(name)
+                    self.stock.update(changed)
+            except Exception:
+                pass
+
+    async def handle(self, method, path, query, body):
+        parts = [unquote(part) for part in path.strip("/").split("/") if part]
+        if parts == ["menu"]:
+            self._allow(method, "GET")
+            return 200, {"items": [{"name": name, "price": money.rupees(price), "price_paisa": price,
+                                    "stock": self.stock.get(name)}
+                                   for name, price in self.menu_items.items()]}
+        if parts == ["inventory"]:
+            self._allow(method, "GET")
+            return 200, {"inventory": self.inventory}
+        if parts == ["orders"]:
+            if method == "POST":
+                return await self.place_order(body)
+            self._allow(method, "GET")
+            return 200, await self.list_orders(query)
+        if len(parts) == 2 and parts[0] == "orders":
+            self._allow(method, "GET")
+            order = await self.read(lambda store: store.read_order(parts[1]))
+            if order is None:
+                raise ApiError(404, f"Order {parts[1]} not found.")
+            return 200, {"order": order_json(order)}
+        raise ApiError(404, "Not found.")
+
+    def _allow(self, method, allowed):
+        if method != allowed:
+            raise ApiError(405, f"Use {allowed}.")
+
+    async def read(self, function):
+        """Call ``function(store)`` on a free reader thread"""
+        reader = await self.readers.get()
+        try:
+            return await reader.run(function)
+        finally:
+            self.readers.put_nowait(reader)
+
+    async def list_orders(self, query):
+        try:
+            page = int(query.get("page", 1))
+            page_size = min(int(query.get("page_size", DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        except ValueError:
+            raise ApiError(400, "page and page_size must be numbers.")
+        if page < 1 or page_size < 1:
+            raise ApiError(400, "page and page_size must be at least 1.")
+        filters = {key: query[key] for key in ("since", "until", "customer", "status") if key in query}
+
+        def read_page(store):
+            # Seeks to the page through the index, one extra order tells us whether there is a next page
+            summaries = store.order_page((page - 1) * page_size, page_size + 1, descending=False, **filters)
+            # Summaries come without their items
+            orders = [store.read_order(summary["id"]) for summary in summaries]
+            return [order for order in orders if order is not None]
+
+        rows = await self.read(read_page)
+        return {"page": page, "page_size": page_size, "orders": [order_json(order) for order in rows[:page_size]],
+                "next_page": page + 1 if len(rows) > page_size else None}
+
+    async def place_order(self, body):
+        try:
+            request = json.loads(body or b"{}")
+            customer = str(request.get("customer", ""))
+            lines = [(str(line["name"]), int(line["quantity"])) for line in request.get("items", [])]
+        except (ValueError, TypeError, KeyError, AttributeError):
+            raise ApiError(400, 'Expected {"customer": ..., "items": [{"name": ..., "quantity": ...}]}.')
+
+        # Same checks as the till: menu, quantity, stock held by other open orders
+        book = OrderBook(self.menu_items, self.inventory, customer=customer, stock=self.stock)
+        try:
+            for name, quantity in lines:
+                book.add(name, quantity)
+            book.validate()
+        except OrderError as e:
+            book.clear()
+            raise ApiError(400, str(e))
+
+        try:
+            order_seq = await self.station_thread.run(lambda store: self.station.allocate_order_seq())
+        except Exception:
+            book.clear()
+            raise
+        order = book.place(f"ORD{order_seq:04d}")
+        self.station.sale_submitted(order)
+
+        # Answer only once the order is on disk
+        saved = self.loop.create_future()
+        self.writer.submit_order(order, saved.set_result)
+        error = await saved
+        self.station.sale_finished(order)
+        if error is not None:
+            book.restore(order)
+            if isinstance(error, storage.StockError):
+                raise ApiError(409, str(error))
+            raise ApiError(500, f"Failed to save order: {error}")
+        return 201, {"order": order_json(order)}
+
+
+def order_json(order):
+    """An order as the API answers it, amounts in rupees and in paisa"""
+    return dict(order, total=money.rupees(order["total"]), total_paisa=order["total"],
+                items=[dict(item, price=money.rupees(item["price"]), price_paisa=item["price"])
+                       for item in order["items"]])
+
+
+async def read_request(reader):
+    """Read one HTTP request, returns None when the client hung up"""
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return None
+    try:
+        method, target, version = request_line.decode("latin-1").split()
+    except ValueError:
+        raise ApiError(400, "Bad request line.")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get("content-length", 0) or 0)
+    except ValueError:
+        raise ApiError(400, "Bad Content-Length.")
+    if length < 0:
+        raise ApiError(400, "Bad Content-Length.")
+    if length > MAX_BODY_SIZE:
+        raise ApiError(413, "Request body too large.")
+    body = await reader.readexactly(length) if length else b""
+
+    url = urlsplit(target)
+    query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+    keep_alive = (version == "HTTP/1.1" and headers.get("connection", "").lower() != "close")
+    return method.upper(), url.path, query, body, keep_alive
+
+
+def write_response(writer, status, payload, keep_alive):
+    body = json.dumps(payload).encode("utf-8")
+    head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    writer.write(head.encode("latin-1") + body)
+
+
+async def serve_client(api, reader, writer):
+    try:
+        while True:
+            keep_alive = False
+            try:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                method, path, query, body, keep_alive = request
+                status, payload = await api.handle(method, path, query, body)
+            except ApiError as e:
+                status, payload = e.status, {"error": str(e)}
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+            except Exception as e:
+                status, payload = 500, {"error": f"Internal error: {e}"}
+            write_response(writer, status, payload, keep_alive)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def run_server(host=DEFAULT_HOST, port=DEFAULT_PORT, backend=None):
+    store = storage.open_storage(backend)
+    store.initialize()
+    api = OrderApi(store, asyncio.get_running_loop())
+    server = await asyncio.start_server(lambda r, w: serve_client(api, r, w), host, port)
+    sync_task = asyncio.create_task(api.sync_stock())
+    print(f"Cafe order API listening on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        sync_task.cancel()
+        api.close()
+        store.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cafe order intake API")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--storage", choices=["text", "sqlite"], help="storage backend (default: as the app)")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(run_server(args.host, args.port, args.storage))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,394 @@
+"""Benchmarks for the cafe storage and order paths.
+
+Generate a synthetic cafe of any size, time the operations the app relies
+on and keep the results as JSON so two versions can be compared:
+
+    python benchmark.py generate data --orders 1000000 --skus 1000
+    python benchmark.py run data --output before.json
+    ... change the code ...
+    python benchmark.py run data --output after.json
+    python benchmark.py compare before.json after.json
+
+``run`` without a directory generates a throwaway dataset first
+(``--orders``/``--skus``). The timed operations are the storage methods
+behind the app's ``load_menu()``, ``load_inventory()``, ``save_inventory()``,
+``load_orders()`` and ``save_order()`` plus building orders in an
+``OrderBook``. The placement benchmarks add orders to the dataset.
+"""
+
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import coordinator
+import inventory_journal
+import kitchen
+import money
+import order_archive
+import order_log
+import persistence
+import rollups
+import search_index
+import startup_cache
+import storage
+from order_book import OrderBook
+from order_table import OrderTable
+
+RESULTS_VERSION = 1
+
+# Names used to make up menu items and customers
+ITEM_WORDS = ["Coffee", "Tea", "Latte", "Mocha", "Sandwich", "Cake", "Muffin", "Bagel",
+              "Burger", "Fries", "Juice", "Water", "Salad", "Wrap", "Cookie", "Brownie"]
+ITEM_STYLES = ["", "Iced", "Large", "Small", "Vegan", "Double", "Spicy", "House"]
+CUSTOMER_NAMES = ["Ali", "Sara", "Ahmed", "Fatima", "John", "Maria", "Omar", "Aisha",
+                  "David", "Zain", "Hina", "Bilal", "Emma", "Usman", "Noor", "Walk-in"]
+
+ORDERS_PER_DAY = 300
+OPENING_HOUR = 8
+CLOSING_HOUR = 22
+
+
+def make_menu(skus, rng):
+    """Menu of ``skus`` items with made-up names and prices"""
+    menu_items = {}
+    for number in range(skus):
+        word = ITEM_WORDS[number % len(ITEM_WORDS)]
+        style = ITEM_STYLES[(number // len(ITEM_WORDS)) % len(ITEM_STYLES)]
+        name = f"{style} {word}".strip()
+        if number >= len(ITEM_WORDS) * len(ITEM_STYLES):
+            name = f"{name} {number}"
+        menu_items[name] = rng.randrange(20, 500, 5) * money.PAISA_PER_RUPEE
+    return menu_items
+
+
+def iter_synthetic_orders(count, menu_items, rng, end=None):
+    """Yield ``count`` orders oldest first, ending around ``end`` (default now)
+
+    A few items sell far more than the rest, as on a real menu, and orders
+    are spread over the opening hours of consecutive days.
+    """
+    names = list(menu_items)
+    # Item popularity falls off with its rank
+    cum_weights = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(len(names))))
+    days = max(1, -(-count // ORDERS_PER_DAY))
+    end = end or datetime.now()
+    first_day = (end - timedelta(days=days - 1)).replace(hour=OPENING_HOUR, minute=0, second=0, microsecond=0)
+    open_seconds = (CLOSING_HOUR - OPENING_HOUR) * 3600
+
+    for seq in range(1, count + 1):
+        day, slot = divmod(seq - 1, ORDERS_PER_DAY)
+        seconds = slot * open_seconds // ORDERS_PER_DAY
+        timestamp = first_day + timedelta(days=day, seconds=seconds)
+        chosen = rng.choices(names, cum_weights=cum_weights, k=rng.randint(1, 5))
+        items = []
+        for name in dict.fromkeys(chosen):
+            items.append({"name": name, "quantity": chosen.count(name), "price": menu_items[name]})
+        total = sum(item["price"] * item["quantity"] for item in items)
+        status = "Completed" if rng.random() < 0.97 else "Cancelled"
+        yield {"id": f"ORD{seq:04d}", "timestamp": timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+               "customer": rng.choice(CUSTOMER_NAMES), "items": items, "total": total, "status": status}
+
+
+@contextlib.contextmanager
+def in_directory(path):
+    # The storage backends use file names relative to the working directory
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def generate(directory, orders, skus, backend="text", seed=1, archive=True):
+    """Write a synthetic dataset into ``directory``, replacing what is there"""
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    with in_directory(directory):
+        databases = (storage.DATABASE_FILE, rollups.ROLLUP_DATABASE, search_index.SEARCH_DATABASE,
+                     kitchen.KITCHEN_DATABASE)
+        for name in (storage.MENU_FILE, storage.INVENTORY_FILE, storage.ORDERS_FILE, storage.RECIPES_FILE,
+                     order_log.index_path(storage.ORDERS_FILE), inventory_journal.journal_path(storage.INVENTORY_FILE),
+                     inventory_journal.events_path(storage.INVENTORY_FILE),
+                     inventory_journal.history_path(storage.INVENTORY_FILE),
+                     inventory_journal.history_index_path(storage.INVENTORY_FILE), coordinator.COUNTER_FILE,
+                     startup_cache.SNAPSHOT_FILE,
+                     *(database + suffix for database in databases for suffix in ("", "-wal", "-shm"))):
+            if os.path.exists(name):
+                os.remove(name)
+        shutil.rmtree(order_archive.archive_dir(storage.ORDERS_FILE), ignore_errors=True)
+
+        menu_items = make_menu(skus, rng)
+        with open(storage.MENU_FILE, "w") as file:
+            file.writelines(f"{name},{money.text(price)}\n" for name, price in menu_items.items())
+        # Plenty of stock, so the placement benchmarks never run out
+        with open(storage.INVENTORY_FILE, "w") as file:
+            file.writelines(f"{name},{10 ** 9}\n" for name in menu_items)
+
+        with open(storage.ORDERS_FILE, "w") as file:
+            batch = []
+            for order in iter_synthetic_orders(orders, menu_items, rng):
+                batch.append(order_log.format_order_line(order["id"], order["timestamp"], order["customer"],
+                                                         order["items"], order["total"], order["status"]))
+                if len(batch) >= 10000:
+                    file.writelines(batch)
+                    batch = []
+            file.writelines(batch)
+        order_log.rebuild_index(storage.ORDERS_FILE)
+        if archive:
+            # As a running till leaves it: finished days in compressed segments
+            order_log.roll_log(storage.ORDERS_FILE)
+
+        if backend == "sqlite":
+            target = storage.SqliteStorage()
+            try:
+                storage.migrate_text_to_sqlite(storage.TextStorage(), target, force=True)
+            finally:
+                target.close()
+        else:
+            # A running till has its sales totals and search index up to date
+            source = storage.TextStorage()
+            try:
+                source.rebuild_rollups()
+                source.rebuild_search()
+            finally:
+                source.close()
+
+        with open("benchmark.json", "w") as file:
+            json.dump({"orders": orders, "skus": skus, "seed": seed, "storage": backend}, file)
+
+
+# Timing
+
+def timed(function, operations=1, repeat=1):
+    """Run ``function`` ``repeat`` times, keep the fastest run"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return {"seconds": round(best, 6), "operations": operations,
+            "per_second": round(operations / best, 1) if best else None}
+
+
+def bench_startup(backend):
+    # What the app does before its window appears
+    store = storage.open_storage(backend)
+    try:
+        store.initialize()
+        store.load_menu()
+        store.load_inventory()
+        store.next_order_seq()
+    finally:
+        store.close()
+
+
+def bench_report(store):
+    # Sales per item and revenue per day, the kind of summary a report needs
+    sold = {}
+    revenue = {}
+    for order in store.iter_orders(status="Completed"):
+        day = order["timestamp"][:10]
+        revenue[day] = revenue.get(day, 0) + order["total"]
+        for item in order["items"]:
+            sold[item["name"]] = sold.get(item["name"], 0) + item["quantity"]
+    return sold, revenue
+
+
+def bench_build_orders(menu_items, inventory, count, rng):
+    names = list(menu_items)
+    book = OrderBook(menu_items, dict(inventory), customer="Bench")
+    for _ in range(count):
+        for name in rng.sample(names, min(3, len(names))):
+            book.add(name, 1)
+        book.remove(book.items()[0]["name"])
+        book.validate()
+        book.clear()
+
+
+def _new_orders(menu_items, first_seq, count, rng):
+    orders = list(iter_synthetic_orders(count, menu_items, rng))
+    for offset, order in enumerate(orders):
+        order["id"] = f"ORD{first_seq + offset:04d}"
+    return orders
+
+
+def run(directory, backend=None, sales=200, repeat=3, seed=1):
+    """Time every benchmark against the dataset in ``directory``"""
+    rng = random.Random(seed)
+    results = {}
+    with in_directory(directory):
+        dataset = {}
+        if os.path.exists("benchmark.json"):
+            with open("benchmark.json") as file:
+                dataset = json.load(file)
+        backend = backend or dataset.get("storage")
+
+        results["startup"] = timed(lambda: bench_startup(backend), repeat=repeat)
+        store = storage.open_storage(backend)
+        try:
+            order_count = store.order_count()
+            menu_items = store.load_menu()
+            inventory = store.load_inventory()
+            results["load_menu"] = timed(store.load_menu, repeat=repeat)
+            results["load_inventory"] = timed(store.load_inventory, repeat=repeat)
+            results["save_inventory"] = timed(lambda: store.save_inventory(inventory), repeat=repeat)
+
+            results["load_orders"] = timed(lambda: sum(1 for _ in store.iter_orders()), order_count)
+            results["load_order_table"] = timed(lambda: OrderTable(store.iter_orders()), order_count)
+            last_order = store.read_order(f"ORD{store.next_order_seq() - 1:04d}")
+            if last_order is not None:
+                last_day = last_order["timestamp"][:10]
+                day_count = sum(1 for _ in store.iter_orders(since=last_day))
+                results["load_orders_last_day"] = timed(
+                    lambda: sum(1 for _ in store.iter_orders(since=last_day)), day_count, repeat)
+            if order_count:
+                lookups = [f"ORD{rng.randint(1, order_count):04d}" for _ in range(1000)]
+                results["read_order"] = timed(lambda: [store.read_order(order_id) for order_id in lookups],
+                                              len(lookups), repeat)
+            results["report"] = timed(lambda: bench_report(store), order_count)
+            if last_order is not None and last_order["items"]:
+                # A customer, an item prefix, and both together, as typed into the history search box
+                customer_word = last_order["customer"].split()[0]
+                item_word = last_order["items"][0]["name"].split()[0][:3]
+                queries = [customer_word, f"item:{item_word}", f"{customer_word} {item_word}"]
+                results["search"] = timed(lambda: [store.order_page(0, 100, search=query) for query in queries],
+                                          len(queries), repeat)
+
+            results["build_orders"] = timed(
+                lambda: bench_build_orders(menu_items, inventory, 1000, random.Random(seed)), 1000, repeat)
+
+            # One sale, one sync: how the till saved orders before the background writer
+            orders = _new_orders(menu_items, store.next_order_seq(), sales, rng)
+            results["save_order"] = timed(lambda: [store.commit_order(order) for order in orders], sales)
+        finally:
+            store.close()
+
+        # Sales queued faster than the disk syncs, as on a busy till
+        orders = _new_orders(menu_items, order_count + sales + 1, sales, rng)
+
+        def place_with_writer():
+            writer = persistence.BackgroundWriter(lambda: storage.open_storage(backend))
+            for order in orders:
+                writer.submit_order(order, None)
+            writer.close()
+        results["save_order_group_commit"] = timed(place_with_writer, sales)
+
+    return {
+        "version": RESULTS_VERSION,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "storage": backend or "text",
+        "dataset": {"orders": dataset.get("orders", order_count), "skus": dataset.get("skus", len(menu_items))},
+        "results": results,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old, new, threshold=0.10):
+    """Print the change per benchmark, returns the names that got slower than ``threshold``"""
+    slower = []
+    print(f"{'benchmark':<26}{'old (s)':>12}{'new (s)':>12}{'change':>10}")
+    for name, result in new["results"].items():
+        before = old["results"].get(name)
+        if before is None or not before["seconds"]:
+            print(f"{name:<26}{'-':>12}{result['seconds']:>12.4f}{'new':>10}")
+            continue
+        change = result["seconds"] / before["seconds"] - 1
+        mark = ""
+        if change > threshold:
+            slower.append(name)
+            mark = "  slower"
+        print(f"{name:<26}{before['seconds']:>12.4f}{result['seconds']:>12.4f}{change:>+10.1%}{mark}")
+    return slower
+
+
+def print_results(report):
+    print(f"{report['storage']} storage, {report['dataset']['orders']} orders, {report['dataset']['skus']} items")
+    for name, result in report["results"].items():
+        rate = f"{result['per_second']:>14,.0f}/s" if result["per_second"] else ""
+        print(f"{name:<26}{result['seconds']:>12.4f}s{rate}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cafe benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    gen = commands.add_parser("generate", help="write a synthetic dataset")
+    gen.add_argument("directory")
+    gen.add_argument("--orders", type=int, default=100000)
+    gen.add_argument("--skus", type=int, default=100)
+    gen.add_argument("--storage", choices=["text", "sqlite"], default="text")
+    gen.add_argument("--seed", type=int, default=1)
+    gen.add_argument("--no-archive", dest="archive", action="store_false",
+                     help="leave every order in the live log instead of daily segments")
+
+    bench = commands.add_parser("run", help="time the benchmarks and write JSON results")
+    bench.add_argument("directory", nargs="?", help="dataset to use (default: a generated one)")
+    bench.add_argument("--orders", type=int, default=100000, help="size of the generated dataset")
+    bench.add_argument("--skus", type=int, default=100, help="size of the generated dataset")
+    bench.add_argument("--storage", choices=["text", "sqlite"])
+    bench.add_argument("--sales", type=int, default=200, help="orders saved by the placement benchmarks")
+    bench.add_argument("--repeat", type=int, default=3)
+    bench.add_argument("--seed", type=int, default=1)
+    bench.add_argument("--output", help="write the results to this JSON file")
+
+    cmp = commands.add_parser("compare", help="compare two result files")
+    cmp.add_argument("old")
+    cmp.add_argument("new")
+    cmp.add_argument("--threshold", type=float, default=0.10, help="slowdown that counts as a regression")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        generate(args.directory, args.orders, args.skus, args.storage, args.seed, args.archive)
+        print(f"Wrote {args.orders} orders and {args.skus} items to {args.directory}")
+        return 0
+
+    if args.command == "run":
+        temp_dir = None
+        directory = args.directory
+        if directory is None:
+            temp_dir = directory = tempfile.mkdtemp(prefix="cafe-bench-")
+            generate(directory, args.orders, args.skus, args.storage or "text", args.seed)
+        try:
+            report = run(directory, args.storage, args.sales, args.repeat, args.seed)
+        finally:
+            if temp_dir is not None:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+        print_results(report)
+        if args.output:
+            with open(args.output, "w") as file:
+                json.dump(report, file, indent=2)
+        return 0
+
+    with open(args.old) as file:
+        old = json.load(file)
+    with open(args.new) as file:
+        new = json.load(file)
+    slower = compare(old, new, args.threshold)
+    return 1 if slower else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
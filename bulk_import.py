@@ -0,0 +1,196 @@
+"""Bulk import of price lists and restock sheets.
+
+Two kinds of file, as CSV (with a header row) or JSON (a list of objects, or
+``{"items": [...]}``):
+
+    price list      name, price[, stock]    new items and price changes;
+                                            stock is the starting stock of
+                                            new items
+    restock sheet   name, quantity          a delivery, added to the stock
+
+Column names are matched without case; "item" works for "name" and
+"quantity" for "stock". The whole file is checked in one pass before
+anything is written: every problem is reported with its row number and a
+file with problems is not imported at all. The rows are then merged with the
+menu and stock as they are (an unchanged price is no change, a restock sheet
+may list an item more than once), and the storage backend writes each file
+once (see ``import_items`` in ``storage``).
+
+    python bulk_import.py menu prices.csv [--dry-run]
+    python bulk_import.py restock delivery.json [--dry-run]
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+
+import money
+import order_log
+
+MENU = "menu"
+RESTOCK = "restock"
+
+# Other names accepted for the columns
+COLUMN_NAMES = {"item": "name", "quantity": "stock", "qty": "stock"}
+
+
+def read_rows(path):
+    """The rows of a CSV or JSON file as dicts with lower case keys"""
+    if os.path.splitext(path)[1].lower() == ".json":
+        with open(path, "r", encoding="utf-8") as file:
+            data = json.load(file)
+        if isinstance(data, dict):
+            data = data.get("items", [])
+        if not isinstance(data, list) or not all(isinstance(row, dict) for row in data):
+            raise ValueError("Expected a list of objects")
+        rows = data
+    else:
+        with open(path, "r", encoding="utf-8-sig", newline="") as file:
+            rows = list(csv.DictReader(file))
+    return [{COLUMN_NAMES.get(str(key).strip().lower(), str(key).strip().lower()): value
+             for key, value in row.items() if key is not None} for row in rows]
+
+
+def _text(value):
+    return "" if value is None else str(value).strip()
+
+
+class ImportPlan:
+    """What an import changes, or the problems that stop it
+
+    ``prices`` (name -> price in paisa) are new items and changed prices,
+    ``new_stock`` (name -> quantity) the starting stock of new items and
+    ``restocks`` (name -> quantity) stock to add.
+    """
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.rows = 0
+        self.prices = {}
+        self.new_stock = {}
+        self.restocks = {}
+        self.new_items = []
+        self.problems = []
+
+    def __bool__(self):
+        return bool(self.prices or self.new_stock or self.restocks)
+
+    def summary(self):
+        if self.problems:
+            shown = "\n".join(self.problems[:20])
+            more = f"\n... and {len(self.problems) - 20} more" if len(self.problems) > 20 else ""
+            return f"{len(self.problems)} problems in {self.rows} rows, nothing was imported:\n{shown}{more}"
+        if self.kind == MENU:
+            changed = len(self.prices) - len(self.new_items)
+            return f"{self.rows} rows: {len(self.new_items)} new items, {changed} price changes"
+        units = sum(self.restocks.values())
+        return f"{self.rows} rows: {units} units for {len(self.restocks)} stock items"
+
+    def apply(self, menu_items, inventory):
+        """Merge the changes into in-memory dicts, returns the names whose stock changed"""
+        menu_items.update(self.prices)
+        inventory.update(self.new_stock)
+        for name, quantity in self.restocks.items():
+            inventory[name] = inventory.get(name, 0) + quantity
+        return list(self.new_stock) + list(self.restocks)
+
+
+def plan_import(rows, kind, menu_items, inventory):
+    """Check every row and merge them with the current menu and stock"""
+    plan = ImportPlan(kind)
+    plan.rows = len(rows)
+    seen = {}
+    for number, row in enumerate(rows, start=1):
+        name = _text(row.get("name"))
+        if not name:
+            plan.problems.append(f"Row {number}: no name")
+            continue
+        if order_log.has_separator(name):
+            plan.problems.append(f"Row {number}: {name!r}: names can't contain , ; : or line breaks")
+            continue
+
+        if kind == MENU:
+            if name in seen:
+                plan.problems.append(f"Row {number}: {name} is also on row {seen[name]}")
+                continue
+            seen[name] = number
+            try:
+                price = money.parse(_text(row.get("price")))
+            except ValueError:
+                plan.problems.append(f"Row {number}: {name}: price must be a number")
+                continue
+            if price <= 0:
+                plan.problems.append(f"Row {number}: {name}: price must be greater than 0")
+                continue
+            stock_text = _text(row.get("stock"))
+            try:
+                stock = int(stock_text) if stock_text else 0
+            except ValueError:
+                plan.problems.append(f"Row {number}: {name}: stock must be a whole number")
+                continue
+            if stock < 0:
+                plan.problems.append(f"Row {number}: {name}: stock cannot be negative")
+                continue
+
+            if name not in menu_items:
+                plan.new_items.append(name)
+                plan.prices[name] = price
+                plan.new_stock[name] = stock
+            elif menu_items[name] != price:
+                plan.prices[name] = price
+        else:
+            try:
+                quantity = int(_text(row.get("stock")))
+            except ValueError:
+                plan.problems.append(f"Row {number}: {name}: quantity must be a whole number")
+                continue
+            if quantity <= 0:
+                plan.problems.append(f"Row {number}: {name}: quantity must be greater than 0")
+                continue
+            # A delivery may list an item on several rows
+            plan.restocks[name] = plan.restocks.get(name, 0) + quantity
+
+    if plan.problems:
+        plan.prices, plan.new_stock, plan.restocks, plan.new_items = {}, {}, {}, []
+    return plan
+
+
+def plan_file(path, kind, menu_items, inventory):
+    """Read and check a file, a file that can't be read is one problem"""
+    try:
+        rows = read_rows(path)
+    except (OSError, ValueError, csv.Error, UnicodeDecodeError) as e:
+        plan = ImportPlan(kind)
+        plan.problems.append(f"Can't read {path}: {e}")
+        return plan
+    return plan_import(rows, kind, menu_items, inventory)
+
+
+def main(argv=None):
+    import storage
+
+    parser = argparse.ArgumentParser(description="Import a price list or a restock sheet")
+    parser.add_argument("kind", choices=[MENU, RESTOCK], help="menu: price list, restock: delivery")
+    parser.add_argument("file", help="CSV with a header row, or JSON")
+    parser.add_argument("--dry-run", action="store_true", help="check the file and show what would change")
+    parser.add_argument("--storage", choices=["text", "sqlite"], help="storage backend (default: as the app)")
+    args = parser.parse_args(argv)
+
+    store = storage.open_storage(args.storage)
+    try:
+        plan = plan_file(args.file, args.kind, store.load_menu(), store.load_inventory())
+        print(plan.summary())
+        if plan.problems:
+            return 1
+        if plan and not args.dry_run:
+            store.import_items(plan.prices, plan.new_stock, plan.restocks)
+            print("Imported")
+        return 0
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
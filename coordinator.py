@@ -0,0 +1,196 @@
+"""Coordination between several POS stations sharing one data directory.
+
+Stations work through a file-locking protocol rather than a daemon:
+
+* ``FileLock`` is an exclusive lock on a ``*.lock`` file (``fcntl`` on Unix,
+  ``msvcrt`` on Windows). Every read-modify-write of a shared file (order log
+  and index, inventory journal, order counter) happens under its lock.
+* ``Station.allocate_order_id`` hands out order IDs from a shared counter,
+  so two stations never produce the same ``ORDxxxx``.
+* Sales are checked against the stock on disk while the lock is held (see
+  ``storage``); a station whose view of the stock is out of date gets a
+  ``StockError`` instead of overselling.
+* Each station polls the store's stock version (a cheap ``stat`` or SQLite
+  ``data_version``) and, when another station changed the stock, reloads it
+  into its own inventory dict and refreshes the menu display.
+"""
+
+import os
+import threading
+
+import ingredients
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+# How often a station looks for stock changes made by other stations (milliseconds)
+SYNC_INTERVAL = 1000
+
+COUNTER_FILE = "cafe_orders.counter"
+
+
+class FileLock:
+    """Exclusive lock shared by threads and processes, re-entrant per process
+
+    There is one FileLock per lock file in a process; get it with
+    ``FileLock.for_path``.
+    """
+
+    _locks = {}
+    _locks_guard = threading.Lock()
+
+    @classmethod
+    def for_path(cls, path):
+        key = os.path.abspath(path)
+        with cls._locks_guard:
+            if key not in cls._locks:
+                cls._locks[key] = cls(key)
+            return cls._locks[key]
+
+    def __init__(self, path):
+        self.path = path
+        self.thread_lock = threading.RLock()
+        self.depth = 0
+        self.file = None
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        if self.depth == 0:
+            try:
+                self.file = open(self.path, "a+b")
+                if fcntl is not None:
+                    fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+                else:
+                    self.file.seek(0)
+                    msvcrt.locking(self.file.fileno(), msvcrt.LK_LOCK, 1)
+            except BaseException:
+                if self.file is not None:
+                    self.file.close()
+                    self.file = None
+                self.thread_lock.release()
+                raise
+        self.depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.depth -= 1
+        if self.depth == 0:
+            if fcntl is not None:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+            else:
+                self.file.seek(0)
+                msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+            self.file.close()
+            self.file = None
+        self.thread_lock.release()
+        return False
+
+
+# Build the lock file name for a data file
+def lock_path(path):
+    return os.path.splitext(path)[0] + ".lock"
+
+
+class Station:
+    """This terminal's view of the shared cafe state
+
+    ``inventory`` is the app's own stock dict; it is updated in place when
+    other stations change the stock. Sales placed here but not saved yet
+    are kept off the refreshed numbers until their save finishes, as the
+    ingredients of ``recipes`` they take.
+    """
+
+    def __init__(self, store, inventory, counter_file=COUNTER_FILE, recipes=None):
+        self.store = store
+        self.inventory = inventory
+        self.recipes = {} if recipes is None else recipes
+        self.counter_file = counter_file
+        self.unsaved = {}
+        self.stock_version = store.stock_version()
+
+    def allocate_order_seq(self):
+        """Take the next order number from the shared counter
+
+        The counter has a lock of its own: the order log's lock is held
+        while a batch of orders is synced, and taking a number must not wait
+        for that. The log is only read when there is no counter yet.
+        """
+        with FileLock.for_path(self.counter_file + ".lock"):
+            try:
+                with open(self.counter_file, "r") as file:
+                    last = int(file.read().strip())
+            except (FileNotFoundError, ValueError):
+                # First use, or orders saved by a version without the counter
+                last = self.store.next_order_seq() - 1
+            seq = last + 1
+            temp_file = self.counter_file + ".tmp"
+            with open(temp_file, "w") as file:
+                file.write(f"{seq}\n")
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_file, self.counter_file)
+            return seq
+
+    def allocate_order_id(self):
+        return f"ORD{self.allocate_order_seq():04d}"
+
+    def sale_submitted(self, order):
+        """Note a sale that was taken from stock but is still being saved"""
+        for ingredient, quantity in ingredients.order_usage(self.recipes, order).items():
+            self.unsaved[ingredient] = self.unsaved.get(ingredient, 0) + quantity
+
+    def sale_finished(self, order):
+        """The save of a sale is over, whether it worked or not"""
+        for ingredient, quantity in ingredients.order_usage(self.recipes, order).items():
+            left = self.unsaved.get(ingredient, 0) - quantity
+            if left > 0:
+                self.unsaved[ingredient] = left
+            else:
+                self.unsaved.pop(ingredient, None)
+        # The saved sale is on disk now, so look again on the next refresh
+        self.stock_version = None
+
+    def refresh(self):
+        """Reload the stock if it changed on disk, returns the changed ingredient names"""
+        stock = self.read_stock()
+        if stock is None:
+            return []
+        return self.apply_stock(*stock)
+
+    def read_stock(self):
+        """The stock version and stock on disk, or None if the stock didn't change
+
+        This is the half of ``refresh`` that touches the store, for callers
+        that do their store work on another thread.
+        """
+        version = self.store.stock_version()
+        if version == self.stock_version:
+            return None
+        return version, self.store.load_inventory()
+
+    def apply_stock(self, version, stock):
+        """Take stock read by ``read_stock`` into the inventory, returns the changed names"""
+        self.stock_version = version
+        changed = []
+        for name, quantity in stock.items():
+            quantity -= self.unsaved.get(name, 0)
+            if self.inventory.get(name) != quantity:
+                self.inventory[name] = quantity
+                changed.append(name)
+        return changed
+
+    def attach(self, root, on_change, interval=SYNC_INTERVAL):
+        """Check for stock changes from the Tk main loop"""
+        def tick():
+            try:
+                changed = self.refresh()
+            except Exception:
+                # A station that can't read the shared files keeps its own view
+                changed = []
+            if changed:
+                on_change(changed)
+            root.after(interval, tick)
+        root.after(interval, tick)
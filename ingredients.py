@@ -0,0 +1,225 @@
+"""Recipes: the ingredients each menu item is made from.
+
+Stock is counted per ingredient (milk, beans, buns), and one ingredient
+feeds many menu items. A recipe maps a menu item to the quantity of each
+ingredient one unit of it takes:
+
+    Latte       Milk 200, Beans 18, Cup 1
+    Cappuccino  Milk 150, Beans 18, Cup 1
+
+An item without a recipe is its own ingredient (one unit of stock per unit
+sold), which is how every item worked before recipes, so existing menus
+keep their stock as is.
+
+``Availability`` keeps how many units of each menu item can still be sold
+from the stock not held by open orders. Reading it is a dict lookup; when an
+ingredient's stock or hold changes, only the items that use it are worked
+out again.
+
+    python ingredients.py show                           list the recipes
+    python ingredients.py set Latte Milk=200 Beans=18    set (or with no ingredients, clear) a recipe
+    python ingredients.py restock Milk 5000              add stock of an ingredient
+"""
+
+import argparse
+import sys
+
+
+def recipe_for(recipes, item):
+    """{ingredient: quantity} for one unit of an item"""
+    return recipes.get(item) or {item: 1}
+
+
+def usage(recipes, quantities):
+    """Ingredient quantities used by ``{item: quantity}``"""
+    used = {}
+    for item, quantity in quantities.items():
+        for ingredient, amount in recipe_for(recipes, item).items():
+            used[ingredient] = used.get(ingredient, 0) + amount * quantity
+    return used
+
+
+def order_usage(recipes, order):
+    """Ingredient quantities an order takes from stock"""
+    used = {}
+    for item in order["items"]:
+        for ingredient, amount in recipe_for(recipes, item["name"]).items():
+            used[ingredient] = used.get(ingredient, 0) + amount * item["quantity"]
+    return used
+
+
+class Availability:
+    """Units of each menu item that can still be sold
+
+    ``inventory`` (ingredient -> stock) and ``reserved`` (ingredient ->
+    quantity held by open orders) are shared dicts; every change to them
+    goes through ``hold``, ``take``, ``restore`` or, for changes made
+    elsewhere (another station), ``update``. ``listener`` is called with the
+    items whose units changed.
+    """
+
+    def __init__(self, menu_items, recipes, inventory, reserved=None):
+        self.menu_items = menu_items
+        self.recipes = recipes
+        self.inventory = inventory
+        self.reserved = {} if reserved is None else reserved
+        self.units = {}
+        # ingredient -> menu items made with it
+        self.users = {}
+        self.listener = None
+        for item in menu_items:
+            self._index(item)
+            self.units[item] = self._units(item)
+
+    def get(self, item):
+        return self.units.get(item, 0)
+
+    def free(self, ingredient):
+        """Stock of an ingredient not held by any open order"""
+        return self.inventory.get(ingredient, 0) - self.reserved.get(ingredient, 0)
+
+    def recipe(self, item):
+        return recipe_for(self.recipes, item)
+
+    def usage(self, quantities):
+        return usage(self.recipes, quantities)
+
+    def _index(self, item):
+        for ingredient in self.recipe(item):
+            self.users.setdefault(ingredient, set()).add(item)
+
+    def _units(self, item):
+        units = None
+        for ingredient, amount in self.recipe(item).items():
+            if amount <= 0:
+                continue
+            possible = max(self.free(ingredient), 0) // amount
+            if units is None or possible < units:
+                units = possible
+        return 0 if units is None else units
+
+    def _notify(self, changed):
+        if changed and self.listener is not None:
+            self.listener(changed)
+
+    def update(self, ingredients):
+        """Work out again the items using these ingredients, returns those that changed"""
+        changed = []
+        seen = set()
+        for ingredient in ingredients:
+            for item in self.users.get(ingredient, ()):
+                if item in seen:
+                    continue
+                seen.add(item)
+                units = self._units(item)
+                if self.units.get(item) != units:
+                    self.units[item] = units
+                    changed.append(item)
+        self._notify(changed)
+        return changed
+
+    def set_item(self, item, recipe=None):
+        """A new menu item, or an item whose recipe changed"""
+        for ingredient in self.recipe(item):
+            users = self.users.get(ingredient)
+            if users is not None:
+                users.discard(item)
+        if recipe:
+            self.recipes[item] = dict(recipe)
+        elif recipe is not None:
+            self.recipes.pop(item, None)
+        self._index(item)
+        self.units[item] = self._units(item)
+        self._notify([item])
+
+    def add_items(self, items):
+        """New menu items (without recipes yet), with one call to the listener"""
+        items = list(items)
+        for item in items:
+            self._index(item)
+            self.units[item] = self._units(item)
+        self._notify(items)
+
+    def hold(self, item, quantity):
+        """Hold (or with a negative quantity, release) the ingredients of ``quantity`` units"""
+        recipe = self.recipe(item)
+        for ingredient, amount in recipe.items():
+            held = self.reserved.get(ingredient, 0) + amount * quantity
+            if held:
+                self.reserved[ingredient] = held
+            else:
+                self.reserved.pop(ingredient, None)
+        self.update(recipe)
+
+    def take(self, quantities):
+        """Take the ingredients of ``{item: quantity}`` out of stock"""
+        used = self.usage(quantities)
+        for ingredient, quantity in used.items():
+            self.inventory[ingredient] = self.inventory.get(ingredient, 0) - quantity
+        self.update(used)
+
+    def restore(self, order):
+        """Give back the ingredients of an order that could not be saved"""
+        used = order_usage(self.recipes, order)
+        for ingredient, quantity in used.items():
+            self.inventory[ingredient] = self.inventory.get(ingredient, 0) + quantity
+        self.update(used)
+
+
+# Parse "Milk=200" command line arguments
+def _parse_ingredient(text):
+    name, separator, quantity = text.rpartition("=")
+    if not separator or not name.strip():
+        raise argparse.ArgumentTypeError(f"Expected INGREDIENT=QUANTITY, got {text}")
+    try:
+        amount = int(quantity)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Quantity must be a whole number: {text}")
+    if amount <= 0:
+        raise argparse.ArgumentTypeError(f"Quantity must be greater than 0: {text}")
+    return name.strip(), amount
+
+
+def main(argv=None):
+    import storage
+
+    options = argparse.ArgumentParser(add_help=False)
+    options.add_argument("--storage", choices=["text", "sqlite"], help="storage backend (default: as the app)")
+    parser = argparse.ArgumentParser(description="Cafe recipes")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("show", parents=[options], help="list the recipes and what each item can still make")
+    set_recipe = commands.add_parser("set", parents=[options], help="set the recipe of a menu item")
+    set_recipe.add_argument("item")
+    set_recipe.add_argument("ingredients", nargs="*", type=_parse_ingredient, metavar="INGREDIENT=QUANTITY")
+    restock = commands.add_parser("restock", parents=[options], help="add stock of an ingredient")
+    restock.add_argument("ingredient")
+    restock.add_argument("quantity", type=int)
+    args = parser.parse_args(argv)
+
+    store = storage.open_storage(args.storage)
+    try:
+        if args.command == "set":
+            if args.item not in store.load_menu():
+                print(f"{args.item} is not on the menu.", file=sys.stderr)
+                return 1
+            store.save_recipe(args.item, dict(args.ingredients))
+            print(f"Saved the recipe of {args.item}" if args.ingredients else f"{args.item} has no recipe now")
+            return 0
+        if args.command == "restock":
+            store.restock(args.ingredient, args.quantity)
+            print(f"Added {args.quantity} {args.ingredient}")
+            return 0
+
+        menu_items = store.load_menu()
+        recipes = store.load_recipes()
+        stock = Availability(menu_items, recipes, store.load_inventory())
+        for item in menu_items:
+            recipe = ", ".join(f"{ingredient} {amount}" for ingredient, amount in stock.recipe(item).items())
+            print(f"{item:<20} {stock.get(item):>6} left   {recipe}")
+        return 0
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,528 @@
+"""Inventory snapshot plus an append-only journal of stock changes.
+
+Instead of rewriting ``cafe_inventory.txt`` on every sale, each change is
+appended to ``cafe_inventory.journal`` as a small record with the time it
+happened and what caused it:
+
+    sale,Milk,200,2024-01-31 15:02:11,ORD0042    stock went down by 200 for order ORD0042
+    restock,Milk,5000,2024-01-31 16:00:00,       stock went up by 5000
+    adjust,Milk,-300,2024-01-31 18:30:00,spilt   stock went down by 300, with a reason
+    add,Muffin,50,2024-01-31 09:00:00,           new item with 50 in stock
+    set,Cake,12,2024-01-31 21:00:00,stock take   stock counted as 12
+
+Every ``COMPACT_EVERY`` records (and on close) the current stock is written
+back to the snapshot file and the journal starts over. Both files carry a
+generation number in their first line; journal records only count when the
+journal's generation matches the snapshot's, so a crash in the middle of a
+compaction can never apply the same records twice. The snapshot keeps the
+plain ``item,quantity`` format, the generation line has no comma and is
+skipped by older readers.
+
+Nothing is thrown away by a compaction: the journal's records move to the
+permanent event log ``cafe_inventory.events`` and the stock they lead to is
+added to ``cafe_inventory.snapshots``, with a fixed size entry per snapshot
+in ``cafe_inventory.snapidx`` (see ``INDEX_ENTRY``). The stock at any point
+in time (``stock_at``) is then the last snapshot taken before it plus at
+most one compaction's worth of events; the event log itself is the audit
+trail of every change (``iter_events``). The history starts with the stock
+of the first compaction after upgrading; records written before that carry
+no time and count as older than any point asked for.
+
+Several stations may share the files: every change happens under a file
+lock, and a journal that changed since we last looked is reloaded first.
+
+    python inventory_journal.py at "2024-01-31 15:00"        stock at a point in time
+    python inventory_journal.py events --item Milk           every change, oldest first
+    python inventory_journal.py adjust Milk -300 --reason spilt
+"""
+
+import argparse
+import bisect
+import json
+import os
+import struct
+import sys
+from datetime import date, datetime
+
+from coordinator import FileLock, lock_path
+
+COMPACT_EVERY = 1000
+
+SALE = "sale"
+RESTOCK = "restock"
+ADJUST = "adjust"
+ADD = "add"
+SET = "set"
+
+# time of its last event ("YYYY-MM-DD HH:MM:SS", empty for the first
+# snapshot), journal generation, journal records it covers, end of those
+# records in the event log, where the snapshot is in the snapshots file and
+# its length
+INDEX_ENTRY = struct.Struct("<19sIIQQI")
+
+
+# Build the journal file name for an inventory file
+def journal_path(snapshot_path):
+    return os.path.splitext(snapshot_path)[0] + ".journal"
+
+
+def events_path(snapshot_path):
+    return os.path.splitext(snapshot_path)[0] + ".events"
+
+
+def history_path(snapshot_path):
+    return os.path.splitext(snapshot_path)[0] + ".snapshots"
+
+
+def history_index_path(snapshot_path):
+    return os.path.splitext(snapshot_path)[0] + ".snapidx"
+
+
+# Read "#generation N" from the first line of a file
+def _generation(line):
+    parts = line.strip().split()
+    if len(parts) == 2 and parts[0] == "#generation" and parts[1].isdigit():
+        return int(parts[1])
+    return 0
+
+
+# Identifies one state of the journal, it changes on every append or compaction
+def journal_stamp(path):
+    try:
+        st = os.stat(path)
+        return st.st_ino, st.st_size, st.st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _write_atomically(path, text):
+    temp_file = path + ".tmp"
+    with open(temp_file, "w") as file:
+        file.write(text)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_file, path)
+
+
+def time_text(value=None):
+    """A time as records carry it, now by default"""
+    if value is None:
+        value = datetime.now()
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(value, date):
+        return value.strftime("%Y-%m-%d")
+    return value
+
+
+def apply_record(inventory, kind, item, quantity):
+    """Apply one journal record to an inventory dict"""
+    if kind == SALE:
+        inventory[item] = inventory.get(item, 0) - quantity
+    elif kind in (RESTOCK, ADJUST):
+        inventory[item] = inventory.get(item, 0) + quantity
+    elif kind in (ADD, SET):
+        inventory[item] = quantity
+    else:
+        raise ValueError(f"Unknown inventory record: {kind}")
+
+
+def format_record(kind, item, quantity, time="", ref=""):
+    # Commas would start a new field
+    return f"{kind},{item},{quantity},{time},{str(ref).replace(',', ' ')}\n"
+
+
+def parse_record(line):
+    """(kind, item, quantity, time, ref) from a record line, None if it isn't one
+
+    Records from before times were kept have three fields, their time is "".
+    """
+    parts = line.rstrip("\n").split(",")
+    if len(parts) < 3:
+        return None
+    time = parts[3] if len(parts) > 3 else ""
+    ref = parts[4] if len(parts) > 4 else ""
+    return parts[0], parts[1], int(parts[2]), time, ref
+
+
+def _read_index(path):
+    # Entries whose bytes are all there, a crash can leave part of one
+    try:
+        with open(path, "rb") as file:
+            data = file.read()
+    except FileNotFoundError:
+        return []
+    entries = []
+    for offset in range(0, len(data) - INDEX_ENTRY.size + 1, INDEX_ENTRY.size):
+        time, generation, count, events_end, snapshot_offset, snapshot_length = INDEX_ENTRY.unpack_from(data, offset)
+        entries.append((time.rstrip(b"\0").decode("ascii"), generation, count, events_end,
+                        snapshot_offset, snapshot_length))
+    return entries
+
+
+def _truncate(path, size):
+    try:
+        if os.path.getsize(path) > size:
+            with open(path, "r+b") as file:
+                file.truncate(size)
+    except FileNotFoundError:
+        pass
+
+
+def _append_bytes(path, data):
+    # Returns where the data starts
+    with open(path, "ab") as file:
+        start = file.tell()
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    return start
+
+
+class InventoryJournal:
+    """The inventory as a snapshot file plus a journal of changes since"""
+
+    def __init__(self, snapshot_path, compact_every=COMPACT_EVERY):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path(snapshot_path)
+        self.events_path = events_path(snapshot_path)
+        self.history_path = history_path(snapshot_path)
+        self.history_index_path = history_index_path(snapshot_path)
+        self.compact_every = compact_every
+        self.inventory = {}
+        self.generation = 0
+        self.pending = 0
+        self.loaded = False
+        self.stamp = None
+        self.lock = FileLock.for_path(lock_path(snapshot_path))
+
+    def _read_snapshot(self):
+        inventory = {}
+        generation = 0
+        with open(self.snapshot_path, "r") as file:
+            for number, line in enumerate(file):
+                if number == 0 and line.startswith("#"):
+                    generation = _generation(line)
+                    continue
+                line = line.strip()
+                if line:
+                    parts = line.split(",")
+                    if len(parts) >= 2:
+                        inventory[parts[0].strip()] = int(parts[1].strip())
+        return inventory, generation
+
+    def _read_journal(self, generation):
+        # Complete records of the journal if it belongs to ``generation``, and their raw lines
+        records = []
+        lines = []
+        try:
+            with open(self.journal_path, "rb") as file:
+                header = file.readline()
+                if not header.endswith(b"\n") or _generation(header.decode("utf-8")) != generation:
+                    return None, None
+                for raw_line in file:
+                    if not raw_line.endswith(b"\n"):
+                        break
+                    record = parse_record(raw_line.decode("utf-8"))
+                    if record is not None:
+                        records.append(record)
+                        lines.append(raw_line)
+        except FileNotFoundError:
+            return None, None
+        return records, lines
+
+    def load(self):
+        """Rebuild the stock from the snapshot and the journal tail"""
+        with self.lock:
+            inventory, generation = self._read_snapshot()
+
+            pending = 0
+            valid_size = 0
+            try:
+                with open(self.journal_path, "rb") as file:
+                    header = file.readline()
+                    valid_size = len(header)
+                    if header.endswith(b"\n") and _generation(header.decode("utf-8")) == generation:
+                        for raw_line in file:
+                            # A crash can leave half a record at the end, ignore it
+                            if not raw_line.endswith(b"\n"):
+                                break
+                            record = parse_record(raw_line.decode("utf-8"))
+                            if record is not None:
+                                apply_record(inventory, *record[:3])
+                                pending += 1
+                            valid_size += len(raw_line)
+                    else:
+                        # Journal from before the last compaction, already in the snapshot
+                        valid_size = -1
+            except FileNotFoundError:
+                valid_size = -1
+
+            if valid_size == -1:
+                _write_atomically(self.journal_path, f"#generation {generation}\n")
+            elif valid_size != os.path.getsize(self.journal_path):
+                with open(self.journal_path, "r+b") as file:
+                    file.truncate(valid_size)
+
+            self.inventory = inventory
+            self.generation = generation
+            self.pending = pending
+            self.loaded = True
+            self.stamp = journal_stamp(self.journal_path)
+            return dict(inventory)
+
+    def _refresh(self):
+        # Pick up records written by other stations (or load for the first time)
+        if not self.loaded or journal_stamp(self.journal_path) != self.stamp:
+            self.load()
+
+    def append(self, records, sync=True):
+        """Append ``(kind, item, quantity[, time, ref])`` records with one write"""
+        if not records:
+            return
+        with self.lock:
+            self._refresh()
+            self._append(records, sync)
+
+    def _append(self, records, sync):
+        now = time_text()
+        lines = []
+        for record in records:
+            kind, item, quantity = record[:3]
+            apply_record(self.inventory, kind, item, quantity)
+            lines.append(format_record(kind, item, quantity, record[3] if len(record) > 3 else now,
+                                       record[4] if len(record) > 4 else ""))
+        with open(self.journal_path, "a") as file:
+            file.write("".join(lines))
+            if sync:
+                file.flush()
+                os.fsync(file.fileno())
+        self.stamp = journal_stamp(self.journal_path)
+        self.pending += len(records)
+        if self.pending >= self.compact_every:
+            self._write_snapshot()
+
+    def record_sales(self, sales, sync=True, origins=None):
+        """Record the sales the stock on disk allows, with one write
+
+        ``sales`` is a list of ``{item: quantity}`` dicts, ``origins`` an
+        optional ``(time, order id)`` per sale for its records. A sale is
+        refused as a whole if any of its items is unknown or short; the
+        result has one entry per sale, None if it was recorded or the reason
+        it wasn't.
+        """
+        with self.lock:
+            self._refresh()
+            stock = dict(self.inventory)
+            records = []
+            results = []
+            now = time_text()
+            for number, quantities in enumerate(sales):
+                problem = None
+                for item, quantity in quantities.items():
+                    if item not in stock:
+                        problem = f"{item} not found in inventory."
+                    elif stock[item] < quantity:
+                        problem = f"Not enough stock for {item}. Only {stock[item]} available."
+                    if problem:
+                        break
+                results.append(problem)
+                if problem is None:
+                    time, ref = origins[number] if origins is not None else (now, "")
+                    for item, quantity in quantities.items():
+                        stock[item] -= quantity
+                        records.append((SALE, item, quantity, time, ref))
+            if records:
+                self._append(records, sync)
+            return results
+
+    def record_sale(self, quantities, sync=True):
+        self.append([(SALE, item, quantity) for item, quantity in quantities.items()], sync)
+
+    def record_restock(self, item, quantity, sync=True):
+        self.append([(RESTOCK, item, quantity)], sync)
+
+    def record_adjust(self, item, quantity, reason="", sync=True):
+        """Stock lost or found outside a sale (waste, breakage, a miscount)"""
+        self.append([(ADJUST, item, quantity, time_text(), reason)], sync)
+
+    def record_add(self, item, quantity, sync=True):
+        self.append([(ADD, item, quantity)], sync)
+
+    def replace(self, inventory, reason="stock take"):
+        """Overwrite the whole stock, e.g. after a manual stock take"""
+        with self.lock:
+            self._refresh()
+            now = time_text()
+            records = [(SET, item, quantity, now, reason) for item, quantity in inventory.items()
+                       if self.inventory.get(item) != quantity]
+            # Items left out keep their stock, as when the file was rewritten
+            if records:
+                self._append(records, sync=True)
+            self._write_snapshot()
+
+    def compact(self):
+        """Fold the journal into a new snapshot and start an empty journal"""
+        with self.lock:
+            if self.loaded:
+                self._refresh()
+                if self.pending:
+                    self._write_snapshot()
+
+    def _write_snapshot(self):
+        generation = self.generation + 1
+        # History first: until the journal is reset its records are still there to archive
+        self._archive()
+        lines = [f"#generation {generation}\n"]
+        lines.extend(f"{item},{quantity}\n" for item, quantity in self.inventory.items())
+        # Snapshot first: until the new journal exists the old one is ignored
+        _write_atomically(self.snapshot_path, "".join(lines))
+        _write_atomically(self.journal_path, f"#generation {generation}\n")
+        self.generation = generation
+        self.pending = 0
+        self.stamp = journal_stamp(self.journal_path)
+
+    def _archive(self):
+        """Move the journal's records to the event log and snapshot the stock they lead to
+
+        An index entry is the commit point: the event log and snapshots
+        beyond the last entry are what an interrupted archive left behind.
+        """
+        entries = _read_index(self.history_index_path)
+        records, lines = self._read_journal(self.generation)
+        if records is None:
+            return
+        # Records of this journal already archived before a crash
+        done = sum(entry[2] for entry in entries if entry[1] == self.generation)
+        if entries and done >= len(records):
+            return
+
+        if entries:
+            last = entries[-1]
+            _truncate(self.events_path, last[3])
+            _truncate(self.history_path, last[4] + last[5])
+        else:
+            # The history starts with the stock before this journal
+            _truncate(self.events_path, 0)
+            _truncate(self.history_path, 0)
+            self._add_entry("", self._read_snapshot()[0], 0, 0)
+
+        if len(records) > done:
+            _append_bytes(self.events_path, b"".join(lines[done:]))
+            # Stamped with its last event, events are recorded in time order
+            time = max(record[3] for record in records[done:]) or time_text()
+            self._add_entry(time, self.inventory, len(records) - done, os.path.getsize(self.events_path))
+
+    def _add_entry(self, time, inventory, count, events_end):
+        data = (json.dumps({"time": time, "generation": self.generation, "stock": inventory}) + "\n").encode("utf-8")
+        offset = _append_bytes(self.history_path, data)
+        _append_bytes(self.history_index_path, INDEX_ENTRY.pack(time.encode("ascii"), self.generation, count,
+                                                                events_end, offset, len(data)))
+
+    def _read_history(self, entry):
+        with open(self.history_path, "rb") as file:
+            file.seek(entry[4])
+            return json.loads(file.read(entry[5]))["stock"]
+
+    def _read_events(self, start, end):
+        if end <= start:
+            return []
+        with open(self.events_path, "rb") as file:
+            file.seek(start)
+            data = file.read(end - start)
+        records = [parse_record(line) for line in data.decode("utf-8").splitlines(keepends=True)]
+        return [record for record in records if record is not None]
+
+    def _unarchived(self, entries):
+        # Journal records not in the event log yet
+        _, generation = self._read_snapshot()
+        records, _ = self._read_journal(generation)
+        if records is None:
+            return []
+        return records[sum(entry[2] for entry in entries if entry[1] == generation):]
+
+    def stock_at(self, when):
+        """The stock as it was at a point in time (datetime or "YYYY-MM-DD[ HH:MM:SS]")
+
+        Reads the last snapshot taken at or before it and the events after
+        that snapshot, up to the time asked for.
+        """
+        when = time_text(when)
+        with self.lock:
+            entries = _read_index(self.history_index_path)
+            if not entries:
+                inventory, _ = self._read_snapshot()
+                records = self._unarchived(entries)
+            else:
+                position = max(bisect.bisect_right([entry[0] for entry in entries], when) - 1, 0)
+                inventory = self._read_history(entries[position])
+                if position + 1 < len(entries):
+                    records = self._read_events(entries[position][3], entries[position + 1][3])
+                else:
+                    records = self._unarchived(entries)
+        for kind, item, quantity, time, _ in records:
+            if time <= when:
+                apply_record(inventory, kind, item, quantity)
+        return inventory
+
+    def iter_events(self, since=None, until=None, item=None):
+        """Every recorded change as (time, kind, item, quantity, ref), oldest first"""
+        since = time_text(since) if since is not None else None
+        until = time_text(until) if until is not None else None
+        with self.lock:
+            entries = _read_index(self.history_index_path)
+            start = 0
+            if since is not None and entries:
+                # Snapshots taken before ``since``, the events after the last of them are all later
+                position = bisect.bisect_left([entry[0] for entry in entries], since) - 1
+                if position >= 0:
+                    start = entries[position][3]
+            end = entries[-1][3] if entries else 0
+            records = self._read_events(start, end) + self._unarchived(entries)
+        for kind, name, quantity, time, ref in records:
+            if item is not None and name != item:
+                continue
+            if (since is not None and time < since) or (until is not None and time >= until):
+                continue
+            yield time, kind, name, quantity, ref
+
+
+def main(argv=None):
+    import storage
+
+    options = argparse.ArgumentParser(add_help=False)
+    options.add_argument("--storage", choices=["text", "sqlite"], help="storage backend (default: as the app)")
+    parser = argparse.ArgumentParser(description="Cafe stock history")
+    commands = parser.add_subparsers(dest="command", required=True)
+    at = commands.add_parser("at", parents=[options], help="print the stock at a point in time")
+    at.add_argument("time", help='"YYYY-MM-DD HH:MM:SS" or "YYYY-MM-DD"')
+    at.add_argument("--item")
+    events = commands.add_parser("events", parents=[options], help="print the recorded stock changes")
+    events.add_argument("--since")
+    events.add_argument("--until")
+    events.add_argument("--item")
+    adjust = commands.add_parser("adjust", parents=[options], help="record stock lost or found outside a sale")
+    adjust.add_argument("item")
+    adjust.add_argument("quantity", type=int, help="negative for stock lost")
+    adjust.add_argument("--reason", default="")
+    args = parser.parse_args(argv)
+
+    store = storage.open_storage(args.storage)
+    try:
+        if args.command == "adjust":
+            store.adjust_stock(args.item, args.quantity, args.reason)
+            print(f"Recorded {args.quantity:+d} {args.item}")
+        elif args.command == "at":
+            for item, quantity in store.stock_at(args.time).items():
+                if args.item is None or item == args.item:
+                    print(f"{item:<20} {quantity:>10}")
+        else:
+            for time, kind, item, quantity, ref in store.iter_stock_events(args.since, args.until, args.item):
+                print(f"{time or '-':<19}  {kind:<7} {item:<20} {quantity:>10}  {ref}")
+        return 0
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,457 @@
+"""Kitchen and bar queue: what to make next, and how long it took.
+
+Every completed order is split into its line items and each line is routed
+to the station that makes it (coffee machine, grill, counter). A line moves
+through queued -> preparing -> ready, and the order is served once all its
+lines are ready and handed over. The order's own status stays "Completed"
+(it is paid for); the preparation state lives here.
+
+Orders are picked up from the order history by position, like the sales
+totals (see ``rollups``): inside ``cafe.db`` for the SQLite backend, in
+``cafe_kitchen.db`` next to the text files. Only orders saved after the
+queue is first opened are queued.
+
+Each station works its queue shortest job first: of the lines waiting, the
+one expected to take least time goes next, which gives the lowest average
+wait for everyone in the queue. Expected times are learned per item from
+the lines made in the last week (per unit, times the quantity), with the
+station's default until there are a few. A line that has waited longer
+than ``MAX_WAIT`` seconds goes ahead of the rest, so big orders are never
+starved.
+
+Routes come from ``cafe_stations.txt`` ("item,station[,seconds per unit]"
+per line); items not listed there go by the words in their name
+(``DEFAULT_ROUTES``).
+
+    python kitchen.py display    kitchen/bar screen
+    python kitchen.py stats      throughput and waits per station, today
+"""
+
+import argparse
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+COMPLETED = "Completed"
+KITCHEN_DATABASE = "cafe_kitchen.db"
+STATIONS_FILE = "cafe_stations.txt"
+
+QUEUED = "queued"
+PREPARING = "preparing"
+READY = "ready"
+SERVED = "served"
+
+# station, seconds per unit, words of item names made there
+DEFAULT_ROUTES = [
+    ("Bar", 45, ("coffee", "tea", "latte", "mocha", "espresso", "cappuccino", "juice", "shake", "smoothie")),
+    ("Grill", 240, ("burger", "fries", "sandwich", "wrap", "grill", "toast")),
+]
+DEFAULT_STATION = ("Counter", 20)
+
+# Seconds a line may wait before it goes ahead of shorter ones
+MAX_WAIT = 600
+# Lines made in this many seconds are used to learn the expected times
+ESTIMATE_WINDOW = 7 * 24 * 3600
+# Lines made of an item before its own average is trusted
+MIN_SAMPLES = 3
+
+# How often the display looks for new orders (milliseconds)
+REFRESH_INTERVAL = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS kitchen_state (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS kitchen_items (
+    id INTEGER PRIMARY KEY,
+    order_id TEXT NOT NULL,
+    customer TEXT NOT NULL,
+    item TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    station TEXT NOT NULL,
+    estimate REAL NOT NULL,
+    state TEXT NOT NULL,
+    queued_at REAL NOT NULL,
+    started_at REAL,
+    ready_at REAL,
+    served_at REAL
+);
+CREATE INDEX IF NOT EXISTS kitchen_items_open ON kitchen_items (state) WHERE state != 'served';
+CREATE INDEX IF NOT EXISTS kitchen_items_order ON kitchen_items (order_id);
+CREATE INDEX IF NOT EXISTS kitchen_items_ready ON kitchen_items (ready_at);
+"""
+
+
+def open_database(path=KITCHEN_DATABASE):
+    """Open the kitchen database used with the text files"""
+    connection = sqlite3.connect(path, isolation_level=None, timeout=30)
+    connection.execute("PRAGMA journal_mode=WAL")
+    create_tables(connection)
+    return connection
+
+
+def create_tables(connection):
+    connection.executescript(SCHEMA)
+
+
+def position(connection):
+    """How far into the orders the queue goes, None before it was first opened"""
+    row = connection.execute("SELECT value FROM kitchen_state WHERE key = 'position'").fetchone()
+    return row[0] if row else None
+
+
+def set_position(connection, new_position):
+    connection.execute("INSERT INTO kitchen_state (key, value) VALUES ('position', ?) "
+                       "ON CONFLICT (key) DO UPDATE SET value = excluded.value", (new_position,))
+
+
+# Routing
+
+def load_routes(path=STATIONS_FILE):
+    """item -> (station, seconds per unit or None) from the stations file"""
+    routes = {}
+    try:
+        with open(path, "r") as file:
+            for line in file:
+                parts = [part.strip() for part in line.split(",")]
+                if len(parts) >= 2 and parts[0] and parts[1]:
+                    seconds = float(parts[2]) if len(parts) >= 3 and parts[2] else None
+                    routes[parts[0]] = (parts[1], seconds)
+    except FileNotFoundError:
+        pass
+    return routes
+
+
+def route(item, routes):
+    """(station, default seconds per unit) for a menu item"""
+    station, seconds = routes.get(item, (None, None))
+    if station is None:
+        words = item.lower().split()
+        station, default = DEFAULT_STATION
+        for name, route_seconds, keywords in DEFAULT_ROUTES:
+            if any(word.startswith(keyword) for word in words for keyword in keywords):
+                station, default = name, route_seconds
+                break
+        return station, default
+    if seconds is None:
+        seconds = next((route_seconds for name, route_seconds, _ in DEFAULT_ROUTES if name == station),
+                       DEFAULT_STATION[1])
+    return station, seconds
+
+
+def item_estimates(connection, now=None):
+    """item -> seconds per unit, learned from the lines made recently"""
+    if now is None:
+        now = time.time()
+    return {item: seconds for item, seconds, samples in connection.execute(
+        "SELECT item, AVG((ready_at - started_at) / quantity), COUNT(*) FROM kitchen_items "
+        "WHERE ready_at >= ? AND started_at IS NOT NULL GROUP BY item", (now - ESTIMATE_WINDOW,))
+        if samples >= MIN_SAMPLES}
+
+
+def _order_time(timestamp):
+    try:
+        return datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S").timestamp()
+    except ValueError:
+        return time.time()
+
+
+def add_orders(connection, orders, routes):
+    """Queue the line items of completed orders, call inside a transaction with ``set_position``"""
+    estimates = None
+    rows = []
+    for order in orders:
+        if order["status"] != COMPLETED:
+            continue
+        if estimates is None:
+            estimates = item_estimates(connection)
+        queued_at = _order_time(order["timestamp"])
+        for line in order["items"]:
+            station, seconds = route(line["name"], routes)
+            seconds = estimates.get(line["name"], seconds)
+            rows.append((order["id"], order["customer"], line["name"], line["quantity"], station,
+                         seconds * line["quantity"], QUEUED, queued_at))
+    connection.executemany(
+        "INSERT INTO kitchen_items (order_id, customer, item, quantity, station, estimate, state, queued_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+
+# The queue
+
+def open_items(connection):
+    """Lines not served yet, oldest first"""
+    columns = ("id", "order_id", "customer", "item", "quantity", "station", "estimate", "state",
+               "queued_at", "started_at", "ready_at")
+    rows = connection.execute(
+        f"SELECT {', '.join(columns)} FROM kitchen_items WHERE state != 'served' ORDER BY id")
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def schedule(items, now=None):
+    """station -> its lines in the order to work on them
+
+    Lines being prepared come first, then the queued ones shortest job
+    first, with those waiting longer than ``MAX_WAIT`` ahead of the rest.
+    Ready lines are left out, they wait for pickup.
+    """
+    if now is None:
+        now = time.time()
+    stations = {}
+    for item in items:
+        if item["state"] != READY:
+            stations.setdefault(item["station"], []).append(item)
+
+    def key(item):
+        if item["state"] == PREPARING:
+            return (0, item["started_at"], 0)
+        if now - item["queued_at"] >= MAX_WAIT:
+            return (1, item["queued_at"], 0)
+        return (2, item["estimate"], item["queued_at"])
+
+    for lines in stations.values():
+        lines.sort(key=key)
+    return stations
+
+
+def pickup(items):
+    """Orders whose lines are all ready, as (order_id, customer, lines), first ready first"""
+    orders = {}
+    for item in items:
+        orders.setdefault(item["order_id"], []).append(item)
+    ready = [(max(line["ready_at"] for line in lines), order_id, lines[0]["customer"], lines)
+             for order_id, lines in orders.items() if all(line["state"] == READY for line in lines)]
+    ready.sort()
+    return [(order_id, customer, lines) for _, order_id, customer, lines in ready]
+
+
+def order_state(states):
+    """The state of an order from the states of its lines"""
+    states = set(states)
+    if states == {SERVED}:
+        return SERVED
+    if states == {READY}:
+        return READY
+    if states == {QUEUED}:
+        return QUEUED
+    return PREPARING
+
+
+def start(connection, item_id, now=None):
+    """A station starts on a queued line"""
+    connection.execute("UPDATE kitchen_items SET state = ?, started_at = ? WHERE id = ? AND state = ?",
+                       (PREPARING, time.time() if now is None else now, item_id, QUEUED))
+
+
+def finish(connection, item_id, now=None):
+    """A line is made; a queued one counts as started now"""
+    now = time.time() if now is None else now
+    connection.execute("UPDATE kitchen_items SET state = ?, started_at = COALESCE(started_at, ?), ready_at = ? "
+                       "WHERE id = ? AND state IN (?, ?)", (READY, now, now, item_id, QUEUED, PREPARING))
+
+
+def serve(connection, order_id, now=None):
+    """Hand over an order whose lines are ready"""
+    connection.execute("UPDATE kitchen_items SET state = ?, served_at = ? WHERE order_id = ? AND state = ?",
+                       (SERVED, time.time() if now is None else now, order_id, READY))
+
+
+# Statistics
+
+def station_stats(connection, since, until=None):
+    """Per station: lines made, units, lines per hour, average and longest wait, average prep time
+
+    Counts the lines made (ready) between ``since`` and ``until`` (epoch
+    seconds, ``until`` defaults to now). Waits run from the order being
+    placed to a station starting on it; lines per hour are over the time
+    from the first line started to the last one made.
+    """
+    if until is None:
+        until = time.time()
+    stats = []
+    for row in connection.execute(
+            "SELECT station, COUNT(*), SUM(quantity), AVG(started_at - queued_at), MAX(started_at - queued_at), "
+            "AVG(ready_at - started_at), AVG(ready_at - queued_at), MIN(started_at), MAX(ready_at) "
+            "FROM kitchen_items WHERE ready_at >= ? AND ready_at < ? GROUP BY station ORDER BY station",
+            (since, until)):
+        station, lines, units, wait, longest, prep, total, first, last = row
+        hours = max(last - first, 60) / 3600
+        stats.append({"station": station, "lines": lines, "units": units, "per_hour": lines / hours,
+                      "average_wait": wait, "longest_wait": longest, "average_prep": prep,
+                      "average_total": total})
+    return stats
+
+
+def _today_start():
+    return datetime.now().replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+
+
+def minutes(seconds):
+    """"m:ss" for a number of seconds"""
+    seconds = int(max(seconds or 0, 0))
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+
+# Display
+
+class KitchenDisplay:
+    """Station queues and the pickup list in a Tk window
+
+    One column per station lists its lines in the order to make them;
+    Start and Ready move the selected line along. The pickup column lists
+    the orders that are all ready, Served hands one over. The window
+    refreshes itself every ``REFRESH_INTERVAL`` milliseconds.
+    """
+
+    def __init__(self, window, store):
+        import tkinter as tk
+
+        self.tk = tk
+        self.window = window
+        self.store = store
+        self.routes = load_routes()
+        self.columns = {}
+        self.shown = {}
+        self.pickup_ids = []
+
+        window.title("Kitchen Display")
+        window.geometry("1000x600")
+        window.configure(bg="#263238")
+        self.stations_frame = tk.Frame(window, bg="#263238")
+        self.stations_frame.pack(fill="both", expand=True, padx=10, pady=10)
+
+        pickup_frame = tk.Frame(self.stations_frame, bg="#263238")
+        pickup_frame.pack(side="right", fill="both", expand=True, padx=5)
+        tk.Label(pickup_frame, text="Ready for pickup", font=("Arial", 14, "bold"),
+                 bg="#263238", fg="#A5D6A7").pack()
+        self.pickup_list = tk.Listbox(pickup_frame, font=("Courier", 12), width=30)
+        self.pickup_list.pack(fill="both", expand=True, pady=5)
+        tk.Button(pickup_frame, text="Served", command=self.serve_selected, bg="#4CAF50", fg="white",
+                  width=12).pack(pady=5)
+
+        self.stats_label = tk.Label(window, text="", font=("Arial", 10), bg="#263238", fg="white", justify="left")
+        self.stats_label.pack(fill="x", padx=10, pady=5)
+
+        self.refresh()
+
+    def _column(self, station):
+        # A column appears for every station with something to make
+        if station not in self.columns:
+            tk = self.tk
+            frame = tk.Frame(self.stations_frame, bg="#263238")
+            frame.pack(side="left", fill="both", expand=True, padx=5)
+            tk.Label(frame, text=station, font=("Arial", 14, "bold"), bg="#263238", fg="white").pack()
+            listbox = tk.Listbox(frame, font=("Courier", 12), width=34)
+            listbox.pack(fill="both", expand=True, pady=5)
+            buttons = tk.Frame(frame, bg="#263238")
+            buttons.pack()
+            tk.Button(buttons, text="Start", command=lambda: self.move_selected(station, start),
+                      bg="#FF9800", fg="white", width=10).pack(side="left", padx=3)
+            tk.Button(buttons, text="Ready", command=lambda: self.move_selected(station, finish),
+                      bg="#2196F3", fg="white", width=10).pack(side="left", padx=3)
+            self.columns[station] = listbox
+            self.shown[station] = []
+        return self.columns[station]
+
+    def _selected(self, listbox, ids):
+        selection = listbox.curselection()
+        return ids[selection[0]] if selection and selection[0] < len(ids) else None
+
+    def move_selected(self, station, change):
+        item_id = self._selected(self.columns[station], self.shown[station])
+        if item_id is None:
+            # Nothing picked: the line at the top of the queue
+            item_id = self.shown[station][0] if self.shown[station] else None
+        if item_id is not None:
+            change(self.store.kitchen(), item_id)
+            self.refresh(reschedule=False)
+
+    def serve_selected(self):
+        order_id = self._selected(self.pickup_list, self.pickup_ids)
+        if order_id is None and self.pickup_ids:
+            order_id = self.pickup_ids[0]
+        if order_id is not None:
+            serve(self.store.kitchen(), order_id)
+            self.refresh(reschedule=False)
+
+    def _fill(self, listbox, ids, new_ids, texts):
+        # Keep the selected entry selected across redraws
+        selected = self._selected(listbox, ids)
+        listbox.delete(0, self.tk.END)
+        for text in texts:
+            listbox.insert(self.tk.END, text)
+        if selected in new_ids:
+            listbox.selection_set(new_ids.index(selected))
+
+    def refresh(self, reschedule=True):
+        if not self.window.winfo_exists():
+            return
+        try:
+            connection = self.store.kitchen(self.routes)
+            items = open_items(connection)
+            stats = station_stats(connection, _today_start())
+        except sqlite3.Error:
+            items, stats = [], []
+        now = time.time()
+
+        stations = schedule(items, now)
+        for station in list(self.columns) + [station for station in stations if station not in self.columns]:
+            lines = stations.get(station, [])
+            listbox = self._column(station)
+            ids = [line["id"] for line in lines]
+            texts = [f"{'>' if line['state'] == PREPARING else ' '} {line['order_id']} {line['quantity']}x "
+                     f"{line['item'][:14]:<14} {minutes(now - line['queued_at']):>6}" for line in lines]
+            self._fill(listbox, self.shown[station], ids, texts)
+            self.shown[station] = ids
+
+        ready = pickup(items)
+        ids = [order_id for order_id, _, _ in ready]
+        texts = [f"{order_id} {customer[:12]:<12} {minutes(now - max(line['ready_at'] for line in lines)):>6}"
+                 for order_id, customer, lines in ready]
+        self._fill(self.pickup_list, self.pickup_ids, ids, texts)
+        self.pickup_ids = ids
+
+        self.stats_label.config(text="Today:  " + "    ".join(
+            f"{row['station']}: {row['lines']} made, {row['per_hour']:.0f}/h, "
+            f"wait {minutes(row['average_wait'])} (max {minutes(row['longest_wait'])}), "
+            f"prep {minutes(row['average_prep'])}" for row in stats))
+
+        if reschedule:
+            self.window.after(REFRESH_INTERVAL, self.refresh)
+
+
+def main(argv=None):
+    import storage
+
+    options = argparse.ArgumentParser(add_help=False)
+    options.add_argument("--storage", choices=["text", "sqlite"], help="storage backend (default: as the app)")
+    parser = argparse.ArgumentParser(description="Cafe kitchen queue")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("display", parents=[options], help="show the kitchen/bar screen")
+    stats = commands.add_parser("stats", parents=[options], help="print throughput and waits per station")
+    stats.add_argument("--since", help='"YYYY-MM-DD" (default: today)')
+    args = parser.parse_args(argv)
+
+    store = storage.open_storage(args.storage)
+    try:
+        if args.command == "display":
+            import tkinter as tk
+
+            root = tk.Tk()
+            KitchenDisplay(root, store)
+            root.mainloop()
+            return 0
+
+        since = datetime.strptime(args.since, "%Y-%m-%d").timestamp() if args.since else _today_start()
+        for row in station_stats(store.kitchen(), since):
+            print(f"{row['station']:<12} {row['lines']:>6} lines {row['units']:>6} units {row['per_hour']:>7.1f}/h  "
+                  f"wait {minutes(row['average_wait'])} avg {minutes(row['longest_wait'])} max  "
+                  f"prep {minutes(row['average_prep'])}  order to ready {minutes(row['average_total'])}")
+        return 0
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
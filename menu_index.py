@@ -0,0 +1,93 @@
+"""Prefix index over the menu's item names, for the till's type-ahead search.
+
+Every item is filed once per word of its name, under the rest of the name
+from that word on ("Iced Cake" under "iced cake" and "cake"), in one sorted
+list. The items matching what the cashier has typed so far are then a
+binary search (``bisect``) away: "ca" finds "Cake" and "Iced Cake", "ice ca"
+finds "Iced Cake". Thousands of items answer in microseconds.
+"""
+
+import bisect
+
+
+def _keys(name):
+    lowered = name.lower()
+    keys = []
+    start = 0
+    for word in lowered.split():
+        start = lowered.index(word, start)
+        keys.append(lowered[start:])
+        start += len(word)
+    return keys or [lowered]
+
+
+class MenuIndex:
+    """Item names searchable by the start of any word"""
+
+    def __init__(self, names=()):
+        self.names = {}
+        self.entries = []
+        for name in names:
+            self.names[name.lower()] = name
+            self.entries.extend((key, name) for key in _keys(name))
+        self.entries.sort()
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name):
+        if name.lower() in self.names:
+            return
+        self.names[name.lower()] = name
+        for key in _keys(name):
+            bisect.insort(self.entries, (key, name))
+
+    def add_many(self, names):
+        """Add a batch of items with one sort rather than an insert each"""
+        added = False
+        for name in names:
+            if name.lower() not in self.names:
+                self.names[name.lower()] = name
+                self.entries.extend((key, name) for key in _keys(name))
+                added = True
+        if added:
+            self.entries.sort()
+
+    def remove(self, name):
+        if self.names.pop(name.lower(), None) is None:
+            return
+        for key in _keys(name):
+            position = bisect.bisect_left(self.entries, (key, name))
+            if position < len(self.entries) and self.entries[position] == (key, name):
+                del self.entries[position]
+
+    def exact(self, text):
+        """The item called ``text`` (any case), or None"""
+        return self.names.get(text.strip().lower())
+
+    def matches(self, text, limit=50):
+        """Items with words starting with each typed word, names starting with the text first"""
+        words = text.lower().split()
+        if not words:
+            return []
+        first = " ".join(words)
+        rest = words[1:]
+
+        whole = []
+        inner = []
+        seen = set()
+        # Entries from the first typed word on, as long as they still start with it
+        position = bisect.bisect_left(self.entries, (words[0],))
+        while position < len(self.entries) and len(whole) + len(inner) < limit:
+            key, name = self.entries[position]
+            position += 1
+            if not key.startswith(words[0]):
+                break
+            if name in seen:
+                continue
+            name_words = name.lower().split()
+            if not all(any(word.startswith(typed) for word in name_words) for typed in rest):
+                continue
+            seen.add(name)
+            (whole if name.lower().startswith(first) else inner).append(name)
+        return (whole + inner)[:limit]
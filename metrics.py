@@ -0,0 +1,191 @@
+"""Timers, counters and histograms for the till's hot paths.
+
+Metrics are off unless the ``CAFE_METRICS`` environment variable names an
+output file. Switched off, ``timed`` hands back the undecorated function and
+the other calls return straight away, so they cost next to nothing.
+Switched on, a snapshot of every metric is written to that file every
+``WRITE_INTERVAL`` seconds and on close: JSON when the name ends in
+``.json``, otherwise the Prometheus text format (suitable for the node
+exporter's textfile collector).
+
+    CAFE_METRICS=/var/lib/node_exporter/cafe.prom python "CafeMaanagementSystem (1).py"
+"""
+
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+
+# Where the snapshot goes, None when metrics are off
+OUTPUT_FILE = os.environ.get("CAFE_METRICS") or None
+enabled = OUTPUT_FILE is not None
+
+# How often the snapshot file is rewritten (seconds)
+WRITE_INTERVAL = 15
+
+# Upper bounds of the histogram buckets
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_rates = {}
+
+
+class Histogram:
+    """Observations counted into fixed buckets, plus their sum"""
+
+    def __init__(self, buckets, help_text=""):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self.help_text = help_text
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+
+    def count(self):
+        return sum(self.counts)
+
+
+class _PerMinute:
+    # Counts events in the current minute, hands finished minutes to a histogram
+    def __init__(self):
+        self.minute = None
+        self.events = 0
+
+
+def _histogram(name, buckets, help_text):
+    histogram = _histograms.get(name)
+    if histogram is None:
+        histogram = _histograms[name] = Histogram(buckets, help_text)
+    return histogram
+
+
+def observe(name, value, buckets=SECONDS_BUCKETS, help_text=""):
+    """Add a value (seconds by default) to a histogram"""
+    if not enabled:
+        return
+    with _lock:
+        _histogram(name, buckets, help_text).observe(value)
+
+
+def increment(name, amount=1):
+    """Add to a counter"""
+    if not enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def tick_per_minute(name, help_text=""):
+    """Count an event towards a histogram of events per minute"""
+    if not enabled:
+        return
+    minute = int(time.time() // 60)
+    with _lock:
+        rate = _rates.get(name)
+        if rate is None:
+            rate = _rates[name] = _PerMinute()
+            _histogram(name, COUNT_BUCKETS, help_text)
+        if rate.minute != minute:
+            _close_minutes(name, rate, minute)
+        rate.events += 1
+
+
+def _close_minutes(name, rate, minute):
+    # Minutes without any event count as zero
+    if rate.minute is not None:
+        histogram = _histograms[name]
+        histogram.observe(rate.events)
+        for _ in range(min(minute - rate.minute - 1, 60)):
+            histogram.observe(0)
+    rate.minute = minute
+    rate.events = 0
+
+
+def timed(name, help_text=""):
+    """Decorator that records how long each call takes in the histogram ``name``"""
+    def decorate(function):
+        if not enabled:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                observe(name, time.perf_counter() - start, help_text=help_text)
+        return wrapper
+    return decorate
+
+
+def snapshot():
+    """Copy of every metric as plain dicts"""
+    with _lock:
+        minute = int(time.time() // 60)
+        for name, rate in _rates.items():
+            if rate.minute is not None and rate.minute < minute:
+                _close_minutes(name, rate, minute)
+        return {
+            "timestamp": time.time(),
+            "counters": dict(_counters),
+            "histograms": {name: {"buckets": list(h.buckets), "counts": list(h.counts),
+                                  "sum": h.total, "count": h.count(), "help": h.help_text}
+                           for name, h in _histograms.items()},
+        }
+
+
+def format_prometheus(data):
+    lines = []
+    for name, value in sorted(data["counters"].items()):
+        lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name} {value}")
+    for name, histogram in sorted(data["histograms"].items()):
+        if histogram["help"]:
+            lines.append(f"# HELP {name} {histogram['help']}")
+        lines.append(f"# TYPE {name} histogram")
+        cumulative = 0
+        for bound, count in zip(histogram["buckets"], histogram["counts"]):
+            cumulative += count
+            lines.append(f'{name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{le="+Inf"}} {histogram["count"]}')
+        lines.append(f"{name}_sum {histogram['sum']}")
+        lines.append(f"{name}_count {histogram['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def write(path=None):
+    """Write the snapshot file (replaced atomically so readers never see half of it)"""
+    path = path or OUTPUT_FILE
+    if path is None:
+        return
+    data = snapshot()
+    if path.endswith(".json"):
+        text = json.dumps(data, indent=2)
+    else:
+        text = format_prometheus(data)
+    temp_file = path + ".tmp"
+    with open(temp_file, "w") as file:
+        file.write(text)
+    os.replace(temp_file, path)
+
+
+def attach(root, interval=WRITE_INTERVAL):
+    """Write the snapshot periodically from the Tk main loop"""
+    if not enabled:
+        return
+
+    def tick():
+        try:
+            write()
+        except OSError:
+            # Metrics must never get in the way of a sale
+            pass
+        root.after(interval * 1000, tick)
+    root.after(interval * 1000, tick)
@@ -0,0 +1,61 @@
+"""Money as whole paisa.
+
+Prices, line totals and order totals are ints counting paisa (1/100 of a
+rupee) everywhere: in the menu and open orders, in saved orders and in the
+reports. Adding them up is exact however many orders there are, and
+columns of them sum as int64 in NumPy.
+
+The text files keep rupees with two decimals ("50.00"), which older
+versions read as they always did; ``parse`` turns that into paisa without
+going through a float. Numbers written by older versions (floats such as
+"50.0" or "969.9999999999999") come back as the paisa they stood for.
+SQLite keeps INTEGER paisa. ``python storage.py to-paisa`` converts the
+data of an older version (see ``storage``).
+"""
+
+import math
+
+PAISA_PER_RUPEE = 100
+
+
+def parse(text):
+    """Paisa of a rupee amount written as text ("50", "49.5", "49.50"), ValueError if it isn't one"""
+    text = text.strip()
+    whole, point, fraction = text.partition(".")
+    if len(fraction) > 2 or "e" in text.lower():
+        # A float written by an older version
+        value = float(text)
+        if not math.isfinite(value):
+            raise ValueError(f"Not an amount: {text!r}")
+        return from_rupees(value)
+    sign = -1 if whole.startswith("-") else 1
+    if whole[:1] in ("-", "+"):
+        whole = whole[1:]
+    if not (whole + fraction).isdigit():
+        raise ValueError(f"Not an amount: {text!r}")
+    return sign * (int(whole or "0") * PAISA_PER_RUPEE + int(fraction.ljust(2, "0")))
+
+
+def from_rupees(value):
+    """Paisa of an amount in rupees (int or float)"""
+    return int(round(value * PAISA_PER_RUPEE))
+
+
+def text(paisa):
+    """Rupees with two decimals, as shown and as written to the text files: 4950 -> "49.50" """
+    sign = "-" if paisa < 0 else ""
+    rupees, cents = divmod(abs(paisa), PAISA_PER_RUPEE)
+    return f"{sign}{rupees}.{cents:02d}"
+
+
+def rupees(paisa):
+    """The amount in rupees as a number, for JSON"""
+    return paisa / PAISA_PER_RUPEE
+
+
+def stored_as_real(connection, table, column):
+    """True if a SQLite column was declared REAL, the rupee amounts of older versions"""
+    for row in connection.execute(f"PRAGMA table_info({table})"):
+        if row[1] == column:
+            return row[2].upper() == "REAL"
+    return False
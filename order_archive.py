@@ -0,0 +1,152 @@
+"""Compressed, closed segments of the order log.
+
+When the order log is rolled (see ``order_log.roll_log``) its finished days
+are moved into ``cafe_orders_archive/`` as compressed segment files, one per
+day or per ``order_log.SEGMENT_MAX_BYTES`` of orders. ``manifest.json`` lists
+them with their order count, sequence number range, time range and place in
+the log as a whole, so readers only open the segments they need and
+decompress them as a stream.
+
+Offsets into the log are "logical": a segment keeps the byte offsets its
+orders had before it was archived (``start``), and the live file carries on
+after ``archived_bytes``. Anything that remembers how far it has read the
+log therefore keeps working across a roll.
+
+Each segment also gets a binary columns file (see ``order_columns``) that
+history, lookups and reports map into memory instead of decompressing and
+parsing the text. The compressed text stays the record; a missing or broken
+columns file only makes reads slower.
+"""
+
+import gzip
+import json
+import lzma
+import os
+
+import order_columns
+
+MANIFEST_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+
+# Compression used for new segments, both kinds can always be read
+COMPRESSION = "gz"
+OPENERS = {"gz": gzip.open, "xz": lzma.open}
+
+_manifests = {}
+
+
+# Build the archive directory name for an orders file
+def archive_dir(log_path):
+    return os.path.splitext(log_path)[0] + "_archive"
+
+
+def manifest_path(log_path):
+    return os.path.join(archive_dir(log_path), MANIFEST_FILE)
+
+
+def empty_manifest():
+    return {"version": MANIFEST_VERSION, "archived_bytes": 0, "segments": [], "rolled": None}
+
+
+def load_manifest(log_path):
+    """The manifest of a log's archive, cached until the file changes"""
+    path = manifest_path(log_path)
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return empty_manifest()
+    key = os.path.abspath(path)
+    stamp = (st.st_ino, st.st_size, st.st_mtime_ns)
+    cached = _manifests.get(key)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    with open(path, "r") as file:
+        manifest = json.load(file)
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError(f"{path} has an unknown version: {manifest.get('version')}")
+    _manifests[key] = (stamp, manifest)
+    return manifest
+
+
+def _write_file(path, data):
+    temp_file = path + ".tmp"
+    with open(temp_file, "wb") as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_file, path)
+
+
+def save_manifest(log_path, manifest):
+    """Replace the manifest atomically"""
+    os.makedirs(archive_dir(log_path), exist_ok=True)
+    _write_file(manifest_path(log_path), json.dumps(manifest, indent=1).encode("utf-8"))
+
+
+def write_segment(log_path, name, data, compression=COMPRESSION):
+    """Compress ``data`` into a new segment file, returns its file name"""
+    directory = archive_dir(log_path)
+    os.makedirs(directory, exist_ok=True)
+    file_name = f"{name}.txt.{compression}"
+    if compression == "gz":
+        compressed = gzip.compress(data, compresslevel=6)
+    else:
+        compressed = lzma.compress(data)
+    _write_file(os.path.join(directory, file_name), compressed)
+    return file_name
+
+
+# Lines of the last few segments looked up by order ID
+SEGMENT_CACHE_SIZE = 4
+_segment_lines = {}
+
+
+def segment_lines(log_path, segment):
+    """Every line of a segment keyed by order ID, recently used segments are kept"""
+    key = (os.path.abspath(log_path), segment["file"])
+    lines = _segment_lines.pop(key, None)
+    if lines is None:
+        lines = {}
+        with open_segment(log_path, segment) as stream:
+            for raw_line in stream:
+                lines[raw_line.split(b",", 1)[0].strip().decode("utf-8", "replace")] = raw_line
+        if len(_segment_lines) >= SEGMENT_CACHE_SIZE:
+            _segment_lines.pop(next(iter(_segment_lines)))
+    # Most recently used last
+    _segment_lines[key] = lines
+    return lines
+
+
+def open_segment(log_path, segment):
+    """Binary stream of a segment's lines, decompressed as it is read"""
+    compression = segment["file"].rsplit(".", 1)[-1]
+    return OPENERS[compression](os.path.join(archive_dir(log_path), segment["file"]), "rb")
+
+
+def write_columns(log_path, name, writer, start, end):
+    """Write a segment's orders as a columns file, returns its file name"""
+    directory = archive_dir(log_path)
+    os.makedirs(directory, exist_ok=True)
+    file_name = f"{name}.cols"
+    writer.write(os.path.join(directory, file_name), start, end)
+    return file_name
+
+
+# Mapped columns files stay open, they cost address space rather than memory
+_columns = {}
+
+
+def segment_columns(log_path, segment):
+    """The mapped columns of a segment, or None if it was archived without them"""
+    if not segment.get("columns"):
+        return None
+    path = os.path.join(archive_dir(log_path), segment["columns"])
+    key = os.path.abspath(path)
+    columns = _columns.get(key)
+    if columns is None:
+        try:
+            columns = _columns[key] = order_columns.OrderColumns(path)
+        except (OSError, ValueError):
+            # The compressed text is still there, readers fall back to it
+            return None
+    return columns
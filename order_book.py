@@ -0,0 +1,243 @@
+"""Order engine without any GUI.
+
+``OrderBook`` holds the order being rung up: line items keyed by item name,
+a running total that is adjusted on every change instead of being summed
+again, and the stock check. Prices and totals are ints in paisa (see
+``money``), so the running total is exact. ``TicketManager`` keeps several open orders
+(tickets) at once and holds stock for all of them together, so no two
+tickets can promise the same last unit. Stock is held and taken per
+ingredient (see ``ingredients``). The Tk screen is one client of these;
+scripts and tests can drive them directly without a display.
+"""
+
+from datetime import datetime
+
+import order_log
+from ingredients import Availability
+
+
+class OrderError(Exception):
+    """Raised when an order change is not allowed, the message is shown to the cashier"""
+
+
+# Build an order record as saved by the storage backends
+def make_order(order_id, customer_name, items, total_amount, status, timestamp=None):
+    if timestamp is None:
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return {
+        "id": order_id,
+        "timestamp": timestamp,
+        "customer": customer_name,
+        "items": [{"name": item["name"], "quantity": item["quantity"], "price": item["price"]} for item in items],
+        "total": total_amount,
+        "status": status
+    }
+
+
+class OrderBook:
+    """The order currently being built
+
+    ``menu_items`` (name -> price in paisa) and ``inventory`` (ingredient -> stock)
+    are the app's own dicts, so stock taken by ``place`` is seen everywhere.
+    ``reserved`` (ingredient -> quantity) is the stock held by open orders;
+    order books that share it can't oversell between them. ``stock`` is the
+    ``Availability`` of the menu items over those dicts, order books that
+    share one share its ``reserved``.
+    """
+
+    def __init__(self, menu_items, inventory, reserved=None, ticket_id=None, customer="", stock=None):
+        self.menu_items = menu_items
+        self.inventory = inventory
+        if stock is None:
+            stock = Availability(menu_items, {}, inventory, reserved)
+        self.stock = stock
+        self.reserved = stock.reserved
+        self.ticket_id = ticket_id
+        self.customer = customer
+        self.lines = {}
+        self.total = 0
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __bool__(self):
+        return bool(self.lines)
+
+    def items(self):
+        """Line items in the order they were first added"""
+        return list(self.lines.values())
+
+    def quantity_of(self, name):
+        line = self.lines.get(name)
+        return line["quantity"] if line else 0
+
+    def available(self, name):
+        """Units of an item that the stock not yet held by any open order can make"""
+        return self.stock.get(name)
+
+    def add(self, name, quantity):
+        """Add ``quantity`` of a menu item, merging with an existing line"""
+        if not name:
+            raise OrderError("Please select an item from the menu.")
+        if name not in self.menu_items:
+            raise OrderError(f"{name} is not on the menu.")
+        if quantity <= 0:
+            raise OrderError("Quantity must be greater than 0.")
+
+        # Check inventory, counting what this and other open orders already hold
+        if self.available(name) < quantity:
+            raise OrderError(f"Not enough stock. Only {self.available(name)} available.")
+
+        line = self.lines.get(name)
+        if line is None:
+            price = self.menu_items[name]
+            line = {"name": name, "price": price, "quantity": 0, "total": 0}
+            self.lines[name] = line
+
+        line["quantity"] += quantity
+        line["total"] = line["price"] * line["quantity"]
+        self.total += line["price"] * quantity
+        self.stock.hold(name, quantity)
+        return line
+
+    def remove(self, name):
+        """Remove a line item, returns it or None if it wasn't on the order"""
+        if not name:
+            raise OrderError("Please select an item from the menu.")
+        line = self.lines.pop(name, None)
+        if line is None:
+            return None
+        self.stock.hold(name, -line["quantity"])
+        self.total -= line["total"]
+        return line
+
+    def clear(self):
+        """Empty the order and release the stock it held"""
+        for line in self.lines.values():
+            self.stock.hold(line["name"], -line["quantity"])
+        self.lines = {}
+        self.total = 0
+
+    def quantities(self):
+        return {name: line["quantity"] for name, line in self.lines.items()}
+
+    def check_stock(self):
+        """Make sure the stock still has every ingredient the lines take"""
+        for ingredient, quantity in self.stock.usage(self.quantities()).items():
+            if ingredient not in self.inventory:
+                raise OrderError(f"{ingredient} not found in inventory.")
+            if self.inventory[ingredient] < quantity:
+                raise OrderError(f"Not enough stock for {ingredient}. Only {self.inventory[ingredient]} available.")
+
+    def validate(self, customer_name=None):
+        """Raise OrderError if the order can't be placed as it stands"""
+        if not self.lines:
+            raise OrderError("No items in the order.")
+        if customer_name is None:
+            customer_name = self.customer
+        if not customer_name.strip():
+            raise OrderError("Please enter customer name.")
+        if order_log.has_separator(customer_name):
+            raise OrderError("Customer name can't contain , ; : or line breaks.")
+        self.check_stock()
+
+    def place(self, order_id, customer_name=None, status="Completed", timestamp=None):
+        """Turn the current lines into an order, take the stock and start a new order"""
+        if customer_name is None:
+            customer_name = self.customer
+        self.validate(customer_name)
+        customer_name = customer_name.strip()
+
+        order = make_order(order_id, customer_name, self.lines.values(), self.total, status, timestamp)
+        self.stock.take(self.quantities())
+        self.clear()
+        return order
+
+    def restore(self, order):
+        """Give back the stock of an order that could not be saved"""
+        self.stock.restore(order)
+
+
+class TicketManager:
+    """Several open orders at once, each tagged with its customer
+
+    All tickets share one ``Availability`` and its ``reserved`` dict, so stock
+    added to any open ticket is held until that ticket is placed, changed or
+    closed. ``recipes`` is item -> {ingredient: quantity}, see ``ingredients``.
+    """
+
+    def __init__(self, menu_items, inventory, recipes=None):
+        self.menu_items = menu_items
+        self.inventory = inventory
+        self.stock = Availability(menu_items, {} if recipes is None else recipes, inventory)
+        self.reserved = self.stock.reserved
+        self.tickets = {}
+        self.active = None
+        self.next_ticket_id = 1
+        self.open()
+
+    def __len__(self):
+        return len(self.tickets)
+
+    def __iter__(self):
+        return iter(list(self.tickets.values()))
+
+    def available(self, name):
+        """Units of an item that the stock not held by any open ticket can make"""
+        return self.stock.get(name)
+
+    def open(self, customer=""):
+        """Start a new ticket and make it the active one"""
+        ticket = OrderBook(self.menu_items, self.inventory, ticket_id=self.next_ticket_id, customer=customer,
+                           stock=self.stock)
+        self.next_ticket_id += 1
+        self.tickets[ticket.ticket_id] = ticket
+        self._activate(ticket)
+        return ticket
+
+    def switch(self, ticket_id):
+        """Make another open ticket the active one"""
+        ticket = self.tickets.get(ticket_id)
+        if ticket is None:
+            raise OrderError(f"Ticket {ticket_id} is not open.")
+        self._activate(ticket)
+        return ticket
+
+    def close(self, ticket_id=None):
+        """Drop a ticket (the active one by default) and release its stock"""
+        ticket = self.tickets.pop(self.active.ticket_id if ticket_id is None else ticket_id, None)
+        if ticket is None:
+            return None
+        ticket.clear()
+        if ticket is self.active:
+            self.active = None
+            self._activate_next()
+        return ticket
+
+    def place(self, order_id, ticket_id=None, status="Completed", timestamp=None):
+        """Place a ticket (the active one by default) and close it"""
+        ticket = self.active if ticket_id is None else self.tickets.get(ticket_id)
+        if ticket is None:
+            raise OrderError(f"Ticket {ticket_id} is not open.")
+        order = ticket.place(order_id, status=status, timestamp=timestamp)
+        self.close(ticket.ticket_id)
+        return order
+
+    def restore(self, order):
+        """Give back the stock of an order that could not be saved"""
+        self.stock.restore(order)
+
+    def _activate(self, ticket):
+        previous = self.active
+        self.active = ticket
+        # A blank ticket that was left behind is just clutter
+        if previous is not None and previous is not ticket and not previous and not previous.customer.strip():
+            self.tickets.pop(previous.ticket_id, None)
+
+    def _activate_next(self):
+        # Carry on with a fresh ticket, parked ones stay where they are
+        for ticket in self.tickets.values():
+            if not ticket and not ticket.customer.strip():
+                self.active = ticket
+                return
+        self.open()
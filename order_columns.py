@@ -0,0 +1,203 @@
+"""Binary columnar files for closed order data.
+
+A columns file holds a run of orders as fixed-width arrays, one per field,
+followed by a string table for order IDs, customers, statuses and item
+names. It is read through ``mmap``: every column is a ``memoryview`` straight
+onto the file, so scanning millions of orders needs no parsing and no copy.
+
+Layout (little-endian, every section starts on an 8 byte boundary):
+
+    header      magic, version, counts, log range (see HEADER)
+    per order   offset q, seq q, time q (YYYYMMDDHHMMSS), order ID I,
+                customer I, status I, total q, first line I (one extra at the end)
+    per line    item I, quantity i, price q
+    strings     offsets I (one extra at the end), UTF-8 bytes
+
+``offset`` is where the order's line sits in the text log (see
+``order_log.log_size``); ``start`` and ``end`` in the header give the part of
+the log the file covers. Totals and prices are paisa (see ``money``);
+version 1 files held them as rupees in doubles and are no longer read. Converting from and to the text format is done in
+``order_log``.
+"""
+
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+MAGIC = b"CMCL"
+VERSION = 2
+# magic, version, order count, line count, string count, log start, log end
+HEADER = struct.Struct("<4sIIIIQQ")
+
+ORDER_COLUMNS = (("offset", "q"), ("seq", "q"), ("time", "q"), ("order_id", "I"),
+                 ("customer", "I"), ("status", "I"), ("total", "q"))
+LINE_COLUMNS = (("item", "I"), ("quantity", "i"), ("price", "q"))
+
+
+def _aligned(size):
+    return (size + 7) & ~7
+
+
+def time_text(key):
+    """Turn the number 20240131140509 back into "2024-01-31 14:05:09" """
+    return (f"{key // 10000000000:04d}-{key // 100000000 % 100:02d}-{key // 1000000 % 100:02d} "
+            f"{key // 10000 % 100:02d}:{key // 100 % 100:02d}:{key % 100:02d}")
+
+
+class ColumnWriter:
+    """Collects orders in memory and writes them as a columns file"""
+
+    def __init__(self):
+        self.orders = {name: array(code) for name, code in ORDER_COLUMNS}
+        self.line_start = array("I", [0])
+        self.lines = {name: array(code) for name, code in LINE_COLUMNS}
+        self.strings = []
+        self.string_ids = {}
+
+    def _string(self, text):
+        string_id = self.string_ids.get(text)
+        if string_id is None:
+            string_id = self.string_ids[text] = len(self.strings)
+            self.strings.append(text)
+        return string_id
+
+    def add(self, offset, seq, time_key, order_id, customer, status, total, items):
+        """Add one order, ``items`` are (name, quantity, price) tuples"""
+        orders = self.orders
+        orders["offset"].append(offset)
+        orders["seq"].append(seq)
+        orders["time"].append(time_key)
+        orders["order_id"].append(self._string(order_id))
+        orders["customer"].append(self._string(customer))
+        orders["status"].append(self._string(status))
+        orders["total"].append(total)
+        for name, quantity, price in items:
+            self.lines["item"].append(self._string(name))
+            self.lines["quantity"].append(quantity)
+            self.lines["price"].append(price)
+        self.line_start.append(len(self.lines["item"]))
+
+    def write(self, path, start, end):
+        """Write the file atomically, covering log offsets ``start`` to ``end``"""
+        blobs = [text.encode("utf-8") for text in self.strings]
+        string_offsets = array("I", [0])
+        for blob in blobs:
+            string_offsets.append(string_offsets[-1] + len(blob))
+
+        sections = [self.orders[name] for name, _ in ORDER_COLUMNS] + [self.line_start]
+        sections += [self.lines[name] for name, _ in LINE_COLUMNS] + [string_offsets]
+        if sys.byteorder != "little":
+            sections = [array(section.typecode, section) for section in sections]
+            for section in sections:
+                section.byteswap()
+
+        temp_file = path + ".tmp"
+        with open(temp_file, "wb") as file:
+            file.write(HEADER.pack(MAGIC, VERSION, len(self.orders["seq"]), len(self.lines["item"]),
+                                   len(self.strings), start, end))
+            for section in sections + [b"".join(blobs)]:
+                file.write(b"\0" * (_aligned(file.tell()) - file.tell()))
+                file.write(section if isinstance(section, bytes) else section.tobytes())
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_file, path)
+
+
+class OrderColumns:
+    """A columns file mapped into memory
+
+    Each column is a read-only ``memoryview`` over the file, e.g.
+    ``columns.total[i]`` or ``sum(columns.total)``. ``line_start[i]`` to
+    ``line_start[i + 1]`` are the line items of order ``i``.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.order_count, self.line_count, self.string_count, self.start, self.end = \
+            HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.map.close()
+            raise ValueError(f"{path} is not a version {VERSION} order columns file")
+        if sys.byteorder != "little":
+            self.map.close()
+            raise ValueError("Order columns files can only be mapped on little-endian machines")
+
+        view = memoryview(self.map)
+        position = HEADER.size
+
+        def column(code, count):
+            nonlocal position
+            position = _aligned(position)
+            size = array(code).itemsize * count
+            section = view[position:position + size].cast(code)
+            position += size
+            return section
+
+        for name, code in ORDER_COLUMNS:
+            setattr(self, name, column(code, self.order_count))
+        self.line_start = column("I", self.order_count + 1)
+        for name, code in LINE_COLUMNS:
+            setattr(self, name, column(code, self.line_count))
+        self.string_offsets = column("I", self.string_count + 1)
+        position = _aligned(position)
+        self.string_data = view[position:position + self.string_offsets[-1]]
+        self._strings = {}
+
+    def __len__(self):
+        return self.order_count
+
+    def string(self, string_id):
+        text = self._strings.get(string_id)
+        if text is None:
+            text = self._strings[string_id] = str(
+                self.string_data[self.string_offsets[string_id]:self.string_offsets[string_id + 1]], "utf-8")
+        return text
+
+    def summary(self, index):
+        """An order without its items, as ``order_log`` returns it"""
+        return {
+            "id": self.string(self.order_id[index]),
+            "timestamp": time_text(self.time[index]),
+            "customer": self.string(self.customer[index]),
+            "total": self.total[index],
+            "status": self.string(self.status[index])
+        }
+
+    def order(self, index):
+        """An order with its items, as ``order_log`` returns it"""
+        return {
+            "id": self.string(self.order_id[index]),
+            "timestamp": time_text(self.time[index]),
+            "customer": self.string(self.customer[index]),
+            "items": [{"name": self.string(self.item[line]), "quantity": self.quantity[line],
+                       "price": self.price[line]}
+                      for line in range(self.line_start[index], self.line_start[index + 1])],
+            "total": self.total[index],
+            "status": self.string(self.status[index])
+        }
+
+    def next_offset(self, index):
+        """Log offset just after order ``index``"""
+        return self.offset[index + 1] if index + 1 < self.order_count else self.end
+
+    def string_ids(self, match):
+        """IDs of every string for which ``match(text)`` is true"""
+        return {string_id for string_id in range(self.string_count) if match(self.string(string_id))}
+
+    def close(self):
+        for name in [name for name, _ in ORDER_COLUMNS] + ["line_start"] + [name for name, _ in LINE_COLUMNS]:
+            getattr(self, name).release()
+        self.string_offsets.release()
+        self.string_data.release()
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
@@ -0,0 +1,838 @@
+"""Append-only order log with a sidecar offset index.
+
+Orders are stored one per line in the orders file (see ``format_order_line``).
+Next to it lives a small binary index (``cafe_orders.idx``) that records the
+byte offset, sequence number and timestamp of every order plus a header with the log
+size and the last sequence number, so startup never has to reparse the log.
+Because orders are appended in time order, the timestamps kept in the index
+also let ``iter_orders`` jump straight to the start of a date range.
+
+Finished days are rolled out of the live file into compressed segments (see
+``order_archive``); the readers here go through both, opening only the
+segments that can hold what they are looking for.
+"""
+
+import bisect
+import os
+import struct
+from datetime import date, datetime
+
+import money
+import order_archive
+import order_columns
+from coordinator import FileLock, lock_path
+
+# Index file layout
+INDEX_MAGIC = b"CMIX"
+INDEX_VERSION = 2
+# magic, version, log size, log mtime (ns), order count, last sequence number
+INDEX_HEADER = struct.Struct("<4sIQqQQ")
+# byte offset of the order line, sequence number, timestamp as YYYYMMDDHHMMSS
+INDEX_RECORD = struct.Struct("<QQQ")
+
+
+# Build the index file name for an orders file
+def index_path(log_path):
+    return os.path.splitext(log_path)[0] + ".idx"
+
+
+# Threads and other stations append while we read, the lock keeps them apart
+def _lock(log_path):
+    return FileLock.for_path(lock_path(log_path))
+
+
+# Turn an order ID like "ORD0042" into its sequence number
+def order_seq(order_id):
+    digits = "".join(ch for ch in order_id if ch.isdigit())
+    return int(digits) if digits else 0
+
+
+# Characters that separate the fields of an order line, the names written into it can't hold them
+SEPARATORS = (",", ";", ":", "\r", "\n")
+
+
+def has_separator(text):
+    """True if the text would break an order line (see ``SEPARATORS``)"""
+    return any(separator in text for separator in SEPARATORS)
+
+
+# Format an order as a line of the orders file, amounts in paisa are written as rupees ("49.50")
+def format_order_line(order_id, timestamp, customer_name, items, total_amount, status):
+    items_str = ";".join([f"{item['name']}:{item['quantity']}:{money.text(item['price'])}" for item in items])
+    return f"{order_id},{timestamp},{customer_name},{items_str},{money.text(total_amount)},{status}\n"
+
+
+# Parse a line of the orders file, returns None for blank or broken lines
+def parse_order_line(line):
+    line = line.strip()
+    if not line:
+        return None
+    parts = line.split(",")
+    if len(parts) < 6:
+        return None
+
+    items = []
+    items_str = parts[3].strip()
+    if items_str:
+        for item_part in items_str.split(";"):
+            item_details = item_part.split(":")
+            if len(item_details) >= 3:
+                items.append({
+                    "name": item_details[0],
+                    "quantity": int(item_details[1]),
+                    "price": money.parse(item_details[2])
+                })
+
+    return {
+        "id": parts[0].strip(),
+        "timestamp": parts[1].strip(),
+        "customer": parts[2].strip(),
+        "items": items,
+        "total": money.parse(parts[4]),
+        "status": parts[5].strip()
+    }
+
+
+# Turn "2024-01-31 14:05:09" into the sortable number 20240131140509
+def timestamp_key(timestamp):
+    if isinstance(timestamp, datetime):
+        return int(timestamp.strftime("%Y%m%d%H%M%S"))
+    if isinstance(timestamp, date):
+        return int(timestamp.strftime("%Y%m%d")) * 1000000
+    digits = "".join(ch for ch in timestamp if ch.isdigit())
+    if not digits:
+        return 0
+    # A bare date means midnight
+    return int(digits.ljust(14, "0")[:14])
+
+
+# Cheap check used while indexing: a line is an order if it has all six fields
+def _index_fields(raw_line):
+    line = raw_line.strip()
+    if not line:
+        return None
+    parts = line.split(b",", 6)
+    if len(parts) < 6:
+        return None
+    order_id = parts[0].strip().decode("utf-8", "replace")
+    return order_id, timestamp_key(parts[1].decode("ascii", "replace"))
+
+
+def _log_stat(log_path):
+    try:
+        st = os.stat(log_path)
+        return st.st_size, st.st_mtime_ns
+    except FileNotFoundError:
+        return 0, 0
+
+
+def _write_header(index_file, log_size, log_mtime, count, last_seq):
+    index_file.seek(0)
+    index_file.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, log_size, log_mtime, count, last_seq))
+
+
+# Scan the log from a byte offset and append index records for every order found
+def _scan_into(log_path, index_file, start, count, last_seq):
+    records = []
+    with open(log_path, "rb") as log:
+        log.seek(start)
+        offset = start
+        for raw_line in log:
+            fields = _index_fields(raw_line)
+            if fields is not None:
+                seq = order_seq(fields[0])
+                records.append(INDEX_RECORD.pack(offset, seq, fields[1]))
+                last_seq = max(last_seq, seq)
+            offset += len(raw_line)
+
+    index_file.seek(INDEX_HEADER.size + count * INDEX_RECORD.size)
+    index_file.write(b"".join(records))
+    index_file.truncate()
+    return count + len(records), last_seq
+
+
+def rebuild_index(log_path):
+    """Rebuild the index from scratch by scanning the whole log"""
+    log_size, log_mtime = _log_stat(log_path)
+    # Written aside and swapped in, readers may still have the old index open
+    temp_file = index_path(log_path) + ".tmp"
+    with open(temp_file, "w+b") as index_file:
+        count, last_seq = 0, 0
+        if log_size:
+            count, last_seq = _scan_into(log_path, index_file, 0, 0, 0)
+        _write_header(index_file, log_size, log_mtime, count, last_seq)
+    os.replace(temp_file, index_path(log_path))
+    return {"log_size": log_size, "log_mtime": log_mtime, "count": count, "last_seq": last_seq}
+
+
+def _read_header(index_file):
+    data = index_file.read(INDEX_HEADER.size)
+    if len(data) != INDEX_HEADER.size:
+        return None
+    magic, version, log_size, log_mtime, count, last_seq = INDEX_HEADER.unpack(data)
+    if magic != INDEX_MAGIC or version != INDEX_VERSION:
+        return None
+    return {"log_size": log_size, "log_mtime": log_mtime, "count": count, "last_seq": last_seq}
+
+
+def ensure_index(log_path):
+    """Return the index header, repairing the index if it is missing or stale
+
+    If the log only grew (e.g. it was appended to by an older version of the
+    app) the new tail is indexed; any other mismatch triggers a full rebuild.
+    """
+    with _lock(log_path):
+        _finish_roll(log_path)
+        log_size, log_mtime = _log_stat(log_path)
+        try:
+            with open(index_path(log_path), "r+b") as index_file:
+                header = _read_header(index_file)
+                if header is not None:
+                    index_file.seek(0, os.SEEK_END)
+                    expected_size = INDEX_HEADER.size + header["count"] * INDEX_RECORD.size
+                    if index_file.tell() != expected_size:
+                        header = None
+
+                if header is not None and log_size == header["log_size"] and log_mtime == header["log_mtime"]:
+                    return header
+
+                if header is not None and log_size > header["log_size"]:
+                    # The log grew behind our back, index only the new tail
+                    count, last_seq = _scan_into(log_path, index_file, header["log_size"],
+                                                 header["count"], header["last_seq"])
+                    _write_header(index_file, log_size, log_mtime, count, last_seq)
+                    return {"log_size": log_size, "log_mtime": log_mtime, "count": count, "last_seq": last_seq}
+        except FileNotFoundError:
+            pass
+
+        return rebuild_index(log_path)
+
+
+def append_order(log_path, line):
+    """Append an order line to the log and record it in the index"""
+    return append_orders(log_path, [line])[0]
+
+
+def append_orders(log_path, lines, sync=False):
+    """Append several order lines with a single write and index them
+
+    With ``sync`` the log is flushed to disk before returning, so a whole
+    batch of orders costs one fsync. Returns the offset of each line.
+    """
+    with _lock(log_path):
+        header = ensure_index(log_path)
+        if lines and _should_roll(log_path, header, timestamp_key(lines[0].split(",", 2)[1])):
+            roll_log(log_path)
+        with open(log_path, "ab") as log:
+            offset = log.tell()
+            offsets = []
+            records = []
+            for line in lines:
+                fields = line.split(",", 2)
+                offsets.append(offset)
+                records.append((offset, order_seq(fields[0]), timestamp_key(fields[1])))
+                offset += len(line.encode("utf-8"))
+            log.write("".join(lines).encode("utf-8"))
+            if sync:
+                log.flush()
+                os.fsync(log.fileno())
+        log_size, log_mtime = _log_stat(log_path)
+
+        # The index can always be rebuilt from the log, so it is not synced
+        with open(index_path(log_path), "r+b") as index_file:
+            header = _read_header(index_file)
+            count = header["count"]
+            index_file.seek(INDEX_HEADER.size + count * INDEX_RECORD.size)
+            index_file.write(b"".join(INDEX_RECORD.pack(*record) for record in records))
+            last_seq = max([header["last_seq"]] + [record[1] for record in records])
+            _write_header(index_file, log_size, log_mtime, count + len(records), last_seq)
+        return offsets
+
+
+def next_order_seq(log_path):
+    """Sequence number for the next order ID"""
+    with _lock(log_path):
+        last_seq = ensure_index(log_path)["last_seq"]
+        segments = order_archive.load_manifest(log_path)["segments"]
+    return max([last_seq] + [segment["last_seq"] for segment in segments]) + 1
+
+
+def order_count(log_path):
+    """Number of orders in the log"""
+    with _lock(log_path):
+        count = ensure_index(log_path)["count"]
+        segments = order_archive.load_manifest(log_path)["segments"]
+    return count + sum(segment["count"] for segment in segments)
+
+
+def log_size(log_path):
+    """Size of the whole log in bytes, archived segments included
+
+    Offsets up to this size stay valid when the log is rolled (see
+    ``iter_chunks_from``).
+    """
+    with _lock(log_path):
+        archived = order_archive.load_manifest(log_path)["archived_bytes"]
+        return archived + _log_stat(log_path)[0]
+
+
+# Read the (offset, seq, timestamp) index record at a position
+def _read_record(index_file, position):
+    index_file.seek(INDEX_HEADER.size + position * INDEX_RECORD.size)
+    return INDEX_RECORD.unpack(index_file.read(INDEX_RECORD.size))
+
+
+# How far around the expected slot to look for an order saved out of turn
+NEARBY_RECORDS = 256
+
+
+def _find_position(index_file, count, seq):
+    # Orders are normally numbered 1, 2, 3... so try the direct slot first
+    position = seq - 1
+    if 0 <= position < count and _read_record(index_file, position)[1] == seq:
+        return position
+
+    # Otherwise binary search, sequence numbers (almost) only ever grow
+    low, high = 0, count
+    while low < high:
+        mid = (low + high) // 2
+        if _read_record(index_file, mid)[1] < seq:
+            low = mid + 1
+        else:
+            high = mid
+    if low < count and _read_record(index_file, low)[1] == seq:
+        return low
+
+    # With several stations an order can be saved a little after a later one
+    start = max(low - NEARBY_RECORDS, 0)
+    end = min(low + NEARBY_RECORDS, count)
+    for position in range(start, end):
+        if _read_record(index_file, position)[1] == seq:
+            return position
+
+    # Last resort, read the whole index
+    index_file.seek(INDEX_HEADER.size)
+    data = index_file.read(count * INDEX_RECORD.size)
+    for position, (_, record_seq, _) in enumerate(INDEX_RECORD.iter_unpack(data)):
+        if record_seq == seq:
+            return position
+    return None
+
+
+def read_order_line(log_path, order_id):
+    """Read one raw order line by seeking to its offset, or None if not found"""
+    seq = order_seq(order_id)
+    with _lock(log_path):
+        header = ensure_index(log_path)
+        with open(index_path(log_path), "rb") as index_file:
+            position = _find_position(index_file, header["count"], seq)
+            if position is not None:
+                with open(log_path, "rb") as log:
+                    log.seek(_read_record(index_file, position)[0])
+                    return log.readline().decode("utf-8")
+        segments = order_archive.load_manifest(log_path)["segments"]
+
+    # Not in the live file: look in the archived segments that cover its number
+    for segment in reversed(segments):
+        if segment["first_seq"] <= seq <= segment["last_seq"]:
+            columns = order_archive.segment_columns(log_path, segment)
+            if columns is not None:
+                index = _column_index(columns, seq, order_id)
+                if index is not None:
+                    order = columns.order(index)
+                    return format_order_line(order["id"], order["timestamp"], order["customer"], order["items"],
+                                             order["total"], order["status"])
+                continue
+            raw_line = order_archive.segment_lines(log_path, segment).get(order_id)
+            if raw_line is not None:
+                return raw_line.decode("utf-8")
+    return None
+
+
+def _column_index(columns, seq, order_id):
+    # Position of an order in a columns file, tried at its expected slot first
+    def matches(index):
+        return columns.seq[index] == seq and columns.string(columns.order_id[index]) == order_id
+
+    position = seq - columns.seq[0] if len(columns) else -1
+    if 0 <= position < len(columns) and matches(position):
+        return position
+    for index in range(len(columns)):
+        if matches(index):
+            return index
+    return None
+
+
+def read_order(log_path, order_id):
+    """Read and parse one order by its ID, or None if not found"""
+    line = read_order_line(log_path, order_id)
+    if line is None:
+        return None
+    order = parse_order_line(line)
+    if order is None or order["id"] != order_id:
+        return None
+    return order
+
+
+# Position in the index of the first order stamped at or after the given timestamp key
+def _position_for_timestamp(index_file, count, key):
+    low, high = 0, count
+    while low < high:
+        mid = (low + high) // 2
+        if _read_record(index_file, mid)[2] < key:
+            low = mid + 1
+        else:
+            high = mid
+    return low
+
+
+# Byte offset of the first order stamped at or after the given timestamp key
+def _offset_for_timestamp(log_path, key):
+    with _lock(log_path):
+        header = ensure_index(log_path)
+        count = header["count"]
+        with open(index_path(log_path), "rb") as index_file:
+            position = _position_for_timestamp(index_file, count, key)
+            if position == count:
+                return header["log_size"]
+            return _read_record(index_file, position)[0]
+
+
+def iter_orders(log_path, since=None, until=None, customer=None, status=None):
+    """Yield orders from the log one at a time, oldest first
+
+    ``since`` is inclusive and ``until`` exclusive; both accept a datetime,
+    a date or a "YYYY-MM-DD[ HH:MM:SS]" string. Only the archived segments
+    that overlap the range are read. In the live file the read starts at the
+    first matching order found through the index, and with ``until`` it
+    stops at the first order past the range. ``customer`` is matched
+    case-insensitively, ``status`` exactly. Only orders that pass the filters
+    have their items parsed.
+    """
+    if not os.path.exists(log_path):
+        return
+
+    since_key = timestamp_key(since) if since is not None else None
+    until_key = timestamp_key(until) if until is not None else None
+    if customer is not None:
+        customer = customer.strip().lower()
+
+    # The archive and the live file as they are now, even if the log is rolled meanwhile
+    with _lock(log_path):
+        ensure_index(log_path)
+        manifest = order_archive.load_manifest(log_path)
+        start = _offset_for_timestamp(log_path, since_key) if since_key is not None else 0
+        log = open(log_path, "rb")
+
+    with log:
+        for segment in _segments_in_range(manifest, since_key, until_key):
+            columns = order_archive.segment_columns(log_path, segment)
+            if columns is not None:
+                for index in _matching_indexes(columns, since_key, until_key, customer, status):
+                    yield columns.order(index)
+                continue
+            with order_archive.open_segment(log_path, segment) as stream:
+                yield from _matching_orders(stream, since_key, until_key, customer, status)
+        log.seek(start)
+        yield from _matching_orders(log, None, until_key, customer, status)
+
+
+def _segments_in_range(manifest, since_key, until_key):
+    return [segment for segment in manifest["segments"]
+            if (since_key is None or segment["last_time"] >= since_key)
+            and (until_key is None or segment["first_time"] < until_key)]
+
+
+def _matching_orders(lines, since_key, until_key, customer, status):
+    for raw_line in lines:
+        parts = raw_line.split(b",", 6)
+        if len(parts) < 6:
+            continue
+        if since_key is not None or until_key is not None:
+            key = timestamp_key(parts[1].decode("ascii", "replace"))
+            if until_key is not None and key >= until_key:
+                break
+            if since_key is not None and key < since_key:
+                continue
+        if customer is not None and parts[2].decode("utf-8").strip().lower() != customer:
+            continue
+        if status is not None and parts[5].decode("utf-8").strip() != status:
+            continue
+        order = parse_order_line(raw_line.decode("utf-8"))
+        if order is not None:
+            yield order
+
+
+# Positions in a columns file between two timestamp keys, which orders are saved in
+def _time_range(columns, since_key, until_key):
+    low = bisect.bisect_left(columns.time, since_key) if since_key is not None else 0
+    high = bisect.bisect_left(columns.time, until_key) if until_key is not None else len(columns)
+    return range(low, max(low, high))
+
+
+def _matching_indexes(columns, since_key, until_key, customer, status):
+    # Filters become sets of string IDs, so each order is checked with a lookup
+    customers = columns.string_ids(lambda text: text.lower() == customer) if customer is not None else None
+    statuses = columns.string_ids(lambda text: text == status) if status is not None else None
+    for index in _time_range(columns, since_key, until_key):
+        if customers is not None and columns.customer[index] not in customers:
+            continue
+        if statuses is not None and columns.status[index] not in statuses:
+            continue
+        yield index
+
+
+# Parse everything but the items of an order line, returns None for broken lines
+def _summary_fields(raw_line):
+    parts = raw_line.split(b",", 6)
+    if len(parts) < 6:
+        return None
+    return {
+        "id": parts[0].decode("utf-8").strip(),
+        "timestamp": parts[1].decode("utf-8").strip(),
+        "customer": parts[2].decode("utf-8").strip(),
+        "total": money.parse(parts[4].decode("ascii")),
+        "status": parts[5].decode("utf-8").strip()
+    }
+
+
+# Index records read at a time while paging
+PAGE_RECORDS = 1024
+
+
+def iter_order_summaries(log_path, since=None, until=None, customer=None, status=None,
+                         newest_first=False, skip=0):
+    """Yield orders without their items, in log order or newest first
+
+    Filters work as in ``iter_orders``. Orders in the live file are found
+    through the index, so reading the newest ones never touches the rest of
+    the log. ``skip`` matching orders are passed over first; without a
+    customer or status filter they are skipped in the index (and whole
+    archived segments by their count) without reading them.
+    """
+    if not os.path.exists(log_path):
+        return
+    if customer is not None:
+        customer = customer.strip().lower()
+    filtered = customer is not None or status is not None
+    since_key = timestamp_key(since) if since is not None else None
+    until_key = timestamp_key(until) if until is not None else None
+
+    with _lock(log_path):
+        count = ensure_index(log_path)["count"]
+        manifest = order_archive.load_manifest(log_path)
+        index_file = open(index_path(log_path), "rb")
+        log = open(log_path, "rb")
+    low = _position_for_timestamp(index_file, count, since_key) if since_key is not None else 0
+    high = _position_for_timestamp(index_file, count, until_key) if until_key is not None else count
+    segments = _segments_in_range(manifest, since_key, until_key)
+    remaining = [skip]
+
+    def live():
+        start, end = low, high
+        if not filtered:
+            skipped = min(remaining[0], end - start)
+            if newest_first:
+                end -= skipped
+            else:
+                start += skipped
+            remaining[0] -= skipped
+        return _indexed_summaries(index_file, log, start, end, newest_first)
+
+    def archived(segment):
+        inside = ((since_key is None or segment["first_time"] >= since_key)
+                  and (until_key is None or segment["last_time"] < until_key))
+        if not filtered and inside and remaining[0] >= segment["count"]:
+            remaining[0] -= segment["count"]
+            return
+        columns = order_archive.segment_columns(log_path, segment)
+        if columns is not None:
+            indexes = _time_range(columns, since_key, until_key)
+            for index in reversed(indexes) if newest_first else indexes:
+                yield columns.summary(index)
+            return
+        with order_archive.open_segment(log_path, segment) as stream:
+            summaries = _segment_summaries(stream, since_key, until_key)
+            if newest_first:
+                summaries = reversed(list(summaries))
+            yield from summaries
+
+    if newest_first:
+        sources = [live] + [lambda segment=segment: archived(segment) for segment in reversed(segments)]
+    else:
+        sources = [lambda segment=segment: archived(segment) for segment in segments] + [live]
+
+    with index_file, log:
+        for source in sources:
+            for summary in source():
+                if customer is not None and summary["customer"].lower() != customer:
+                    continue
+                if status is not None and summary["status"] != status:
+                    continue
+                if remaining[0]:
+                    remaining[0] -= 1
+                    continue
+                yield summary
+
+
+def _indexed_summaries(index_file, log, low, high, newest_first):
+    # Summaries of the live file's orders between two index positions
+    while low < high:
+        if newest_first:
+            start, end = max(high - PAGE_RECORDS, low), high
+            high = start
+        else:
+            start, end = low, min(low + PAGE_RECORDS, high)
+            low = end
+        index_file.seek(INDEX_HEADER.size + start * INDEX_RECORD.size)
+        records = list(INDEX_RECORD.iter_unpack(index_file.read((end - start) * INDEX_RECORD.size)))
+        if newest_first:
+            records.reverse()
+
+        for offset, _, _ in records:
+            log.seek(offset)
+            summary = _summary_fields(log.readline())
+            if summary is not None:
+                yield summary
+
+
+def _segment_summaries(lines, since_key, until_key):
+    for raw_line in lines:
+        summary = _summary_fields(raw_line)
+        if summary is None:
+            continue
+        if since_key is not None or until_key is not None:
+            key = timestamp_key(summary["timestamp"])
+            if until_key is not None and key >= until_key:
+                break
+            if since_key is not None and key < since_key:
+                continue
+        yield summary
+
+
+def iter_chunks_from(log_path, offset, columns=False):
+    """Yield ``(data, next offset)`` with the complete lines after an offset
+
+    ``offset`` counts through the whole log, archived segments included (see
+    ``log_size``); each chunk holds the rest of one segment or of the live
+    file. A line still being written by another station is left for later.
+    With ``columns``, a segment read from its start comes as its mapped
+    ``OrderColumns`` instead of bytes when it has a columns file.
+    """
+    if not os.path.exists(log_path):
+        return
+    with _lock(log_path):
+        manifest = order_archive.load_manifest(log_path)
+        log = open(log_path, "rb")
+
+    with log:
+        for segment in manifest["segments"]:
+            if segment["start"] + segment["size"] <= offset:
+                continue
+            segment_columns = order_archive.segment_columns(log_path, segment) if columns else None
+            if segment_columns is not None and offset <= segment["start"]:
+                offset = segment["start"] + segment["size"]
+                yield segment_columns, offset
+                continue
+            with order_archive.open_segment(log_path, segment) as stream:
+                if offset > segment["start"]:
+                    stream.seek(offset - segment["start"])
+                data = stream.read()
+            offset = segment["start"] + segment["size"]
+            yield data, offset
+
+        log.seek(max(offset - manifest["archived_bytes"], 0))
+        data = log.read()
+        end = data.rfind(b"\n") + 1
+        if end:
+            yield data[:end], offset + end
+
+
+def iter_lines_from(log_path, offset):
+    """Yield ``(order or None, next offset)`` for each complete line after an offset"""
+    for data, end in iter_chunks_from(log_path, offset, columns=True):
+        if isinstance(data, order_columns.OrderColumns):
+            for index in range(len(data)):
+                yield data.order(index), data.next_offset(index)
+            continue
+        offset = end - len(data)
+        for raw_line in data.splitlines(keepends=True):
+            offset += len(raw_line)
+            yield parse_order_line(raw_line.decode("utf-8")), offset
+
+
+# Rolling the live file into the archive
+
+# Roll the live file once it holds a finished day or grows past this size
+SEGMENT_MAX_BYTES = 16 * 1024 * 1024
+
+
+def _should_roll(log_path, header, new_key):
+    if header["count"] == 0:
+        return False
+    if header["log_size"] >= SEGMENT_MAX_BYTES:
+        return True
+    with open(index_path(log_path), "rb") as index_file:
+        first_key = _read_record(index_file, 0)[2]
+    # The first order of a new day closes the previous ones
+    return first_key // 1000000 < new_key // 1000000
+
+
+def _segment_info(lines, start):
+    keys = []
+    seqs = []
+    for raw_line in lines:
+        fields = _index_fields(raw_line)
+        if fields is not None:
+            seqs.append(order_seq(fields[0]))
+            keys.append(fields[1])
+    return {"start": start, "size": sum(len(raw_line) for raw_line in lines), "count": len(seqs),
+            "first_seq": min(seqs, default=0), "last_seq": max(seqs, default=0),
+            "first_time": min(keys, default=0), "last_time": max(keys, default=0)}
+
+
+def _replace_file(path, data):
+    temp_file = path + ".tmp"
+    with open(temp_file, "wb") as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_file, path)
+
+
+def roll_log(log_path):
+    """Move every complete line of the live file into compressed segments
+
+    The lines are split into one segment per day (and per
+    ``SEGMENT_MAX_BYTES``). Returns the new segments.
+    """
+    with _lock(log_path):
+        ensure_index(log_path)
+        with open(log_path, "rb") as log:
+            data = log.read()
+        end = data.rfind(b"\n") + 1
+        if end == 0:
+            return []
+
+        manifest = dict(order_archive.load_manifest(log_path))
+        offset = manifest["archived_bytes"]
+        groups = []
+        group = []
+        group_day = None
+        group_size = 0
+        for raw_line in data[:end].splitlines(keepends=True):
+            fields = _index_fields(raw_line)
+            day = fields[1] // 1000000 if fields is not None else group_day
+            if group and (day != group_day or group_size + len(raw_line) > SEGMENT_MAX_BYTES):
+                groups.append((group_day, group))
+                group, group_size = [], 0
+            group.append(raw_line)
+            group_size += len(raw_line)
+            group_day = day
+        groups.append((group_day, group))
+
+        segments = []
+        for day, lines in groups:
+            segment = _segment_info(lines, offset)
+            name = f"orders-{day or 0}-{offset:012d}"
+            segment["file"] = order_archive.write_segment(log_path, name, b"".join(lines))
+            segment["columns"] = order_archive.write_columns(
+                log_path, name, _columns_writer(lines, offset), offset, offset + segment["size"])
+            segments.append(segment)
+            offset += segment["size"]
+
+        # Until the live file is replaced, its head tells a crashed roll apart (see ensure_index)
+        manifest["segments"] = manifest["segments"] + segments
+        manifest["archived_bytes"] = offset
+        manifest["rolled"] = {"size": end, "head": data[:end].split(b"\n", 1)[0].decode("utf-8", "replace")}
+        order_archive.save_manifest(log_path, manifest)
+        _replace_file(log_path, data[end:])
+        rebuild_index(log_path)
+        manifest["rolled"] = None
+        order_archive.save_manifest(log_path, manifest)
+        return segments
+
+
+def _finish_roll(log_path):
+    # A roll that crashed after saving the manifest left the archived lines in the live file
+    rolled = order_archive.load_manifest(log_path).get("rolled")
+    if not rolled:
+        return
+    try:
+        with open(log_path, "rb") as log:
+            head = log.readline().rstrip(b"\n").decode("utf-8", "replace")
+            if head == rolled["head"] and os.path.getsize(log_path) >= rolled["size"]:
+                log.seek(rolled["size"])
+                _replace_file(log_path, log.read())
+    except FileNotFoundError:
+        pass
+    manifest = dict(order_archive.load_manifest(log_path))
+    manifest["rolled"] = None
+    order_archive.save_manifest(log_path, manifest)
+
+
+# Columns files (see order_columns)
+
+def _columns_writer(lines, start):
+    # Column arrays of the orders in raw lines that begin at log offset ``start``
+    writer = order_columns.ColumnWriter()
+    offset = start
+    for raw_line in lines:
+        order = parse_order_line(raw_line.decode("utf-8"))
+        if order is not None:
+            writer.add(offset, order_seq(order["id"]), timestamp_key(order["timestamp"]), order["id"],
+                       order["customer"], order["status"], order["total"],
+                       [(item["name"], item["quantity"], item["price"]) for item in order["items"]])
+        offset += len(raw_line)
+    return writer
+
+
+def add_columns(log_path):
+    """Write the columns files missing from archived segments, returns how many were written
+
+    Columns files of an older version (prices in rupees) are written again.
+    """
+    with _lock(log_path):
+        manifest = dict(order_archive.load_manifest(log_path))
+        segments = []
+        written = 0
+        for segment in manifest["segments"]:
+            if order_archive.segment_columns(log_path, segment) is None:
+                with order_archive.open_segment(log_path, segment) as stream:
+                    lines = stream.readlines()
+                segment = dict(segment)
+                segment["columns"] = order_archive.write_columns(
+                    log_path, segment["file"].split(".", 1)[0], _columns_writer(lines, segment["start"]),
+                    segment["start"], segment["start"] + segment["size"])
+                written += 1
+            segments.append(segment)
+        if written:
+            manifest["segments"] = segments
+            order_archive.save_manifest(log_path, manifest)
+    return written
+
+
+def text_to_columns(text_path, columns_path):
+    """Convert an orders file in the text format into a columns file, returns the order count"""
+    with open(text_path, "rb") as file:
+        lines = file.readlines()
+    writer = _columns_writer(lines, 0)
+    writer.write(columns_path, 0, sum(len(raw_line) for raw_line in lines))
+    return len(writer.orders["seq"])
+
+
+def columns_to_text(columns_path, text_path):
+    """Convert a columns file back into the text format, returns the order count
+
+    Prices and totals are written the way the app writes them, so a file
+    that was edited by hand may not come back byte for byte.
+    """
+    temp_file = text_path + ".tmp"
+    with order_columns.OrderColumns(columns_path) as columns, open(temp_file, "w", encoding="utf-8", newline="") as file:
+        for index in range(len(columns)):
+            order = columns.order(index)
+            file.write(format_order_line(order["id"], order["timestamp"], order["customer"], order["items"],
+                                         order["total"], order["status"]))
+        count = len(columns)
+    os.replace(temp_file, text_path)
+    return count
@@ -0,0 +1,237 @@
+"""Compact in-memory order history.
+
+A list of order dicts costs several hundred bytes per order and again per
+line item, mostly in dict overhead and repeated strings (every line carries
+its item name, every order its ID and timestamp). ``OrderTable`` keeps the
+same orders as columns of ``array`` values instead:
+
+    per order   seq q, time q (YYYYMMDDHHMMSS), customer i, status i,
+                total q, first line i (one extra at the end)
+    per line    item i, quantity i, price q
+
+Totals and prices are paisa (see ``money``).
+
+Item names, customers and statuses are numbered once in a symbol table
+(``Symbols``), so a line is 16 bytes and an order about 40. Order IDs of the
+usual ``ORD0042`` form are kept as their number and timestamps as the
+sortable number of ``order_log.timestamp_key``; the rare one that would not
+come back the same is kept as it is on the side.
+
+Indexing or iterating the table gives ``OrderView`` objects, read-only
+mappings with the keys of an order dict, so code written for the dicts
+(``order["total"]``, ``order["items"]``) keeps working. Views are made on
+the fly and hold nothing but the table and a row number.
+
+    python order_table.py [--storage sqlite]    memory of the history as dicts and as a table
+"""
+
+import argparse
+import sys
+from array import array
+from collections.abc import Mapping, Sequence
+
+import order_columns
+import order_log
+
+ORDER_KEYS = ("id", "timestamp", "customer", "items", "total", "status")
+
+
+def _order_id(seq):
+    return f"ORD{seq:04d}"
+
+
+class Symbols:
+    """Strings numbered in the order they are first seen"""
+
+    __slots__ = ("names", "ids")
+
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, number):
+        return self.names[number]
+
+    def intern(self, text):
+        number = self.ids.get(text)
+        if number is None:
+            number = self.ids[text] = len(self.names)
+            self.names.append(text)
+        return number
+
+    def get(self, text):
+        """The number of a string, or None if it was never seen"""
+        return self.ids.get(text)
+
+
+class OrderView(Mapping):
+    """One order of an ``OrderTable``, read like an order dict"""
+
+    __slots__ = ("table", "index")
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    def __getitem__(self, key):
+        table = self.table
+        index = self.index
+        if key == "id":
+            return table.order_id(index)
+        if key == "timestamp":
+            return table.timestamp(index)
+        if key == "customer":
+            return table.customers[table.customer[index]]
+        if key == "items":
+            return [{"name": name, "quantity": quantity, "price": price}
+                    for name, quantity, price in table.lines(index)]
+        if key == "total":
+            return table.total[index]
+        if key == "status":
+            return table.statuses[table.status[index]]
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(ORDER_KEYS)
+
+    def __len__(self):
+        return len(ORDER_KEYS)
+
+    def __repr__(self):
+        return f"OrderView({dict(self)!r})"
+
+
+class OrderTable(Sequence):
+    """Orders held as columns of arrays, see the module docstring"""
+
+    def __init__(self, orders=()):
+        self.items = Symbols()
+        self.customers = Symbols()
+        self.statuses = Symbols()
+        self.seq = array("q")
+        self.time = array("q")
+        self.customer = array("i")
+        self.status = array("i")
+        self.total = array("q")
+        self.line_start = array("i", [0])
+        self.line_item = array("i")
+        self.line_quantity = array("i")
+        self.line_price = array("q")
+        # row -> order ID or timestamp that the numbers would not give back
+        self.odd_ids = {}
+        self.odd_times = {}
+        self.extend(orders)
+
+    def __len__(self):
+        return len(self.seq)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [OrderView(self, row) for row in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("order index out of range")
+        return OrderView(self, index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield OrderView(self, index)
+
+    def append(self, order):
+        row = len(self.seq)
+        order_id = order["id"]
+        seq = order_log.order_seq(order_id)
+        if _order_id(seq) != order_id:
+            self.odd_ids[row] = order_id
+        timestamp = order["timestamp"]
+        key = order_log.timestamp_key(timestamp)
+        if order_columns.time_text(key) != timestamp:
+            self.odd_times[row] = timestamp
+
+        self.seq.append(seq)
+        self.time.append(key)
+        self.customer.append(self.customers.intern(order["customer"]))
+        self.status.append(self.statuses.intern(order["status"]))
+        self.total.append(order["total"])
+        for item in order["items"]:
+            self.line_item.append(self.items.intern(item["name"]))
+            self.line_quantity.append(item["quantity"])
+            self.line_price.append(item["price"])
+        self.line_start.append(len(self.line_item))
+
+    def extend(self, orders):
+        for order in orders:
+            self.append(order)
+
+    def order_id(self, index):
+        order_id = self.odd_ids.get(index)
+        return order_id if order_id is not None else _order_id(self.seq[index])
+
+    def timestamp(self, index):
+        timestamp = self.odd_times.get(index)
+        return timestamp if timestamp is not None else order_columns.time_text(self.time[index])
+
+    def lines(self, index):
+        """(name, quantity, price) of each item of an order"""
+        names = self.items.names
+        return [(names[self.line_item[line]], self.line_quantity[line], self.line_price[line])
+                for line in range(self.line_start[index], self.line_start[index + 1])]
+
+    def line_count(self):
+        return len(self.line_item)
+
+    def nbytes(self):
+        """Bytes held by the columns (the symbol tables not counted)"""
+        columns = (self.seq, self.time, self.customer, self.status, self.total, self.line_start,
+                   self.line_item, self.line_quantity, self.line_price)
+        return sum(column.itemsize * len(column) for column in columns)
+
+
+def _measure(build):
+    import gc
+    import tracemalloc
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        built = build()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return built, size
+
+
+def main(argv=None):
+    import storage
+
+    parser = argparse.ArgumentParser(description="Memory used by the order history")
+    parser.add_argument("--storage", choices=["text", "sqlite"], help="storage backend (default: as the app)")
+    parser.add_argument("--limit", type=int, help="only the first N orders")
+    args = parser.parse_args(argv)
+
+    store = storage.open_storage(args.storage)
+    try:
+        def orders():
+            rows = store.iter_orders()
+            if args.limit is not None:
+                rows = (order for _, order in zip(range(args.limit), rows))
+            return rows
+
+        as_dicts, dict_bytes = _measure(lambda: list(orders()))
+        del as_dicts
+        table, table_bytes = _measure(lambda: OrderTable(orders()))
+    finally:
+        store.close()
+
+    print(f"{len(table)} orders, {table.line_count()} items")
+    print(f"as dicts  {dict_bytes / 1e6:>10.1f} MB")
+    print(f"as table  {table_bytes / 1e6:>10.1f} MB  ({dict_bytes / max(table_bytes, 1):.1f}x smaller)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
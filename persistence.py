@@ -0,0 +1,159 @@
+"""Background persistence so the till never waits for the disk.
+
+The UI hands jobs (sales, inventory saves, new menu items, imports) to a
+``BackgroundWriter``. A single writer thread saves them in the order they were
+submitted; sales that pile up while a save is in progress are committed
+together with one sync (group commit). Results come back through a queue that
+the Tk main loop drains with ``root.after``, because Tk widgets must only be
+touched from the main thread. Other event loops can pass ``notify`` to be
+woken up when results are ready (e.g. asyncio's ``call_soon_threadsafe``).
+"""
+
+import queue
+import threading
+import time
+
+import metrics
+
+# How often the UI checks for finished jobs (milliseconds)
+POLL_INTERVAL = 50
+# Upper bound on the number of sales committed together
+MAX_BATCH = 100
+
+_STOP = object()
+
+
+class BackgroundWriter:
+    """Runs storage writes on a worker thread"""
+
+    def __init__(self, open_store, max_batch=MAX_BATCH, notify=None):
+        # The store is opened on the worker thread (SQLite connections are per thread)
+        self.open_store = open_store
+        self.max_batch = max_batch
+        # Called on the worker thread after each batch, must be thread safe
+        self.notify = notify
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="cafe-writer", daemon=True)
+        self.thread.start()
+
+    # Submitting jobs (UI thread)
+
+    def submit_order(self, order, on_done):
+        """Queue a sale
+
+        ``on_done(error)`` is called on the UI thread once the sale is on
+        disk (error is None) or has failed.
+        """
+        self.jobs.put(("order", order, on_done))
+
+    def submit_inventory(self, inventory, on_done):
+        self.jobs.put(("inventory", (inventory,), on_done))
+
+    def submit_menu_item(self, name, price, stock, on_done):
+        self.jobs.put(("menu_item", (name, price, stock), on_done))
+
+    def submit_import(self, prices, new_stock, restocks, on_done):
+        """Queue a bulk import (see ``bulk_import``)"""
+        self.jobs.put(("import", (prices, new_stock, restocks), on_done))
+
+    def poll(self):
+        """Run the callbacks of finished jobs, call this from the UI thread"""
+        while True:
+            try:
+                on_done, error = self.results.get_nowait()
+            except queue.Empty:
+                return
+            if on_done is not None:
+                on_done(error)
+
+    def attach(self, root):
+        """Poll for finished jobs from the Tk main loop"""
+        def tick():
+            self.poll()
+            root.after(POLL_INTERVAL, tick)
+        root.after(POLL_INTERVAL, tick)
+
+    def close(self):
+        """Finish every queued job, then stop the worker thread"""
+        self.jobs.put(_STOP)
+        self.thread.join()
+        self.poll()
+
+    # Worker thread
+
+    def _run(self):
+        try:
+            store = self.open_store()
+        except Exception as e:
+            self._fail_all(e)
+            return
+        try:
+            while True:
+                # Block for one job, then take whatever else queued up meanwhile
+                batch = [self.jobs.get()]
+                while len(batch) < self.max_batch:
+                    try:
+                        batch.append(self.jobs.get_nowait())
+                    except queue.Empty:
+                        break
+
+                stop = any(job is _STOP for job in batch)
+                self._process(store, [job for job in batch if job is not _STOP])
+                if self.notify is not None:
+                    self.notify()
+                if stop:
+                    return
+        finally:
+            store.close()
+
+    def _fail_all(self, error):
+        # Nothing can be saved without a store: every job, queued now or later, fails with the
+        # error so its caller gives back what it holds
+        while True:
+            job = self.jobs.get()
+            if job is not _STOP:
+                self.results.put((job[2], error))
+            if self.notify is not None:
+                self.notify()
+            if job is _STOP:
+                return
+
+    def _process(self, store, batch):
+        index = 0
+        while index < len(batch):
+            kind, args, on_done = batch[index]
+            if kind == "order":
+                # Group consecutive sales into a single commit
+                end = index
+                while end < len(batch) and batch[end][0] == "order":
+                    end += 1
+                self._commit_orders(store, batch[index:end])
+                index = end
+                continue
+
+            try:
+                if kind == "inventory":
+                    store.save_inventory(*args)
+                elif kind == "menu_item":
+                    store.add_menu_item(*args)
+                elif kind == "import":
+                    store.import_items(*args)
+                error = None
+            except Exception as e:
+                error = e
+            self.results.put((on_done, error))
+            index += 1
+
+    def _commit_orders(self, store, jobs):
+        started = time.perf_counter()
+        try:
+            errors = store.commit_orders([order for _, order, _ in jobs])
+        except Exception as e:
+            errors = [e] * len(jobs)
+        metrics.observe("cafe_commit_batch_seconds", time.perf_counter() - started,
+                        help_text="Time to commit one batch of sales to disk")
+        metrics.observe("cafe_commit_batch_orders", len(jobs), metrics.COUNT_BUCKETS,
+                        "Sales committed together in one batch")
+        for (_, _, on_done), error in zip(jobs, errors):
+            self.results.put((on_done, error))
@@ -0,0 +1,313 @@
+"""Sales reports built from the order history.
+
+The orders are loaded into columns, one array per field (day, hour,
+customer, total for every order; order, item, quantity and price for every
+line item), with customers and items stored as small integer codes. After
+the first load only orders added since are read. Reports are group-bys over
+those columns: vectorized with NumPy when it is installed, plain loops over
+the same arrays otherwise.
+
+Only completed orders count towards the figures. Amounts are ints in paisa
+(see ``money``), so the figures are exact.
+"""
+
+import os
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import money
+import order_columns
+import order_log
+
+COMPLETED = "Completed"
+
+
+class SalesColumns:
+    """Every order of a store as column arrays, kept up to date by ``refresh``"""
+
+    def __init__(self, store):
+        self.store = store
+        self.reset()
+
+    def reset(self):
+        # Per order
+        self.day = array("l")        # YYYYMMDD
+        self.hour = array("b")
+        self.customer = array("l")   # code into self.customers
+        self.total = array("q")       # paisa
+        self.completed = array("b")
+        # Per line item
+        self.line_order = array("l")  # position of the order in the columns above
+        self.line_item = array("l")   # code into self.items
+        self.line_quantity = array("l")
+        self.line_price = array("q")  # paisa
+
+        self.customers = []
+        self.customer_codes = {}
+        self.items = []
+        self.item_codes = {}
+        # How far the orders have been read: byte offset (text) or row id (SQLite)
+        self.position = 0
+
+    def __len__(self):
+        return len(self.total)
+
+    def _code(self, names, codes, name, key=None):
+        key = name if key is None else key
+        code = codes.get(key)
+        if code is None:
+            code = codes[key] = len(names)
+            names.append(name)
+        return code
+
+    def _add_order(self, timestamp, customer, total, status):
+        self.day.append(int(timestamp[0:4] + timestamp[5:7] + timestamp[8:10]))
+        self.hour.append(int(timestamp[11:13] or 0))
+        # Customers are told apart case-insensitively, as in the history filter
+        self.customer.append(self._code(self.customers, self.customer_codes, customer, customer.lower()))
+        self.total.append(total)
+        self.completed.append(status == COMPLETED)
+        return len(self.total) - 1
+
+    def _add_line(self, order, name, quantity, price):
+        self.line_order.append(order)
+        self.line_item.append(self._code(self.items, self.item_codes, name))
+        self.line_quantity.append(quantity)
+        self.line_price.append(price)
+
+    def refresh(self):
+        """Read the orders saved since the last call, returns how many were added"""
+        before = len(self)
+        if self.store.name == "sqlite":
+            self._refresh_sqlite()
+        else:
+            self._refresh_text()
+        return len(self) - before
+
+    def _refresh_text(self):
+        log_path = self.store.orders_file
+        size = order_log.log_size(log_path)
+        if size < self.position:
+            # The log was replaced, start over
+            self.reset()
+        if size == self.position:
+            return
+        # Archived segments come in one chunk each (mapped columns when they have them), then the live file
+        for data, end in order_log.iter_chunks_from(log_path, self.position, columns=True):
+            if isinstance(data, order_columns.OrderColumns):
+                self._add_columns(data)
+            else:
+                self._add_text(data)
+            self.position = end
+
+    def _add_columns(self, columns):
+        # String IDs of the file are turned into our codes once per distinct string
+        customer_codes = {}
+        for string_id in set(columns.customer):
+            customer = columns.string(string_id)
+            customer_codes[string_id] = self._code(self.customers, self.customer_codes, customer, customer.lower())
+        item_codes = {string_id: self._code(self.items, self.item_codes, columns.string(string_id))
+                      for string_id in set(columns.item)}
+        completed = columns.string_ids(lambda text: text == COMPLETED)
+
+        first = len(self.total)
+        self.day.extend([key // 1000000 for key in columns.time])
+        self.hour.extend([key // 10000 % 100 for key in columns.time])
+        self.customer.extend([customer_codes[string_id] for string_id in columns.customer])
+        self.total.frombytes(columns.total.cast("B"))
+        self.completed.extend([string_id in completed for string_id in columns.status])
+
+        line_start = columns.line_start
+        for order in range(len(columns)):
+            self.line_order.extend([first + order] * (line_start[order + 1] - line_start[order]))
+        self.line_item.extend([item_codes[string_id] for string_id in columns.item])
+        self.line_quantity.extend(columns.quantity)
+        self.line_price.frombytes(columns.price.cast("B"))
+
+    def _add_text(self, data):
+        # The hot loop of a first load, hence the local names
+        day_append, hour_append = self.day.append, self.hour.append
+        customer_append, total_append, completed_append = self.customer.append, self.total.append, self.completed.append
+        line_order_append, line_item_append = self.line_order.append, self.line_item.append
+        quantity_append, price_append = self.line_quantity.append, self.line_price.append
+        customer_codes, item_codes = self.customer_codes, self.item_codes
+        order = len(self.total) - 1
+
+        for line in data.decode("utf-8").splitlines():
+            parts = line.split(",")
+            if len(parts) < 6:
+                continue
+            order += 1
+            timestamp = parts[1].strip()
+            day_append(int(timestamp[0:4] + timestamp[5:7] + timestamp[8:10]))
+            hour_append(int(timestamp[11:13] or 0))
+            customer = parts[2].strip()
+            code = customer_codes.get(customer.lower())
+            if code is None:
+                code = self._code(self.customers, customer_codes, customer, customer.lower())
+            customer_append(code)
+            total_append(money.parse(parts[4]))
+            completed_append(parts[5].strip() == COMPLETED)
+
+            if parts[3]:
+                for item_part in parts[3].split(";"):
+                    item_details = item_part.split(":")
+                    if len(item_details) >= 3:
+                        code = item_codes.get(item_details[0])
+                        if code is None:
+                            code = self._code(self.items, item_codes, item_details[0])
+                        line_order_append(order)
+                        line_item_append(code)
+                        quantity_append(int(item_details[1]))
+                        price_append(money.parse(item_details[2]))
+
+    def _refresh_sqlite(self):
+        connection = self.store.connection
+        positions = {}
+        last_id = self.position
+        for row_id, timestamp, customer, total, status in connection.execute(
+                "SELECT id, timestamp, customer, total, status FROM orders WHERE id > ? ORDER BY id",
+                (self.position,)):
+            positions[row_id] = self._add_order(timestamp, customer, total, status)
+            last_id = row_id
+        for order_ref, name, quantity, price in connection.execute(
+                "SELECT order_ref, name, quantity, price FROM order_items "
+                "WHERE order_ref > ? AND order_ref <= ? ORDER BY order_ref, line",
+                (self.position, last_id)):
+            self._add_line(positions[order_ref], name, quantity, price)
+        self.position = last_id
+
+
+# Columns are cached per data file, so reopening the reports only reads new orders
+_columns = {}
+
+
+def columns_for(store):
+    """Up to date columns for a store"""
+    if store.name == "sqlite":
+        key = ("sqlite", os.path.abspath(store.database_file))
+    else:
+        key = ("text", os.path.abspath(store.orders_file))
+    columns = _columns.get(key)
+    if columns is None:
+        columns = _columns[key] = SalesColumns(store)
+    columns.store = store
+    columns.refresh()
+    return columns
+
+
+# Date range as YYYYMMDD numbers, "until" is exclusive like everywhere else
+def _day_range(since, until):
+    low = order_log.timestamp_key(since) // 1000000 if since is not None else 0
+    high = order_log.timestamp_key(until) // 1000000 if until is not None else 99999999
+    return low, high
+
+
+def _day_text(day):
+    return f"{day // 10000:04d}-{day // 100 % 100:02d}-{day % 100:02d}"
+
+
+def sales_report(columns, since=None, until=None, top=10):
+    """Revenue per day and hour, top items, average ticket and regular customers
+
+    Returns a dict of plain lists, ready to show.
+    """
+    low, high = _day_range(since, until)
+    if numpy is not None:
+        figures = _aggregate_numpy(columns, low, high)
+    else:
+        figures = _aggregate_python(columns, low, high)
+    orders, revenue, by_day, by_hour, item_quantity, item_revenue, customer_orders, customer_spent = figures
+
+    top_items = sorted(range(len(columns.items)), key=lambda code: (-item_quantity[code], -item_revenue[code]))
+    top_customers = sorted(range(len(columns.customers)), key=lambda code: (-customer_orders[code], -customer_spent[code]))
+    return {
+        "orders": orders,
+        "revenue": revenue,
+        "average_ticket": round(revenue / orders) if orders else 0,
+        "by_day": [(_day_text(day), count, amount) for day, count, amount in by_day],
+        "by_hour": [(hour, count, amount) for hour, (count, amount) in enumerate(by_hour) if count],
+        "top_items": [(columns.items[code], item_quantity[code], item_revenue[code])
+                      for code in top_items[:top] if item_quantity[code]],
+        "customers": [(columns.customers[code], customer_orders[code], customer_spent[code])
+                      for code in top_customers[:top] if customer_orders[code]],
+    }
+
+
+def _sums(codes, weights, length):
+    # bincount adds up in float64, which holds every int below 2**53 exactly:
+    # the sums stay exact up to 90 trillion rupees per group
+    return numpy.bincount(codes, weights=weights, minlength=length).astype(numpy.int64).tolist()
+
+
+def _aggregate_numpy(columns, low, high):
+    day = numpy.frombuffer(columns.day, dtype=numpy.dtype(columns.day.typecode))
+    total = numpy.frombuffer(columns.total, dtype=numpy.int64)
+    mask = (numpy.frombuffer(columns.completed, dtype=numpy.int8) != 0) & (day >= low) & (day < high)
+
+    orders = int(mask.sum())
+    revenue = int(total[mask].sum())
+
+    days, day_codes = numpy.unique(day[mask], return_inverse=True)
+    day_orders = numpy.bincount(day_codes, minlength=len(days))
+    by_day = list(zip(days.tolist(), day_orders.tolist(), _sums(day_codes, total[mask], len(days))))
+
+    hour = numpy.frombuffer(columns.hour, dtype=numpy.int8)[mask].astype(numpy.intp)
+    by_hour = list(zip(numpy.bincount(hour, minlength=24).tolist(),
+                       _sums(hour, total[mask], 24)))
+
+    line_order = numpy.frombuffer(columns.line_order, dtype=numpy.dtype(columns.line_order.typecode))
+    line_mask = mask[line_order]
+    line_item = numpy.frombuffer(columns.line_item, dtype=numpy.dtype(columns.line_item.typecode))[line_mask]
+    quantity = numpy.frombuffer(columns.line_quantity, dtype=numpy.dtype(columns.line_quantity.typecode))[line_mask]
+    price = numpy.frombuffer(columns.line_price, dtype=numpy.int64)[line_mask]
+    item_count = len(columns.items)
+    item_quantity = _sums(line_item, quantity, item_count)
+    item_revenue = _sums(line_item, quantity * price, item_count)
+
+    customer = numpy.frombuffer(columns.customer, dtype=numpy.dtype(columns.customer.typecode))[mask]
+    customer_count = len(columns.customers)
+    customer_orders = numpy.bincount(customer, minlength=customer_count).tolist()
+    customer_spent = _sums(customer, total[mask], customer_count)
+
+    return orders, revenue, by_day, by_hour, item_quantity, item_revenue, customer_orders, customer_spent
+
+
+def _aggregate_python(columns, low, high):
+    mask = [completed and low <= day < high for completed, day in zip(columns.completed, columns.day)]
+
+    orders = 0
+    revenue = 0
+    day_totals = {}
+    by_hour = [[0, 0] for _ in range(24)]
+    customer_orders = [0] * len(columns.customers)
+    customer_spent = [0] * len(columns.customers)
+    for counted, day, hour, customer, total in zip(mask, columns.day, columns.hour, columns.customer, columns.total):
+        if not counted:
+            continue
+        orders += 1
+        revenue += total
+        figures = day_totals.get(day)
+        if figures is None:
+            figures = day_totals[day] = [0, 0]
+        figures[0] += 1
+        figures[1] += total
+        by_hour[hour][0] += 1
+        by_hour[hour][1] += total
+        customer_orders[customer] += 1
+        customer_spent[customer] += total
+
+    item_quantity = [0] * len(columns.items)
+    item_revenue = [0] * len(columns.items)
+    for order, item, quantity, price in zip(columns.line_order, columns.line_item,
+                                            columns.line_quantity, columns.line_price):
+        if mask[order]:
+            item_quantity[item] += quantity
+            item_revenue[item] += quantity * price
+
+    by_day = [(day, count, amount) for day, (count, amount) in sorted(day_totals.items())]
+    return orders, revenue, by_day, by_hour, item_quantity, item_revenue, customer_orders, customer_spent
@@ -0,0 +1,232 @@
+"""Sales totals kept up to date as orders are saved.
+
+Three summary tables hold the completed sales per hour, per day and per item
+per day (orders, units sold, revenue), so dashboard figures and end-of-day
+totals are a lookup instead of a scan of the order history. They live in
+SQLite: inside ``cafe.db`` for the SQLite backend, in ``cafe_rollups.db``
+next to the text files otherwise.
+
+The tables remember how far into the orders they have counted (a byte
+offset in the text log, a row id in SQLite) in the same transaction as the
+totals, so catching up after a crash or after orders saved by an older
+version never counts an order twice. Revenue is in paisa (see ``money``); totals kept
+in rupees by an older version are dropped and counted again.
+
+    python rollups.py check      compare the totals with a full scan
+    python rollups.py rebuild    recount everything from the order history
+"""
+
+import argparse
+import sqlite3
+import sys
+
+import money
+
+COMPLETED = "Completed"
+ROLLUP_DATABASE = "cafe_rollups.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollup_state (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rollup_hourly (
+    hour TEXT PRIMARY KEY,
+    orders INTEGER NOT NULL,
+    quantity INTEGER NOT NULL,
+    revenue INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rollup_daily (
+    day TEXT PRIMARY KEY,
+    orders INTEGER NOT NULL,
+    quantity INTEGER NOT NULL,
+    revenue INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rollup_items (
+    day TEXT NOT NULL,
+    name TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    revenue INTEGER NOT NULL,
+    PRIMARY KEY (day, name)
+);
+"""
+
+
+def open_database(path=ROLLUP_DATABASE):
+    """Open the rollup database used with the text files"""
+    connection = sqlite3.connect(path, isolation_level=None, timeout=30)
+    connection.execute("PRAGMA journal_mode=WAL")
+    # The totals can always be recounted from the log, no need to sync every sale twice
+    connection.execute("PRAGMA synchronous=NORMAL")
+    create_tables(connection)
+    return connection
+
+
+def create_tables(connection):
+    if money.stored_as_real(connection, "rollup_daily", "revenue"):
+        # Rupee totals of an older version, the position goes too so they are counted again
+        connection.executescript("DROP TABLE rollup_hourly; DROP TABLE rollup_daily; "
+                                 "DROP TABLE rollup_items; DROP TABLE rollup_state;")
+    connection.executescript(SCHEMA)
+
+
+def position(connection):
+    """How far into the orders the totals go"""
+    row = connection.execute("SELECT value FROM rollup_state WHERE key = 'position'").fetchone()
+    return row[0] if row else 0
+
+
+def aggregate(orders):
+    """Totals of the completed orders as {table: {key: [orders, quantity, revenue]}}"""
+    hourly = {}
+    daily = {}
+    items = {}
+    for order in orders:
+        if order["status"] != COMPLETED:
+            continue
+        timestamp = order["timestamp"]
+        quantity = sum(item["quantity"] for item in order["items"])
+        for totals, key in ((hourly, timestamp[:13]), (daily, timestamp[:10])):
+            figures = totals.get(key)
+            if figures is None:
+                figures = totals[key] = [0, 0, 0]
+            figures[0] += 1
+            figures[1] += quantity
+            figures[2] += order["total"]
+        for item in order["items"]:
+            key = (timestamp[:10], item["name"])
+            figures = items.get(key)
+            if figures is None:
+                figures = items[key] = [0, 0, 0]
+            figures[1] += item["quantity"]
+            figures[2] += item["quantity"] * item["price"]
+    return {"hourly": hourly, "daily": daily, "items": items}
+
+
+def add_orders(connection, orders):
+    """Count new orders into the totals, call inside a transaction with ``set_position``"""
+    totals = aggregate(orders)
+    connection.executemany(
+        "INSERT INTO rollup_hourly (hour, orders, quantity, revenue) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT (hour) DO UPDATE SET orders = orders + excluded.orders, "
+        "quantity = quantity + excluded.quantity, revenue = revenue + excluded.revenue",
+        [(key, *figures) for key, figures in totals["hourly"].items()])
+    connection.executemany(
+        "INSERT INTO rollup_daily (day, orders, quantity, revenue) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT (day) DO UPDATE SET orders = orders + excluded.orders, "
+        "quantity = quantity + excluded.quantity, revenue = revenue + excluded.revenue",
+        [(key, *figures) for key, figures in totals["daily"].items()])
+    connection.executemany(
+        "INSERT INTO rollup_items (day, name, quantity, revenue) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT (day, name) DO UPDATE SET "
+        "quantity = quantity + excluded.quantity, revenue = revenue + excluded.revenue",
+        [(day, name, quantity, revenue) for (day, name), (_, quantity, revenue) in totals["items"].items()])
+
+
+def set_position(connection, new_position):
+    connection.execute("INSERT INTO rollup_state (key, value) VALUES ('position', ?) "
+                       "ON CONFLICT (key) DO UPDATE SET value = excluded.value", (new_position,))
+
+
+def clear(connection):
+    """Drop every total, call inside a transaction"""
+    for table in ("rollup_hourly", "rollup_daily", "rollup_items", "rollup_state"):
+        connection.execute(f"DELETE FROM {table}")
+
+
+# Reading the totals
+
+def _day_text(value):
+    # Accepts a date, a datetime or a "YYYY-MM-DD..." string
+    if hasattr(value, "strftime"):
+        return value.strftime("%Y-%m-%d")
+    return value[:10]
+
+
+def _range(column, since, until):
+    conditions = []
+    params = []
+    if since is not None:
+        conditions.append(f"{column} >= ?")
+        params.append(_day_text(since))
+    if until is not None:
+        conditions.append(f"{column} < ?")
+        params.append(_day_text(until))
+    return ("WHERE " + " AND ".join(conditions)) if conditions else "", params
+
+
+def daily_totals(connection, since=None, until=None):
+    """[(day, orders, quantity, revenue)] for the days in the range, oldest first"""
+    where, params = _range("day", since, until)
+    return connection.execute(
+        f"SELECT day, orders, quantity, revenue FROM rollup_daily {where} ORDER BY day", params).fetchall()
+
+
+def hourly_totals(connection, day):
+    """[(hour, orders, quantity, revenue)] for one day"""
+    day = _day_text(day)
+    return [(int(hour[11:13]), orders, quantity, revenue) for hour, orders, quantity, revenue in connection.execute(
+        "SELECT hour, orders, quantity, revenue FROM rollup_hourly WHERE hour >= ? AND hour < ? ORDER BY hour",
+        (day, day + "~"))]
+
+
+def item_totals(connection, since=None, until=None):
+    """[(name, quantity, revenue)] for the days in the range, best sellers first"""
+    where, params = _range("day", since, until)
+    return connection.execute(
+        f"SELECT name, SUM(quantity), SUM(revenue) FROM rollup_items {where} "
+        "GROUP BY name ORDER BY SUM(quantity) DESC, name", params).fetchall()
+
+
+# Rebuild and check
+
+def compare(connection, orders):
+    """Differences between the stored totals and the totals of ``orders``"""
+    expected = aggregate(orders)
+    stored = {
+        "hourly": {row[0]: list(row[1:]) for row in connection.execute(
+            "SELECT hour, orders, quantity, revenue FROM rollup_hourly")},
+        "daily": {row[0]: list(row[1:]) for row in connection.execute(
+            "SELECT day, orders, quantity, revenue FROM rollup_daily")},
+        "items": {(row[0], row[1]): [0, row[2], row[3]] for row in connection.execute(
+            "SELECT day, name, quantity, revenue FROM rollup_items")},
+    }
+    problems = []
+    for table in ("hourly", "daily", "items"):
+        for key in sorted(set(expected[table]) | set(stored[table]), key=str):
+            want = expected[table].get(key, [0, 0, 0])
+            have = stored[table].get(key, [0, 0, 0])
+            if want != have:
+                problems.append(f"{table} {key}: expected {want}, found {have}")
+    return problems
+
+
+def main(argv=None):
+    import storage
+
+    parser = argparse.ArgumentParser(description="Cafe sales rollups")
+    parser.add_argument("command", choices=["check", "rebuild"])
+    parser.add_argument("--storage", choices=["text", "sqlite"], help="storage backend (default: as the app)")
+    args = parser.parse_args(argv)
+
+    store = storage.open_storage(args.storage)
+    try:
+        if args.command == "rebuild":
+            store.rebuild_rollups()
+            print(f"Rebuilt the rollups from {store.order_count()} orders")
+            return 0
+
+        problems = store.check_rollups()
+        for problem in problems[:50]:
+            print(problem)
+        if problems:
+            print(f"{len(problems)} totals differ from the order history, run 'python rollups.py rebuild'")
+            return 1
+        print("Rollups match the order history")
+        return 0
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,244 @@
+"""Inverted index for searching the order history.
+
+Every order is filed under the words of its customer's name and of its item
+names (``search_terms``), and a summary of it is kept next to them
+(``search_orders``), so a search is a few index range lookups instead of a
+scan of the history. The index is updated as orders are saved and remembers
+how far into the orders it goes, like the rollups (see ``rollups``). It
+lives inside ``cafe.db`` for the SQLite backend, where ``search_orders`` is a
+view of the orders table, and in ``cafe_search.db`` next to the text files.
+
+A query is a list of words, all of which must match:
+
+    ali cake            customer or item words starting with "ali" and "cake"
+    customer:ali        only the customer's name (also c:)
+    item:cake           only item names (also i:)
+    status:comp         orders whose status starts with "comp"
+    2024-01-31          orders of a day, 2024-01 for a month (also date:)
+
+    python search_index.py find "ali cake"    search from the command line
+    python search_index.py rebuild            index everything again
+"""
+
+import argparse
+import re
+import sqlite3
+import sys
+
+import money
+
+SEARCH_DATABASE = "cafe_search.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_state (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS search_terms (
+    term TEXT NOT NULL,
+    ref INTEGER NOT NULL,
+    PRIMARY KEY (term, ref)
+) WITHOUT ROWID;
+"""
+
+# ref: where the order starts in the text log
+ORDERS_TABLE = """
+CREATE TABLE IF NOT EXISTS search_orders (
+    ref INTEGER PRIMARY KEY,
+    order_id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    customer TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    status TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS search_orders_timestamp ON search_orders (timestamp);
+"""
+
+# ref: the order's row id
+ORDERS_VIEW = """
+CREATE VIEW IF NOT EXISTS search_orders AS
+    SELECT id AS ref, order_id, timestamp, customer, total, status FROM orders;
+"""
+
+# Columns behind the history window's sorts, refs grow with time
+SORT_COLUMNS = {"time": "o.ref", "customer": "o.customer COLLATE NOCASE", "total": "o.total"}
+
+# Query field names and the terms they look at
+FIELDS = {"customer": ["c:"], "c": ["c:"], "item": ["i:"], "i": ["i:"]}
+
+# Above every character, closes a prefix range
+_HIGHEST = "\U0010ffff"
+_WORD = re.compile(r"\w+")
+_DATE = re.compile(r"^\d{4}(-\d{2}(-\d{2})?)?$")
+
+
+def open_database(path=SEARCH_DATABASE):
+    """Open the search database used with the text files"""
+    connection = sqlite3.connect(path, isolation_level=None, timeout=30)
+    connection.execute("PRAGMA journal_mode=WAL")
+    # The index can always be rebuilt from the log
+    connection.execute("PRAGMA synchronous=NORMAL")
+    create_tables(connection, orders_table=True)
+    return connection
+
+
+def create_tables(connection, orders_table=False):
+    """Create the index, with its own summary table or (SQLite backend) a view of ``orders``"""
+    if orders_table and money.stored_as_real(connection, "search_orders", "total"):
+        # Rupee totals of an older version, index everything again
+        connection.executescript("DROP TABLE search_orders; DROP TABLE search_terms; DROP TABLE search_state;")
+    connection.executescript(SCHEMA + (ORDERS_TABLE if orders_table else ORDERS_VIEW))
+
+
+def words(text):
+    """Lower case words of a name, as they are indexed"""
+    return _WORD.findall(text.lower())
+
+
+def order_terms(order):
+    """Every term an order is filed under"""
+    terms = {"c:" + word for word in words(order["customer"])}
+    for item in order["items"]:
+        terms.update("i:" + word for word in words(item["name"]))
+    return terms
+
+
+def position(connection):
+    """How far into the orders the index goes"""
+    row = connection.execute("SELECT value FROM search_state WHERE key = 'position'").fetchone()
+    return row[0] if row else 0
+
+
+def add_orders(connection, orders, with_summaries=False):
+    """Index ``(ref, order)`` pairs, call inside a transaction with ``set_position``
+
+    ``with_summaries`` also stores each order's summary, for the text backend.
+    """
+    postings = []
+    summaries = []
+    for ref, order in orders:
+        postings.extend((term, ref) for term in order_terms(order))
+        if with_summaries:
+            summaries.append((ref, order["id"], order["timestamp"], order["customer"], order["total"],
+                              order["status"]))
+    connection.executemany("INSERT OR IGNORE INTO search_terms (term, ref) VALUES (?, ?)", postings)
+    if with_summaries:
+        connection.executemany(
+            "INSERT OR REPLACE INTO search_orders (ref, order_id, timestamp, customer, total, status) "
+            "VALUES (?, ?, ?, ?, ?, ?)", summaries)
+
+
+def set_position(connection, new_position):
+    connection.execute("INSERT INTO search_state (key, value) VALUES ('position', ?) "
+                       "ON CONFLICT (key) DO UPDATE SET value = excluded.value", (new_position,))
+
+
+def clear(connection, with_summaries=False):
+    """Drop the whole index, call inside a transaction"""
+    tables = ["search_terms", "search_state"] + (["search_orders"] if with_summaries else [])
+    for table in tables:
+        connection.execute(f"DELETE FROM {table}")
+
+
+# Searching
+
+def parse_query(query):
+    """Turn a query into (term prefix groups, SQL conditions, parameters)
+
+    Each group is a list of term prefixes, one of which must match.
+    """
+    groups = []
+    conditions = []
+    params = []
+    for part in query.split():
+        field, _, value = part.rpartition(":")
+        field = field.lower()
+        if field in ("date", "") and _DATE.match(value):
+            conditions.append("o.timestamp >= ? AND o.timestamp < ?")
+            params += [value, value + _HIGHEST]
+        elif field == "status":
+            conditions.append("o.status LIKE ? ESCAPE '\\'")
+            params.append(value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+        else:
+            kinds = FIELDS.get(field)
+            if kinds is None:
+                kinds, value = ["c:", "i:"], part
+            for word in words(value):
+                groups.append([kind + word for kind in kinds])
+    return groups, conditions, params
+
+
+def search(connection, query, offset=0, limit=100, since=None, until=None, customer=None, status=None,
+           sort="time", descending=True):
+    """One page of order summaries matching a query and the history filters
+
+    ``since`` and ``until`` are "YYYY-MM-DD[ HH:MM:SS]" strings.
+    """
+    if sort not in SORT_COLUMNS:
+        raise ValueError(f"Unknown sort: {sort}")
+    groups, conditions, params = parse_query(query)
+
+    # The orders holding a term of every group
+    where = []
+    query_params = []
+    if groups:
+        term_sets = []
+        for group in groups:
+            term_sets.append("SELECT ref FROM search_terms WHERE "
+                             + " OR ".join(["(term >= ? AND term < ?)"] * len(group)))
+            for prefix in group:
+                query_params += [prefix, prefix + _HIGHEST]
+        where.append(f"o.ref IN ({' INTERSECT '.join(term_sets)})")
+    where += conditions
+    query_params += params
+
+    for condition, value in (("o.timestamp >= ?", since), ("o.timestamp < ?", until)):
+        if value is not None:
+            where.append(condition)
+            query_params.append(value)
+    if customer is not None:
+        where.append("o.customer = ? COLLATE NOCASE")
+        query_params.append(customer.strip())
+    if status is not None:
+        where.append("o.status = ?")
+        query_params.append(status)
+
+    direction = "DESC" if descending else "ASC"
+    rows = connection.execute(
+        "SELECT o.order_id, o.timestamp, o.customer, o.total, o.status FROM search_orders o "
+        f"{('WHERE ' + ' AND '.join(where)) if where else ''} "
+        f"ORDER BY {SORT_COLUMNS[sort]} {direction}, o.ref {direction} LIMIT ? OFFSET ?",
+        query_params + [limit, offset])
+    return [{"id": row[0], "timestamp": row[1], "customer": row[2], "total": row[3], "status": row[4]}
+            for row in rows]
+
+
+def main(argv=None):
+    import storage
+
+    options = argparse.ArgumentParser(add_help=False)
+    options.add_argument("--storage", choices=["text", "sqlite"], help="storage backend (default: as the app)")
+    parser = argparse.ArgumentParser(description="Cafe order search")
+    commands = parser.add_subparsers(dest="command", required=True)
+    find = commands.add_parser("find", parents=[options], help="print the newest orders matching a query")
+    find.add_argument("query")
+    find.add_argument("--limit", type=int, default=20)
+    commands.add_parser("rebuild", parents=[options], help="index every order again")
+    args = parser.parse_args(argv)
+
+    store = storage.open_storage(args.storage)
+    try:
+        if args.command == "rebuild":
+            store.rebuild_search()
+            print(f"Indexed {store.order_count()} orders")
+            return 0
+        for order in store.order_page(0, args.limit, search=args.query):
+            print(f"{order['id']}  {order['timestamp']}  {order['customer']:<20} "
+                  f"PKR {money.text(order['total']):>10}  {order['status']}")
+        return 0
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
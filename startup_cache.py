@@ -0,0 +1,139 @@
+"""Snapshot of what the till reads at startup.
+
+Opening the till parses the menu and recipes, replays the inventory
+journal, asks the order index for the next order number and the rollups for
+today's takings.
+``cafe_startup.snapshot`` keeps the results of all that, stamped with the
+size and modification time of every file they came from. At startup the
+stamps are compared with the files (a handful of ``os.stat`` calls) and a
+matching snapshot is used as is; a stale one is ignored, the data is read
+the normal way and a fresh snapshot is written on a background thread. The
+till also writes one when it closes, so the next start is a warm one.
+
+Only the text files are snapshotted. SQLite reads the same data from
+indexed tables in well under a millisecond, and closing its last connection
+rewrites the database files anyway, so a stamp would never match.
+
+The snapshot is only a shortcut: deleting it is always safe.
+"""
+
+import marshal
+import os
+import struct
+import threading
+from datetime import datetime
+
+SNAPSHOT_FILE = "cafe_startup.snapshot"
+
+MAGIC = b"CMSS"
+# 3: prices and totals in paisa
+VERSION = 3
+# magic, version, marshal format version
+HEADER = struct.Struct("<4sII")
+
+
+def enabled(store):
+    return store.name == "text"
+
+
+def source_files(store):
+    """The files a store's startup data is read from"""
+    import inventory_journal
+    import order_archive
+    return [store.menu_file, store.recipes_file, store.inventory_file, inventory_journal.journal_path(store.inventory_file),
+            store.orders_file, order_archive.manifest_path(store.orders_file)]
+
+
+def stamps(store):
+    """[path, size, mtime] of every source file, size and mtime are None when it is missing"""
+    result = []
+    for path in source_files(store):
+        try:
+            st = os.stat(path)
+            result.append([os.path.abspath(path), st.st_size, st.st_mtime_ns])
+        except FileNotFoundError:
+            result.append([os.path.abspath(path), None, None])
+    return result
+
+
+def _today():
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+def build(store):
+    """Read the startup data from a store, stamped with its files as they were before reading
+
+    Returns None for a store that isn't snapshotted.
+    """
+    if not enabled(store):
+        return None
+    snapshot = {"backend": store.name, "stamps": stamps(store)}
+    snapshot["menu"] = store.load_menu()
+    snapshot["recipes"] = store.load_recipes()
+    snapshot["inventory"] = store.load_inventory()
+    snapshot["next_order_seq"] = store.next_order_seq()
+    today = _today()
+    snapshot["today"] = [today, 0, 0]
+    for day, orders, quantity, revenue in store.daily_totals(since=today):
+        if day == today:
+            snapshot["today"] = [day, orders, revenue]
+    return snapshot
+
+
+def save(snapshot, path=SNAPSHOT_FILE):
+    """Write a snapshot atomically"""
+    if snapshot is None:
+        return
+    temp_file = path + ".tmp"
+    with open(temp_file, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, marshal.version))
+        file.write(marshal.dumps(snapshot))
+    os.replace(temp_file, path)
+
+
+def load(store, path=SNAPSHOT_FILE):
+    """The snapshot for a store if it is still current, otherwise None
+
+    ``today`` is left out when the snapshot was taken on another day.
+    """
+    if not enabled(store):
+        return None
+    try:
+        with open(path, "rb") as file:
+            data = file.read()
+        magic, version, marshal_version = HEADER.unpack_from(data)
+        if (magic, version, marshal_version) != (MAGIC, VERSION, marshal.version):
+            return None
+        snapshot = marshal.loads(data[HEADER.size:])
+    except (OSError, struct.error, EOFError, ValueError, TypeError):
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get("backend") != store.name:
+        return None
+    if snapshot.get("stamps") != stamps(store):
+        return None
+    if snapshot["today"][0] != _today():
+        snapshot["today"] = None
+    return snapshot
+
+
+def refresh_in_background(backend, path=SNAPSHOT_FILE):
+    """Write a fresh snapshot from a thread with its own connection to the store"""
+    if backend != "text":
+        return None
+
+    def run():
+        import storage
+
+        store = storage.open_storage(backend)
+        try:
+            save(build(store), path)
+        except Exception:
+            # Next start just reads the files again
+            pass
+        finally:
+            # Folding the inventory journal now would change the files just stamped
+            store.close(compact=False)
+
+    thread = threading.Thread(target=run, name="startup-snapshot", daemon=True)
+    thread.start()
+    return thread
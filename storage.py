@@ -0,0 +1,1172 @@
+"""Storage backends for the menu, inventory and orders.
+
+Two backends share the same methods so the app does not care where its data
+lives:
+
+* ``TextStorage`` keeps the original ``cafe_menu.txt``, ``cafe_inventory.txt``
+  and ``cafe_orders.txt`` files (orders go through ``order_log``), plus
+  ``cafe_recipes.txt``.
+* ``SqliteStorage`` keeps everything in one SQLite database in WAL mode with
+  indexed tables, and commits a sale's stock change and its order together.
+
+The inventory counts ingredients; a sale takes the ingredients of its items'
+recipes (see ``ingredients``). Every stock change is also kept as an event,
+with snapshots of the stock every ``inventory_journal.COMPACT_EVERY`` events,
+so ``stock_at`` can tell the stock at any point in time.
+
+Prices and order totals are ints in paisa (see ``money``): written as
+rupees with two decimals in the text files, as INTEGER columns in SQLite. A
+SQLite database of an older version, which kept REAL rupees, is converted
+when it is opened; ``python storage.py to-paisa`` converts the rest (the
+menu file, columns files, totals) of either backend.
+
+Run ``python storage.py migrate`` once to import the text files into SQLite.
+``python storage.py archive`` rolls the text order log into compressed
+daily segments right away (it otherwise happens with the first sale of
+each day). ``to-columns`` and ``to-text`` convert an orders file to and from
+the binary columns format of ``order_columns``.
+"""
+
+import argparse
+import heapq
+import itertools
+import json
+import os
+import sys
+from datetime import date, datetime
+
+import ingredients
+import inventory_journal
+import money
+import order_log
+from coordinator import FileLock, lock_path
+
+# File names for data storage
+MENU_FILE = "cafe_menu.txt"
+ORDERS_FILE = "cafe_orders.txt"
+INVENTORY_FILE = "cafe_inventory.txt"
+RECIPES_FILE = "cafe_recipes.txt"
+DATABASE_FILE = "cafe.db"
+
+# Data for a brand new cafe, prices in paisa
+DEFAULT_MENU = {"Coffee": 5000, "Tea": 3000, "Sandwich": 12000, "Cake": 8000,
+                "Burger": 15000, "Fries": 6000, "Juice": 7000, "Water": 2000}
+DEFAULT_INVENTORY = {"Coffee": 100, "Tea": 100, "Sandwich": 50, "Cake": 30,
+                     "Burger": 50, "Fries": 80, "Juice": 60, "Water": 100}
+
+
+# How the order history can be sorted, with the key used for each order
+SORT_KEYS = {
+    "time": None,
+    "customer": lambda order: order["customer"].lower(),
+    "total": lambda order: order["total"],
+}
+
+
+class StockError(Exception):
+    """Raised when a sale asks for more stock than is available"""
+
+
+# Work out how much stock an order takes per item
+def order_quantities(order):
+    quantities = {}
+    for item in order["items"]:
+        quantities[item["name"]] = quantities.get(item["name"], 0) + item["quantity"]
+    return quantities
+
+
+# One journal per inventory file, shared by every TextStorage in the process
+_journals = {}
+
+
+def _journal_for(inventory_file):
+    key = os.path.abspath(inventory_file)
+    if key not in _journals:
+        _journals[key] = inventory_journal.InventoryJournal(inventory_file)
+    return _journals[key]
+
+
+class TextStorage:
+    """The original comma separated text files
+
+    Stock changes are appended to an inventory journal (see
+    ``inventory_journal``) rather than rewriting the inventory file.
+    """
+
+    name = "text"
+
+    def __init__(self, menu_file=MENU_FILE, inventory_file=INVENTORY_FILE, orders_file=ORDERS_FILE,
+                 rollup_file=None, search_file=None, recipes_file=RECIPES_FILE, kitchen_file=None):
+        self.menu_file = menu_file
+        self.inventory_file = inventory_file
+        self.orders_file = orders_file
+        self.recipes_file = recipes_file
+        self.recipes = None
+        self.recipes_stamp = None
+        self.rollup_file = rollup_file
+        self.rollup_connection = None
+        self.search_file = search_file
+        self.search_connection = None
+        self.kitchen_file = kitchen_file
+        self.kitchen_connection = None
+
+    def initialize(self):
+        """Create the data files if they don't exist"""
+        if not os.path.exists(self.menu_file):
+            with open(self.menu_file, "w") as file:
+                for item, price in DEFAULT_MENU.items():
+                    file.write(f"{item},{money.text(price)}\n")
+
+        if not os.path.exists(self.orders_file):
+            with open(self.orders_file, "w") as file:
+                file.write("")
+
+        if not os.path.exists(self.inventory_file):
+            with open(self.inventory_file, "w") as file:
+                for item, quantity in DEFAULT_INVENTORY.items():
+                    file.write(f"{item},{quantity}\n")
+
+    def load_menu(self):
+        menu_items = {}
+        with open(self.menu_file, "r") as file:
+            for line in file:
+                line = line.strip()
+                if line:
+                    parts = line.split(",")
+                    if len(parts) >= 2:
+                        menu_items[parts[0].strip()] = money.parse(parts[1])
+        return menu_items
+
+    def load_inventory(self):
+        return _journal_for(self.inventory_file).load()
+
+    def load_recipes(self):
+        """item -> {ingredient: quantity}, from "item,ingredient,quantity" lines"""
+        recipes = {}
+        try:
+            with open(self.recipes_file, "r") as file:
+                for line in file:
+                    parts = line.strip().split(",")
+                    if len(parts) >= 3:
+                        recipes.setdefault(parts[0].strip(), {})[parts[1].strip()] = int(parts[2].strip())
+        except FileNotFoundError:
+            pass
+        return recipes
+
+    def save_recipe(self, item, recipe):
+        """Replace the recipe of an item, an empty one makes it its own stock again"""
+        with FileLock.for_path(lock_path(self.recipes_file)):
+            recipes = self.load_recipes()
+            if recipe:
+                recipes[item] = dict(recipe)
+            else:
+                recipes.pop(item, None)
+            temp_file = self.recipes_file + ".tmp"
+            with open(temp_file, "w") as file:
+                for name, ingredients_used in recipes.items():
+                    for ingredient, quantity in ingredients_used.items():
+                        file.write(f"{name},{ingredient},{quantity}\n")
+            os.replace(temp_file, self.recipes_file)
+
+    def _recipes(self):
+        # Read again only when the file changed, sales look the recipes up every time
+        try:
+            st = os.stat(self.recipes_file)
+            stamp = (st.st_ino, st.st_size, st.st_mtime_ns)
+        except FileNotFoundError:
+            stamp = None
+        if self.recipes is None or stamp != self.recipes_stamp:
+            self.recipes = self.load_recipes()
+            self.recipes_stamp = stamp
+        return self.recipes
+
+    def save_inventory(self, inventory):
+        _journal_for(self.inventory_file).replace(inventory)
+
+    def add_menu_item(self, name, price, stock):
+        with FileLock.for_path(lock_path(self.menu_file)):
+            menu_items = self.load_menu()
+            if name in menu_items:
+                # Saving an item that is already there changes its price
+                # rather than adding a second line for it
+                menu_items[name] = price
+                self._write_menu(menu_items)
+            else:
+                with open(self.menu_file, "a") as file:
+                    file.write(f"{name},{money.text(price)}\n")
+        _journal_for(self.inventory_file).record_add(name, stock)
+
+    def import_items(self, prices, new_stock, restocks):
+        """Apply a bulk import (see ``bulk_import``) with one write per file
+
+        The menu file is rewritten once with the new prices; the starting
+        stock of new items and the restocks go to the inventory journal as
+        one append.
+        """
+        if prices:
+            with FileLock.for_path(lock_path(self.menu_file)):
+                menu_items = self.load_menu()
+                menu_items.update(prices)
+                self._write_menu(menu_items)
+        records = ([(inventory_journal.ADD, name, quantity) for name, quantity in new_stock.items()]
+                   + [(inventory_journal.RESTOCK, name, quantity) for name, quantity in restocks.items()])
+        _journal_for(self.inventory_file).append(records)
+
+    def _write_menu(self, menu_items):
+        # Call with the menu lock held
+        temp_file = self.menu_file + ".tmp"
+        with open(temp_file, "w") as file:
+            file.write("".join(f"{item},{money.text(price)}\n" for item, price in menu_items.items()))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_file, self.menu_file)
+
+    def restock(self, name, quantity):
+        _journal_for(self.inventory_file).record_restock(name, quantity)
+
+    def adjust_stock(self, name, quantity, reason=""):
+        _journal_for(self.inventory_file).record_adjust(name, quantity, reason)
+
+    def stock_at(self, when):
+        return _journal_for(self.inventory_file).stock_at(when)
+
+    def iter_stock_events(self, since=None, until=None, name=None):
+        """(time, kind, name, quantity, ref) of every stock change, oldest first"""
+        return _journal_for(self.inventory_file).iter_events(since, until, name)
+
+    def append_order(self, order):
+        line = order_log.format_order_line(order["id"], order["timestamp"], order["customer"],
+                                           order["items"], order["total"], order["status"])
+        order_log.append_order(self.orders_file, line)
+        self._update_rollups()
+        self._update_search()
+
+    def commit_order(self, order):
+        """Save a sale: its stock change and the order itself"""
+        error = self.commit_orders([order])[0]
+        if error is not None:
+            raise error
+
+    def commit_orders(self, orders):
+        """Save a batch of sales with one sync per file
+
+        The stock of the whole batch is checked against the inventory on
+        disk and recorded in the inventory journal first, under the journal
+        lock so other stations can't sell the same units; a failure there
+        leaves no order behind. If the orders then can't be appended, their
+        stock is given back in the journal before the error is raised.
+        Returns one entry per sale, None when it was saved or the StockError
+        that stopped it.
+        """
+        recipes = self._recipes()
+        usage = [ingredients.order_usage(recipes, order) for order in orders]
+        journal = _journal_for(self.inventory_file)
+        problems = journal.record_sales(usage, origins=[(order["timestamp"], order["id"]) for order in orders])
+
+        lines = [order_log.format_order_line(order["id"], order["timestamp"], order["customer"],
+                                             order["items"], order["total"], order["status"])
+                 for order, problem in zip(orders, problems) if problem is None]
+        if lines:
+            try:
+                order_log.append_orders(self.orders_file, lines, sync=True)
+            except Exception:
+                now = inventory_journal.time_text()
+                journal.append([(inventory_journal.ADJUST, item, quantity, now, f"{order['id']} not saved")
+                                for order, used, problem in zip(orders, usage, problems) if problem is None
+                                for item, quantity in used.items()])
+                raise
+            # The orders are saved now, anything after this must not report them as failed
+            self._update_rollups()
+            self._update_search()
+        return [None if problem is None else StockError(problem) for problem in problems]
+
+    def iter_orders(self, since=None, until=None, customer=None, status=None):
+        return order_log.iter_orders(self.orders_file, since=since, until=until,
+                                     customer=customer, status=status)
+
+    def order_page(self, offset=0, limit=100, since=None, until=None, customer=None, status=None,
+                   sort="time", descending=True, search=None):
+        """One page of order summaries (no items), for the history window
+
+        Pages by time come straight from the index. Other sorts read the
+        summaries of every matching order but only keep the ones up to the
+        end of the page. A ``search`` query goes to the search index (see
+        ``search_index``).
+        """
+        import search_index
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Unknown sort: {sort}")
+        if search and search.strip():
+            return search_index.search(self._search(), search, offset, limit, _timestamp_text(since),
+                                       _timestamp_text(until), customer, status, sort, descending)
+        if sort == "time":
+            summaries = order_log.iter_order_summaries(self.orders_file, since, until, customer, status,
+                                                       newest_first=descending, skip=offset)
+            return list(itertools.islice(summaries, limit))
+        summaries = order_log.iter_order_summaries(self.orders_file, since, until, customer, status)
+        sort_key = SORT_KEYS[sort]
+        pick = heapq.nlargest if descending else heapq.nsmallest
+        # Ties go by order number, the same way round as the sort
+        return pick(offset + limit, summaries,
+                    key=lambda order: (sort_key(order), order_log.order_seq(order["id"])))[offset:]
+
+    def read_order(self, order_id):
+        return order_log.read_order(self.orders_file, order_id)
+
+    def next_order_seq(self):
+        return order_log.next_order_seq(self.orders_file)
+
+    def order_count(self):
+        return order_log.order_count(self.orders_file)
+
+    def stock_version(self):
+        """Changes whenever any station changes the stock"""
+        return inventory_journal.journal_stamp(inventory_journal.journal_path(self.inventory_file))
+
+    def _rollups(self):
+        """The rollup database, caught up with the order log"""
+        import rollups
+        if self.rollup_connection is None:
+            self.rollup_connection = rollups.open_database(self.rollup_file or rollups.ROLLUP_DATABASE)
+        connection = self.rollup_connection
+        size = order_log.log_size(self.orders_file)
+        if rollups.position(connection) == size:
+            return connection
+
+        with _Transaction(connection):
+            start = rollups.position(connection)
+            if size < start:
+                # The log was replaced, count it again
+                rollups.clear(connection)
+                start = 0
+            end = [start]
+
+            def new_orders():
+                for order, offset in order_log.iter_lines_from(self.orders_file, start):
+                    end[0] = offset
+                    if order is not None:
+                        yield order
+            rollups.add_orders(connection, new_orders())
+            rollups.set_position(connection, end[0])
+        return connection
+
+    def _update_rollups(self):
+        # The order is already saved, the totals can catch up on the next read
+        try:
+            self._rollups()
+        except Exception:
+            pass
+
+    def daily_totals(self, since=None, until=None):
+        import rollups
+        return rollups.daily_totals(self._rollups(), since, until)
+
+    def hourly_totals(self, day):
+        import rollups
+        return rollups.hourly_totals(self._rollups(), day)
+
+    def item_totals(self, since=None, until=None):
+        import rollups
+        return rollups.item_totals(self._rollups(), since, until)
+
+    def rebuild_rollups(self):
+        import rollups
+        connection = self._rollups()
+        with _Transaction(connection):
+            rollups.clear(connection)
+        return self._rollups()
+
+    def check_rollups(self):
+        import rollups
+        return rollups.compare(self._rollups(), self.iter_orders())
+
+    def _search(self):
+        """The search database, caught up with the order log"""
+        import search_index
+        if self.search_connection is None:
+            self.search_connection = search_index.open_database(self.search_file or search_index.SEARCH_DATABASE)
+        connection = self.search_connection
+        size = order_log.log_size(self.orders_file)
+        if search_index.position(connection) == size:
+            return connection
+
+        with _Transaction(connection):
+            start = search_index.position(connection)
+            if size < start:
+                # The log was replaced, index it again
+                search_index.clear(connection, with_summaries=True)
+                start = 0
+            end = [start]
+
+            # An order is known by the offset its line starts at
+            def new_orders():
+                for order, offset in order_log.iter_lines_from(self.orders_file, start):
+                    if order is not None:
+                        yield end[0], order
+                    end[0] = offset
+            search_index.add_orders(connection, new_orders(), with_summaries=True)
+            search_index.set_position(connection, end[0])
+        return connection
+
+    def _update_search(self):
+        # Like the totals, the index can catch up on the next search
+        try:
+            self._search()
+        except Exception:
+            pass
+
+    def rebuild_search(self):
+        import search_index
+        connection = self._search()
+        with _Transaction(connection):
+            search_index.clear(connection, with_summaries=True)
+        return self._search()
+
+    def kitchen(self, routes=None):
+        """The kitchen queue, caught up with the order log"""
+        import kitchen
+        if self.kitchen_connection is None:
+            self.kitchen_connection = kitchen.open_database(self.kitchen_file or kitchen.KITCHEN_DATABASE)
+        connection = self.kitchen_connection
+        size = order_log.log_size(self.orders_file)
+        if kitchen.position(connection) == size:
+            return connection
+
+        with _Transaction(connection):
+            start = kitchen.position(connection)
+            if start is None or size < start:
+                # Orders from before the queue (or a replaced log) are not made again
+                kitchen.set_position(connection, size)
+                return connection
+            end = [start]
+
+            def new_orders():
+                for order, offset in order_log.iter_lines_from(self.orders_file, start):
+                    end[0] = offset
+                    if order is not None:
+                        yield order
+            kitchen.add_orders(connection, new_orders(), kitchen.load_routes() if routes is None else routes)
+            kitchen.set_position(connection, end[0])
+        return connection
+
+    def close(self, compact=True):
+        # Fold the journal into the inventory file on shutdown
+        journal = _journals.get(os.path.abspath(self.inventory_file))
+        if journal is not None and compact:
+            journal.compact()
+        if self.rollup_connection is not None:
+            self.rollup_connection.close()
+            self.rollup_connection = None
+        if self.search_connection is not None:
+            self.search_connection.close()
+            self.search_connection = None
+        if self.kitchen_connection is not None:
+            self.kitchen_connection.close()
+            self.kitchen_connection = None
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS menu (
+    name TEXT PRIMARY KEY,
+    price INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS inventory (
+    name TEXT PRIMARY KEY,
+    quantity INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stock_events (
+    id INTEGER PRIMARY KEY,
+    time TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    ref TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS stock_events_time ON stock_events (time);
+-- stock (JSON) after every event up to event_id; time is '' for the first one
+CREATE TABLE IF NOT EXISTS stock_snapshots (
+    event_id INTEGER PRIMARY KEY,
+    time TEXT NOT NULL,
+    stock TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS stock_snapshots_time ON stock_snapshots (time);
+CREATE TABLE IF NOT EXISTS recipes (
+    item TEXT NOT NULL,
+    ingredient TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    PRIMARY KEY (item, ingredient)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS orders (
+    id INTEGER PRIMARY KEY,
+    seq INTEGER NOT NULL,
+    order_id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    customer TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    status TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS orders_seq ON orders (seq);
+CREATE INDEX IF NOT EXISTS orders_order_id ON orders (order_id);
+CREATE INDEX IF NOT EXISTS orders_timestamp ON orders (timestamp);
+CREATE INDEX IF NOT EXISTS orders_customer ON orders (customer COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS orders_status ON orders (status);
+CREATE INDEX IF NOT EXISTS orders_total ON orders (total);
+CREATE TABLE IF NOT EXISTS order_items (
+    order_ref INTEGER NOT NULL REFERENCES orders (id),
+    line INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    price INTEGER NOT NULL,
+    PRIMARY KEY (order_ref, line)
+);
+CREATE INDEX IF NOT EXISTS order_items_name ON order_items (name);
+"""
+
+
+# Timestamps are stored as "YYYY-MM-DD HH:MM:SS" text, which sorts by time
+def _timestamp_text(value):
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(value, date):
+        return value.strftime("%Y-%m-%d")
+    return value
+
+
+# Columns behind SORT_KEYS; orders are stored in time order, so "time" is the row id
+SORT_COLUMNS = {"time": "o.id", "customer": "o.customer COLLATE NOCASE", "total": "o.total"}
+
+
+# WHERE clause for the order filters shared by the queries
+def _order_filters(since, until, customer, status):
+    conditions = []
+    params = []
+    if since is not None:
+        conditions.append("o.timestamp >= ?")
+        params.append(_timestamp_text(since))
+    if until is not None:
+        conditions.append("o.timestamp < ?")
+        params.append(_timestamp_text(until))
+    if customer is not None:
+        conditions.append("o.customer = ? COLLATE NOCASE")
+        params.append(customer.strip())
+    if status is not None:
+        conditions.append("o.status = ?")
+        params.append(status)
+    where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+    return where, params
+
+
+class SqliteStorage:
+    """Menu, inventory and orders in a single SQLite database (WAL mode)"""
+
+    name = "sqlite"
+
+    def __init__(self, database_file=DATABASE_FILE):
+        import kitchen
+        import rollups
+        import search_index
+        import sqlite3
+        self.database_file = database_file
+        # isolation_level=None: transactions are opened explicitly with BEGIN
+        self.connection = sqlite3.connect(database_file, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        # A confirmed order must survive a power cut, so keep full syncs
+        self.connection.execute("PRAGMA synchronous=FULL")
+        self.connection.execute("PRAGMA foreign_keys=ON")
+        self.connection.executescript(SCHEMA)
+        self._convert_money()
+        rollups.create_tables(self.connection)
+        search_index.create_tables(self.connection)
+        kitchen.create_tables(self.connection)
+
+    def _convert_money(self):
+        # An older version kept rupees in REAL columns, where SQLite would turn paisa into floats
+        if not money.stored_as_real(self.connection, "orders", "total"):
+            return
+        tables = ("menu", "orders", "order_items")
+        self.connection.execute("PRAGMA foreign_keys=OFF")
+        try:
+            with self.transaction():
+                # Renaming a table checks the views, the search view is made again afterwards
+                self.connection.execute("DROP VIEW IF EXISTS search_orders")
+                for table in tables:
+                    self.connection.execute(f"ALTER TABLE {table} RENAME TO {table}_rupees")
+                self._create_schema()
+                self.connection.execute(
+                    "INSERT INTO menu (rowid, name, price) "
+                    "SELECT rowid, name, CAST(ROUND(price * 100) AS INTEGER) FROM menu_rupees")
+                self.connection.execute(
+                    "INSERT INTO orders (id, seq, order_id, timestamp, customer, total, status) "
+                    "SELECT id, seq, order_id, timestamp, customer, CAST(ROUND(total * 100) AS INTEGER), status "
+                    "FROM orders_rupees")
+                self.connection.execute(
+                    "INSERT INTO order_items (order_ref, line, name, quantity, price) "
+                    "SELECT order_ref, line, name, quantity, CAST(ROUND(price * 100) AS INTEGER) "
+                    "FROM order_items_rupees")
+                for table in reversed(tables):
+                    self.connection.execute(f"DROP TABLE {table}_rupees")
+                # Again for the indexes, their names were still taken the first time
+                self._create_schema()
+        finally:
+            self.connection.execute("PRAGMA foreign_keys=ON")
+
+    def _create_schema(self):
+        # executescript would commit the open transaction, so one statement at a time
+        import sqlite3
+        statement = ""
+        for line in SCHEMA.splitlines(keepends=True):
+            statement += line
+            if sqlite3.complete_statement(statement):
+                self.connection.execute(statement)
+                statement = ""
+
+    def initialize(self):
+        """Seed a brand new database with the default menu"""
+        if self.connection.execute("SELECT 1 FROM menu LIMIT 1").fetchone() is None:
+            with self.transaction():
+                self._start_stock_history()
+                self.connection.executemany("INSERT INTO menu (name, price) VALUES (?, ?)",
+                                            DEFAULT_MENU.items())
+                self.connection.executemany("INSERT INTO inventory (name, quantity) VALUES (?, ?)",
+                                            DEFAULT_INVENTORY.items())
+                self._record_stock([(inventory_journal.ADD, name, quantity, "")
+                                    for name, quantity in DEFAULT_INVENTORY.items()])
+        elif self.connection.execute("SELECT 1 FROM stock_snapshots LIMIT 1").fetchone() is None:
+            # A database from before stock events: its history starts now
+            with self.transaction():
+                self._start_stock_history()
+
+    def transaction(self):
+        return _Transaction(self.connection)
+
+    def load_menu(self):
+        return dict(self.connection.execute("SELECT name, price FROM menu ORDER BY rowid"))
+
+    def load_inventory(self):
+        return dict(self.connection.execute("SELECT name, quantity FROM inventory ORDER BY rowid"))
+
+    def load_recipes(self):
+        recipes = {}
+        for item, ingredient, quantity in self.connection.execute(
+                "SELECT item, ingredient, quantity FROM recipes"):
+            recipes.setdefault(item, {})[ingredient] = quantity
+        return recipes
+
+    def save_recipe(self, item, recipe):
+        """Replace the recipe of an item, an empty one makes it its own stock again"""
+        with self.transaction():
+            self.connection.execute("DELETE FROM recipes WHERE item = ?", (item,))
+            self.connection.executemany(
+                "INSERT INTO recipes (item, ingredient, quantity) VALUES (?, ?, ?)",
+                [(item, ingredient, quantity) for ingredient, quantity in recipe.items()])
+
+    def save_inventory(self, inventory, reason="stock take"):
+        with self.transaction():
+            current = self.load_inventory()
+            self._write_inventory(inventory)
+            self._record_stock([(inventory_journal.SET, name, quantity, reason)
+                                for name, quantity in inventory.items() if current.get(name) != quantity])
+
+    def _write_inventory(self, inventory):
+        self.connection.executemany(
+            "INSERT INTO inventory (name, quantity) VALUES (?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET quantity = excluded.quantity",
+            inventory.items())
+
+    def add_menu_item(self, name, price, stock):
+        with self.transaction():
+            self.connection.execute(
+                "INSERT INTO menu (name, price) VALUES (?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET price = excluded.price", (name, price))
+            self._write_inventory({name: stock})
+            self._record_stock([(inventory_journal.ADD, name, stock, "")])
+
+    def import_items(self, prices, new_stock, restocks):
+        """Apply a bulk import (see ``bulk_import``) in one transaction"""
+        with self.transaction():
+            self.connection.executemany(
+                "INSERT INTO menu (name, price) VALUES (?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET price = excluded.price", prices.items())
+            self._write_inventory(new_stock)
+            self.connection.executemany(
+                "INSERT INTO inventory (name, quantity) VALUES (?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET quantity = quantity + excluded.quantity",
+                restocks.items())
+            self._record_stock([(inventory_journal.ADD, name, quantity, "")
+                                for name, quantity in new_stock.items()]
+                               + [(inventory_journal.RESTOCK, name, quantity, "")
+                                  for name, quantity in restocks.items()])
+
+    def restock(self, name, quantity):
+        self._add_stock(inventory_journal.RESTOCK, name, quantity, "")
+
+    def adjust_stock(self, name, quantity, reason=""):
+        """Stock lost or found outside a sale (waste, breakage, a miscount)"""
+        self._add_stock(inventory_journal.ADJUST, name, quantity, reason)
+
+    def _add_stock(self, kind, name, quantity, ref):
+        with self.transaction():
+            self.connection.execute(
+                "INSERT INTO inventory (name, quantity) VALUES (?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET quantity = quantity + excluded.quantity",
+                (name, quantity))
+            self._record_stock([(kind, name, quantity, ref)])
+
+    def _start_stock_history(self):
+        # The stock as it is now is where the events start from
+        self.connection.execute(
+            "INSERT OR IGNORE INTO stock_snapshots (event_id, time, stock) "
+            "VALUES ((SELECT COALESCE(MAX(id), 0) FROM stock_events), '', ?)",
+            (json.dumps(self.load_inventory()),))
+
+    def _record_stock(self, events, time=None):
+        """Add (kind, name, quantity, ref) events, call in the transaction that changed the stock"""
+        if not events:
+            return
+        time = inventory_journal.time_text(time)
+        self.connection.executemany(
+            "INSERT INTO stock_events (time, kind, name, quantity, ref) VALUES (?, ?, ?, ?, ?)",
+            [(time, kind, name, quantity, ref) for kind, name, quantity, ref in events])
+        last_event, last_snapshot = self.connection.execute(
+            "SELECT (SELECT MAX(id) FROM stock_events), "
+            "(SELECT COALESCE(MAX(event_id), 0) FROM stock_snapshots)").fetchone()
+        if last_event - last_snapshot >= inventory_journal.COMPACT_EVERY:
+            # Stamped with its last event, events are recorded in time order
+            self.connection.execute(
+                "INSERT INTO stock_snapshots (event_id, time, stock) "
+                "SELECT ?, MAX(time), ? FROM stock_events WHERE id > ?",
+                (last_event, json.dumps(self.load_inventory()), last_snapshot))
+
+    def stock_at(self, when):
+        """The stock as it was at a point in time (datetime or "YYYY-MM-DD[ HH:MM:SS]")
+
+        Reads the last snapshot taken at or before it and the events after
+        it, up to the next snapshot.
+        """
+        when = inventory_journal.time_text(when)
+        row = self.connection.execute(
+            "SELECT event_id, stock FROM stock_snapshots WHERE time <= ? "
+            "ORDER BY time DESC, event_id DESC LIMIT 1", (when,)).fetchone()
+        event_id, stock = row if row is not None else (0, "{}")
+        inventory = json.loads(stock)
+        events = self.connection.execute(
+            "SELECT kind, name, quantity FROM stock_events WHERE id > ? AND id <= COALESCE("
+            "(SELECT MIN(event_id) FROM stock_snapshots WHERE event_id > ?), "
+            "(SELECT MAX(id) FROM stock_events)) AND time <= ? ORDER BY id",
+            (event_id, event_id, when)).fetchall()
+        for kind, name, quantity in events:
+            inventory_journal.apply_record(inventory, kind, name, quantity)
+        return inventory
+
+    def iter_stock_events(self, since=None, until=None, name=None):
+        """(time, kind, name, quantity, ref) of every stock change, oldest first"""
+        conditions = []
+        params = []
+        for condition, value in (("time >= ?", since), ("time < ?", until), ("name = ?", name)):
+            if value is not None:
+                conditions.append(condition)
+                params.append(inventory_journal.time_text(value) if condition != "name = ?" else value)
+        where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+        return iter(self.connection.execute(
+            f"SELECT time, kind, name, quantity, ref FROM stock_events {where} ORDER BY id", params).fetchall())
+
+    def append_order(self, order):
+        with self.transaction():
+            self._insert_order(order)
+            self._catch_up_rollups()
+            self._catch_up_search()
+
+    def _insert_order(self, order):
+        cursor = self.connection.execute(
+            "INSERT INTO orders (seq, order_id, timestamp, customer, total, status) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (order_log.order_seq(order["id"]), order["id"], order["timestamp"],
+             order["customer"], order["total"], order["status"]))
+        order_ref = cursor.lastrowid
+        self.connection.executemany(
+            "INSERT INTO order_items (order_ref, line, name, quantity, price) VALUES (?, ?, ?, ?, ?)",
+            [(order_ref, line, item["name"], item["quantity"], item["price"])
+             for line, item in enumerate(order["items"])])
+
+    def _order_usage(self, order):
+        # Only the recipes of the items on the order, read in the sale's transaction
+        recipes = {}
+        for name in order_quantities(order):
+            recipe = dict(self.connection.execute(
+                "SELECT ingredient, quantity FROM recipes WHERE item = ?", (name,)))
+            if recipe:
+                recipes[name] = recipe
+        return ingredients.order_usage(recipes, order)
+
+    def _deduct_stock(self, order):
+        used = self._order_usage(order)
+        for name, quantity in used.items():
+            cursor = self.connection.execute(
+                "UPDATE inventory SET quantity = quantity - ? WHERE name = ? AND quantity >= ?",
+                (quantity, name, quantity))
+            if cursor.rowcount != 1:
+                raise StockError(f"Not enough stock for {name}.")
+        self._record_stock([(inventory_journal.SALE, name, quantity, order["id"]) for name, quantity in used.items()],
+                           order["timestamp"])
+
+    def commit_order(self, order):
+        """Deduct the order's stock and save the order in one transaction"""
+        with self.transaction():
+            self._deduct_stock(order)
+            self._insert_order(order)
+            self._catch_up_rollups()
+            self._catch_up_search()
+
+    def commit_orders(self, orders):
+        """Save a batch of sales in one transaction
+
+        Each sale gets its own savepoint, so one that runs out of stock is
+        dropped without failing the others. Returns one entry per sale, None
+        when it was saved or the StockError that stopped it.
+        """
+        results = []
+        with self.transaction():
+            for order in orders:
+                self.connection.execute("SAVEPOINT sale")
+                try:
+                    self._deduct_stock(order)
+                    self._insert_order(order)
+                except StockError as e:
+                    self.connection.execute("ROLLBACK TO sale")
+                    results.append(e)
+                else:
+                    results.append(None)
+                self.connection.execute("RELEASE sale")
+            self._catch_up_rollups()
+            self._catch_up_search()
+        return results
+
+    def iter_orders(self, since=None, until=None, customer=None, status=None):
+        where, params = _order_filters(since, until, customer, status)
+
+        # One streaming query, the items of each order arrive next to each other
+        rows = self.connection.execute(
+            "SELECT o.id, o.order_id, o.timestamp, o.customer, o.total, o.status, "
+            "i.name, i.quantity, i.price "
+            "FROM orders o LEFT JOIN order_items i ON i.order_ref = o.id "
+            f"{where} ORDER BY o.id, i.line", params)
+        for _, group in itertools.groupby(rows, key=lambda row: row[0]):
+            yield _order_from_rows(list(group))
+
+    def order_page(self, offset=0, limit=100, since=None, until=None, customer=None, status=None,
+                   sort="time", descending=True, search=None):
+        """One page of order summaries (no items), for the history window"""
+        import search_index
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"Unknown sort: {sort}")
+        if search and search.strip():
+            return search_index.search(self._search(), search, offset, limit, _timestamp_text(since),
+                                       _timestamp_text(until), customer, status, sort, descending)
+        where, params = _order_filters(since, until, customer, status)
+        direction = "DESC" if descending else "ASC"
+        rows = self.connection.execute(
+            "SELECT o.order_id, o.timestamp, o.customer, o.total, o.status FROM orders o "
+            f"{where} ORDER BY {SORT_COLUMNS[sort]} {direction}, o.id {direction} LIMIT ? OFFSET ?",
+            params + [limit, offset])
+        return [{"id": row[0], "timestamp": row[1], "customer": row[2], "total": row[3], "status": row[4]}
+                for row in rows]
+
+    def read_order(self, order_id):
+        rows = self.connection.execute(
+            "SELECT o.id, o.order_id, o.timestamp, o.customer, o.total, o.status, "
+            "i.name, i.quantity, i.price "
+            "FROM orders o LEFT JOIN order_items i ON i.order_ref = o.id "
+            "WHERE o.id = (SELECT id FROM orders WHERE order_id = ? ORDER BY id DESC LIMIT 1) "
+            "ORDER BY i.line", (order_id,)).fetchall()
+        return _order_from_rows(rows) if rows else None
+
+    def _catch_up_rollups(self):
+        # Count the orders saved since the totals were last updated, call inside a transaction
+        import rollups
+        start = rollups.position(self.connection)
+        last_id = self.connection.execute("SELECT MAX(id) FROM orders").fetchone()[0] or 0
+        if last_id == start:
+            return
+        if last_id < start:
+            rollups.clear(self.connection)
+            start = 0
+        rows = self.connection.execute(
+            "SELECT o.id, o.order_id, o.timestamp, o.customer, o.total, o.status, "
+            "i.name, i.quantity, i.price "
+            "FROM orders o LEFT JOIN order_items i ON i.order_ref = o.id "
+            "WHERE o.id > ? AND o.id <= ? ORDER BY o.id, i.line", (start, last_id))
+        rollups.add_orders(self.connection, (_order_from_rows(list(group))
+                                             for _, group in itertools.groupby(rows, key=lambda row: row[0])))
+        rollups.set_position(self.connection, last_id)
+
+    def _rollups(self):
+        # Totals are updated with every sale, this only catches up a database from before rollups
+        import rollups
+        last_id = self.connection.execute("SELECT MAX(id) FROM orders").fetchone()[0] or 0
+        if rollups.position(self.connection) != last_id:
+            with self.transaction():
+                self._catch_up_rollups()
+        return self.connection
+
+    def daily_totals(self, since=None, until=None):
+        import rollups
+        return rollups.daily_totals(self._rollups(), since, until)
+
+    def hourly_totals(self, day):
+        import rollups
+        return rollups.hourly_totals(self._rollups(), day)
+
+    def item_totals(self, since=None, until=None):
+        import rollups
+        return rollups.item_totals(self._rollups(), since, until)
+
+    def rebuild_rollups(self):
+        import rollups
+        with self.transaction():
+            rollups.clear(self.connection)
+            self._catch_up_rollups()
+        return self.connection
+
+    def check_rollups(self):
+        import rollups
+        return rollups.compare(self._rollups(), self.iter_orders())
+
+    def _catch_up_search(self):
+        # Index the orders saved since the last update, call inside a transaction
+        import search_index
+        start = search_index.position(self.connection)
+        last_id = self.connection.execute("SELECT MAX(id) FROM orders").fetchone()[0] or 0
+        if last_id == start:
+            return
+        if last_id < start:
+            search_index.clear(self.connection)
+            start = 0
+        rows = self.connection.execute(
+            "SELECT o.id, o.order_id, o.timestamp, o.customer, o.total, o.status, "
+            "i.name, i.quantity, i.price "
+            "FROM orders o LEFT JOIN order_items i ON i.order_ref = o.id "
+            "WHERE o.id > ? AND o.id <= ? ORDER BY o.id, i.line", (start, last_id))
+        search_index.add_orders(self.connection, ((order_ref, _order_from_rows(list(group)))
+                                                  for order_ref, group in itertools.groupby(rows, key=lambda row: row[0])))
+        search_index.set_position(self.connection, last_id)
+
+    def _search(self):
+        # The index is updated with every sale, this only catches up a database from before it
+        import search_index
+        last_id = self.connection.execute("SELECT MAX(id) FROM orders").fetchone()[0] or 0
+        if search_index.position(self.connection) != last_id:
+            with self.transaction():
+                self._catch_up_search()
+        return self.connection
+
+    def rebuild_search(self):
+        import search_index
+        with self.transaction():
+            search_index.clear(self.connection)
+            self._catch_up_search()
+        return self.connection
+
+    def kitchen(self, routes=None):
+        """The kitchen queue (in the database itself), caught up with the orders"""
+        import kitchen
+        last_id = self.connection.execute("SELECT MAX(id) FROM orders").fetchone()[0] or 0
+        if kitchen.position(self.connection) == last_id:
+            return self.connection
+
+        with self.transaction():
+            start = kitchen.position(self.connection)
+            if start is None or last_id < start:
+                # Orders from before the queue are not made again
+                kitchen.set_position(self.connection, last_id)
+                return self.connection
+            rows = self.connection.execute(
+                "SELECT o.id, o.order_id, o.timestamp, o.customer, o.total, o.status, "
+                "i.name, i.quantity, i.price "
+                "FROM orders o LEFT JOIN order_items i ON i.order_ref = o.id "
+                "WHERE o.id > ? AND o.id <= ? ORDER BY o.id, i.line", (start, last_id))
+            orders = (_order_from_rows(list(group)) for _, group in itertools.groupby(rows, key=lambda row: row[0]))
+            kitchen.add_orders(self.connection, orders, kitchen.load_routes() if routes is None else routes)
+            kitchen.set_position(self.connection, last_id)
+        return self.connection
+
+    def next_order_seq(self):
+        return (self.connection.execute("SELECT MAX(seq) FROM orders").fetchone()[0] or 0) + 1
+
+    def order_count(self):
+        return self.connection.execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+
+    def stock_version(self):
+        """Changes whenever another connection (station or thread) commits"""
+        return self.connection.execute("PRAGMA data_version").fetchone()[0]
+
+    def close(self, compact=True):
+        # ``compact`` is for the text files' inventory journal
+        self.connection.close()
+
+
+class _Transaction:
+    """Context manager that wraps a block in BEGIN IMMEDIATE / COMMIT"""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute("BEGIN IMMEDIATE")
+        return self.connection
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.connection.execute("COMMIT")
+        else:
+            self.connection.execute("ROLLBACK")
+        return False
+
+
+def _order_from_rows(rows):
+    first = rows[0]
+    items = [{"name": row[6], "quantity": row[7], "price": row[8]} for row in rows if row[6] is not None]
+    return {
+        "id": first[1],
+        "timestamp": first[2],
+        "customer": first[3],
+        "items": items,
+        "total": first[4],
+        "status": first[5]
+    }
+
+
+def open_storage(backend=None):
+    """Open the configured backend
+
+    The backend comes from the argument, then the CAFE_STORAGE environment
+    variable ("text" or "sqlite"); without either, SQLite is used once the
+    database exists (i.e. after ``python storage.py migrate``).
+    """
+    backend = backend or os.environ.get("CAFE_STORAGE")
+    if backend is None:
+        backend = "sqlite" if os.path.exists(DATABASE_FILE) else "text"
+    if backend == "sqlite":
+        return SqliteStorage()
+    if backend == "text":
+        return TextStorage()
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+def migrate_text_to_sqlite(source, target, force=False):
+    """Copy menu, inventory, recipes and orders from a TextStorage into a SqliteStorage"""
+    import rollups
+    import search_index
+    has_data = target.connection.execute(
+        "SELECT EXISTS (SELECT 1 FROM menu) OR EXISTS (SELECT 1 FROM orders)").fetchone()[0]
+    if has_data and not force:
+        raise RuntimeError(f"{target.database_file} already has data, use --force to replace it")
+
+    with target.transaction() as connection:
+        for table in ("order_items", "orders", "recipes", "stock_snapshots", "stock_events", "inventory", "menu"):
+            connection.execute(f"DELETE FROM {table}")
+        connection.executemany("INSERT INTO menu (name, price) VALUES (?, ?)",
+                               source.load_menu().items())
+        target._write_inventory(source.load_inventory())
+        # The stock history starts at the migration
+        target._start_stock_history()
+        connection.executemany("INSERT INTO recipes (item, ingredient, quantity) VALUES (?, ?, ?)",
+                               [(item, ingredient, quantity) for item, recipe in source.load_recipes().items()
+                                for ingredient, quantity in recipe.items()])
+        rollups.clear(connection)
+        search_index.clear(connection)
+        count = 0
+        for order in source.iter_orders():
+            target._insert_order(order)
+            count += 1
+        target._catch_up_rollups()
+        target._catch_up_search()
+    return count
+
+
+def convert_to_paisa(store):
+    """Finish converting the data of a version that kept money in rupees
+
+    Opening a store already converts what can't be used as it was (the
+    SQLite tables, rollup and search tables with rupees). This writes the
+    menu file with two decimal prices, writes the columns files of archived
+    segments again and counts the totals again. Order lines already in the
+    text log are left as they are, they read back as the same paisa.
+    """
+    if store.name == "text":
+        with FileLock.for_path(lock_path(store.menu_file)):
+            store._write_menu(store.load_menu())
+        order_log.add_columns(store.orders_file)
+    store.rebuild_rollups()
+    store.rebuild_search()
+
+
+def main(argv=None):
+    import order_archive
+    parser = argparse.ArgumentParser(description="Cafe storage tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    migrate = commands.add_parser("migrate", help="import the text files into the SQLite database")
+    migrate.add_argument("--menu", default=MENU_FILE)
+    migrate.add_argument("--inventory", default=INVENTORY_FILE)
+    migrate.add_argument("--orders", default=ORDERS_FILE)
+    migrate.add_argument("--recipes", default=RECIPES_FILE)
+    migrate.add_argument("--database", default=DATABASE_FILE)
+    migrate.add_argument("--force", action="store_true", help="replace data already in the database")
+    archive = commands.add_parser("archive", help="move the orders in the text log into compressed daily segments")
+    archive.add_argument("--orders", default=ORDERS_FILE)
+    archive.add_argument("--columns", action="store_true",
+                         help="only write the columns files missing from segments archived earlier")
+    to_columns = commands.add_parser("to-columns", help="convert an orders file into the binary columns format")
+    to_columns.add_argument("source")
+    to_columns.add_argument("target")
+    to_text = commands.add_parser("to-text", help="convert a columns file back into an orders file")
+    to_text.add_argument("source")
+    to_text.add_argument("target")
+    to_paisa = commands.add_parser("to-paisa", help="convert the data of a version that kept money in rupees")
+    to_paisa.add_argument("--storage", choices=["text", "sqlite"], help="storage backend (default: as the app)")
+    args = parser.parse_args(argv)
+
+    if args.command == "to-paisa":
+        store = open_storage(args.storage)
+        try:
+            convert_to_paisa(store)
+        finally:
+            store.close()
+        print("Prices and totals are kept in paisa now")
+        return 0
+
+    if args.command == "archive":
+        if args.columns:
+            print(f"Wrote {order_log.add_columns(args.orders)} columns files "
+                  f"in {order_archive.archive_dir(args.orders)}")
+            return 0
+        segments = order_log.roll_log(args.orders)
+        print(f"Archived {sum(segment['count'] for segment in segments)} orders "
+              f"into {len(segments)} segments in {order_archive.archive_dir(args.orders)}")
+        return 0
+
+    if args.command in ("to-columns", "to-text"):
+        convert = order_log.text_to_columns if args.command == "to-columns" else order_log.columns_to_text
+        try:
+            count = convert(args.source, args.target)
+        except (OSError, ValueError) as e:
+            print(f"Conversion failed: {e}", file=sys.stderr)
+            return 1
+        print(f"Converted {count} orders into {args.target}")
+        return 0
+
+    if args.command == "migrate":
+        source = TextStorage(args.menu, args.inventory, args.orders, recipes_file=args.recipes)
+        target = SqliteStorage(args.database)
+        try:
+            count = migrate_text_to_sqlite(source, target, force=args.force)
+        except (OSError, RuntimeError, ValueError) as e:
+            print(f"Migration failed: {e}", file=sys.stderr)
+            return 1
+        finally:
+            target.close()
+        print(f"Migrated {count} orders into {args.database}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
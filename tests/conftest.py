@@ -0,0 +1,8 @@
+import pytest
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Run the test in an empty directory, the data files are relative to it"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
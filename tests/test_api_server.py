@@ -0,0 +1,58 @@
+import asyncio
+import json
+
+import pytest
+
+import api_server
+import storage
+
+
+def post_order(customer):
+    async def run():
+        store = storage.open_storage("text")
+        store.initialize()
+        api = api_server.OrderApi(store, asyncio.get_running_loop())
+        try:
+            body = json.dumps({"customer": customer, "items": [{"name": "Tea", "quantity": 1}]}).encode()
+            try:
+                return await api.handle("POST", "/orders", {}, body)
+            except api_server.ApiError as e:
+                return e.status, {"error": str(e)}
+        finally:
+            api.close()
+            store.close()
+
+    return asyncio.run(run())
+
+
+def test_order_is_placed(data_dir):
+    status, payload = post_order("Ali")
+    assert status == 201
+    assert payload["order"]["total_paisa"] == 3000
+
+
+@pytest.mark.parametrize("customer", ["Ali, Jr", "Ali; Jr", "Ali: Jr", "Ali\nORD9999", "Ali\r"])
+def test_customer_name_that_would_break_the_log_is_refused(data_dir, customer):
+    status, payload = post_order(customer)
+    assert status == 400
+    assert "can't contain" in payload["error"]
+
+    store = storage.open_storage("text")
+    try:
+        assert list(store.iter_orders()) == []
+        assert store.order_page() == []
+    finally:
+        store.close()
+
+
+@pytest.mark.parametrize("length", ["abc", "-5", "1.5"])
+def test_bad_content_length_is_a_bad_request(length):
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(f"POST /orders HTTP/1.1\r\nContent-Length: {length}\r\n\r\n{{}}".encode())
+        reader.feed_eof()
+        with pytest.raises(api_server.ApiError) as error:
+            await api_server.read_request(reader)
+        return error.value.status
+
+    assert asyncio.run(run()) == 400
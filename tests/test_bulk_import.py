@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+import bulk_import
+from bulk_import import MENU, RESTOCK, plan_import
+
+MENU_ITEMS = {"Tea": 3000, "Cake": 8000}
+INVENTORY = {"Tea": 100, "Cake": 30}
+
+
+def test_price_list_adds_items_and_changes_prices():
+    plan = plan_import([{"name": "Tea", "price": "30"}, {"name": "Cake", "price": "85.50"},
+                        {"name": "Muffin", "price": "60", "stock": "12"}], MENU, MENU_ITEMS, INVENTORY)
+
+    assert plan.problems == []
+    assert plan.prices == {"Cake": 8550, "Muffin": 6000}
+    assert plan.new_items == ["Muffin"]
+    assert plan.new_stock == {"Muffin": 12}
+
+
+def test_restock_sheet_adds_up_repeated_items():
+    plan = plan_import([{"name": "Tea", "stock": "5"}, {"name": "Tea", "stock": "7"}], RESTOCK, MENU_ITEMS, INVENTORY)
+
+    assert plan.restocks == {"Tea": 12}
+    menu_items, inventory = dict(MENU_ITEMS), dict(INVENTORY)
+    assert plan.apply(menu_items, inventory) == ["Tea"]
+    assert inventory["Tea"] == 112
+
+
+def test_any_problem_stops_the_whole_file():
+    plan = plan_import([{"name": "Muffin", "price": "60"}, {"name": "", "price": "1"},
+                        {"name": "Scone", "price": "abc"}, {"name": "Pie", "price": "0"},
+                        {"name": "Muffin", "price": "61"}, {"name": "Bun", "price": "5", "stock": "-1"}],
+                       MENU, MENU_ITEMS, INVENTORY)
+
+    assert [problem.split(":")[0] for problem in plan.problems] == ["Row 2", "Row 3", "Row 4", "Row 5", "Row 6"]
+    assert not plan
+    assert "nothing was imported" in plan.summary()
+
+
+def test_restock_quantities_must_be_positive_whole_numbers():
+    plan = plan_import([{"name": "Tea", "stock": "0"}, {"name": "Cake", "stock": "1.5"}], RESTOCK, MENU_ITEMS,
+                       INVENTORY)
+
+    assert len(plan.problems) == 2
+    assert plan.restocks == {}
+
+
+def test_reads_csv_and_json_with_other_column_names(data_dir):
+    with open("prices.csv", "w") as file:
+        file.write("Item,Price,Qty\nMuffin,60,12\n")
+    with open("prices.json", "w") as file:
+        json.dump({"items": [{"item": "Muffin", "price": 60, "quantity": 12}]}, file)
+
+    for path in ("prices.csv", "prices.json"):
+        plan = bulk_import.plan_file(path, MENU, MENU_ITEMS, INVENTORY)
+        assert plan.prices == {"Muffin": 6000}
+        assert plan.new_stock == {"Muffin": 12}
+
+
+def test_unreadable_file_is_one_problem(data_dir):
+    plan = bulk_import.plan_file("missing.csv", MENU, MENU_ITEMS, INVENTORY)
+    assert len(plan.problems) == 1
+
+
+@pytest.mark.parametrize("name", ["Chai, Large", "Chai: Special", "Chai; Special", "Chai\nSpecial",
+                                  "Chai\rSpecial"])
+def test_names_that_would_break_an_order_line_are_refused(name):
+    plan = plan_import([{"name": "Muffin", "price": "60"}, {"name": name, "price": "40"}], MENU, MENU_ITEMS,
+                       INVENTORY)
+
+    assert len(plan.problems) == 1
+    assert plan.problems[0].startswith("Row 2")
+    assert plan.prices == {}
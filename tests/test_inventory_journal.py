@@ -0,0 +1,75 @@
+import inventory_journal
+from inventory_journal import InventoryJournal
+
+
+def write_snapshot(path, stock):
+    with open(path, "w") as file:
+        file.writelines(f"{item},{quantity}\n" for item, quantity in stock.items())
+
+
+def test_changes_survive_a_reload(data_dir):
+    write_snapshot("inventory.txt", {"Milk": 1000, "Tea": 50})
+    journal = InventoryJournal("inventory.txt")
+    journal.load()
+    journal.append([(inventory_journal.SALE, "Milk", 200, "2024-01-31 15:00:00", "ORD0001"),
+                    (inventory_journal.RESTOCK, "Tea", 10, "2024-01-31 15:30:00", "")])
+    journal.record_adjust("Milk", -50, reason="spilt")
+
+    assert InventoryJournal("inventory.txt").load() == {"Milk": 750, "Tea": 60}
+
+
+def test_compaction_keeps_the_stock_and_empties_the_journal(data_dir):
+    write_snapshot("inventory.txt", {"Milk": 1000})
+    journal = InventoryJournal("inventory.txt", compact_every=3)
+    journal.load()
+    for number in range(5):
+        journal.append([(inventory_journal.SALE, "Milk", 10, f"2024-01-31 15:0{number}:00", "")])
+
+    # Compacted after the third record, two are left in the journal
+    assert journal.generation == 1
+    assert journal.pending == 2
+    assert InventoryJournal("inventory.txt").load() == {"Milk": 950}
+    journal.compact()
+    assert journal.pending == 0
+    assert InventoryJournal("inventory.txt").load() == {"Milk": 950}
+
+
+def test_journal_of_an_older_generation_is_ignored(data_dir):
+    write_snapshot("inventory.txt", {"Milk": 1000})
+    journal = InventoryJournal("inventory.txt")
+    journal.load()
+    journal.append([(inventory_journal.SALE, "Milk", 100)])
+    with open(journal.journal_path) as file:
+        stale = file.read()
+    journal.compact()
+    # A crash after the snapshot was written but before the journal was reset
+    with open(journal.journal_path, "w") as file:
+        file.write(stale)
+
+    assert InventoryJournal("inventory.txt").load() == {"Milk": 900}
+
+
+def test_half_written_record_is_dropped(data_dir):
+    write_snapshot("inventory.txt", {"Milk": 1000})
+    journal = InventoryJournal("inventory.txt")
+    journal.load()
+    journal.append([(inventory_journal.SALE, "Milk", 100)])
+    with open(journal.journal_path, "a") as file:
+        file.write("sale,Milk,5")
+
+    assert InventoryJournal("inventory.txt").load() == {"Milk": 900}
+
+
+def test_stock_at_reads_back_through_compactions(data_dir):
+    write_snapshot("inventory.txt", {"Milk": 1000})
+    journal = InventoryJournal("inventory.txt", compact_every=2)
+    journal.load()
+    for hour in range(10, 16):
+        journal.append([(inventory_journal.SALE, "Milk", 100, f"2024-01-31 {hour}:00:00", "")])
+
+    assert journal.stock_at("2024-01-31 09:00:00") == {"Milk": 1000}
+    assert journal.stock_at("2024-01-31 10:00:00") == {"Milk": 900}
+    assert journal.stock_at("2024-01-31 12:30:00") == {"Milk": 700}
+    assert journal.stock_at("2024-01-31 15:00:00") == {"Milk": 400}
+    assert journal.stock_at("2024-02-01") == {"Milk": 400}
+    assert [event[3] for event in journal.iter_events(item="Milk")] == [100] * 6
@@ -0,0 +1,36 @@
+import pytest
+
+import money
+
+
+@pytest.mark.parametrize("text, paisa", [
+    ("50", 5000),
+    ("49.5", 4950),
+    ("49.50", 4950),
+    ("0.05", 5),
+    ("-12.30", -1230),
+    ("+7", 700),
+    (" 3.00 ", 300),
+    # Floats written by older versions
+    ("50.0", 5000),
+    ("969.9999999999999", 97000),
+    ("1e3", 100000),
+])
+def test_parse(text, paisa):
+    assert money.parse(text) == paisa
+
+
+@pytest.mark.parametrize("text", ["", "abc", "--1", "1.2.3", "1,50", "nan", "inf"])
+def test_parse_rejects(text):
+    with pytest.raises(ValueError):
+        money.parse(text)
+
+
+@pytest.mark.parametrize("paisa, text", [(4950, "49.50"), (5, "0.05"), (0, "0.00"), (-1230, "-12.30")])
+def test_text(paisa, text):
+    assert money.text(paisa) == text
+
+
+@pytest.mark.parametrize("paisa", [0, 1, 99, 100, 4950, 123456789, -5, -4950])
+def test_text_round_trip(paisa):
+    assert money.parse(money.text(paisa)) == paisa
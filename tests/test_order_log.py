@@ -0,0 +1,87 @@
+import os
+
+import order_log
+
+
+def order_line(seq, timestamp="2024-01-31 14:05:09", customer="Ali", items=None, status="Completed"):
+    if items is None:
+        items = [{"name": "Tea", "quantity": 2, "price": 3000}, {"name": "Cake", "quantity": 1, "price": 8050}]
+    total = sum(item["quantity"] * item["price"] for item in items)
+    return order_log.format_order_line(f"ORD{seq:04d}", timestamp, customer, items, total, status)
+
+
+def test_format_and_parse_round_trip():
+    items = [{"name": "Tea", "quantity": 2, "price": 3000}, {"name": "Cake", "quantity": 1, "price": 8050}]
+    line = order_log.format_order_line("ORD0042", "2024-01-31 14:05:09", "Ali", items, 14050, "Completed")
+    assert order_log.parse_order_line(line) == {
+        "id": "ORD0042", "timestamp": "2024-01-31 14:05:09", "customer": "Ali",
+        "items": items, "total": 14050, "status": "Completed"}
+
+
+def test_parse_skips_blank_and_short_lines():
+    assert order_log.parse_order_line("\n") is None
+    assert order_log.parse_order_line("ORD0001,2024-01-31 14:05:09\n") is None
+
+
+def test_append_indexes_and_reads_back(data_dir):
+    log = "orders.txt"
+    offsets = order_log.append_orders(log, [order_line(seq) for seq in range(1, 6)], sync=True)
+
+    assert offsets[0] == 0
+    assert os.path.exists(order_log.index_path(log))
+    assert order_log.order_count(log) == 5
+    assert order_log.next_order_seq(log) == 6
+    assert order_log.read_order(log, "ORD0003")["items"][1] == {"name": "Cake", "quantity": 1, "price": 8050}
+    assert order_log.read_order(log, "ORD0099") is None
+    assert [order["id"] for order in order_log.iter_orders(log)] == [f"ORD{seq:04d}" for seq in range(1, 6)]
+
+
+def test_index_catches_up_with_lines_appended_behind_its_back(data_dir):
+    log = "orders.txt"
+    order_log.append_orders(log, [order_line(1), order_line(2)])
+    # An older version appends without touching the index
+    with open(log, "a") as file:
+        file.write(order_line(3))
+
+    assert order_log.order_count(log) == 3
+    assert order_log.next_order_seq(log) == 4
+    assert order_log.read_order(log, "ORD0003")["id"] == "ORD0003"
+
+
+def test_rebuilt_index_matches_appended_one(data_dir):
+    log = "orders.txt"
+    order_log.append_orders(log, [order_line(seq) for seq in range(1, 4)])
+    with open(order_log.index_path(log), "rb") as file:
+        appended = file.read()[order_log.INDEX_HEADER.size:]
+
+    order_log.rebuild_index(log)
+    with open(order_log.index_path(log), "rb") as file:
+        rebuilt = file.read()[order_log.INDEX_HEADER.size:]
+    assert rebuilt == appended
+
+
+def test_filters_by_time_customer_and_status(data_dir):
+    log = "orders.txt"
+    order_log.append_orders(log, [
+        order_line(1, "2024-01-30 09:00:00", "Ali"),
+        order_line(2, "2024-01-31 10:00:00", "Sara"),
+        order_line(3, "2024-01-31 11:00:00", "ali", status="Paid"),
+        order_line(4, "2024-02-01 08:00:00", "Ali"),
+    ])
+
+    def ids(**filters):
+        return [order["id"] for order in order_log.iter_orders(log, **filters)]
+
+    assert ids(since="2024-01-31", until="2024-02-01") == ["ORD0002", "ORD0003"]
+    assert ids(customer="ALI") == ["ORD0001", "ORD0003", "ORD0004"]
+    assert ids(status="Paid") == ["ORD0003"]
+
+
+def test_summaries_skip_to_a_page(data_dir):
+    log = "orders.txt"
+    order_log.append_orders(log, [order_line(seq, f"2024-01-31 10:{seq:02d}:00") for seq in range(1, 11)])
+
+    page = list(order_log.iter_order_summaries(log, skip=4))[:3]
+    assert [summary["id"] for summary in page] == ["ORD0005", "ORD0006", "ORD0007"]
+    newest = list(order_log.iter_order_summaries(log, newest_first=True, skip=2))[:2]
+    assert [summary["id"] for summary in newest] == ["ORD0008", "ORD0007"]
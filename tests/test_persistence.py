@@ -0,0 +1,54 @@
+import threading
+
+import persistence
+
+
+class FakeStore:
+    def __init__(self):
+        self.saved = []
+        self.closed = False
+
+    def commit_orders(self, orders):
+        self.saved.extend(order["id"] for order in orders)
+        return [None] * len(orders)
+
+    def save_inventory(self, inventory):
+        self.saved.append(dict(inventory))
+
+    def close(self):
+        self.closed = True
+
+
+def test_jobs_are_saved_in_order_and_answered():
+    store = FakeStore()
+    results = []
+    writer = persistence.BackgroundWriter(lambda: store)
+    writer.submit_order({"id": "ORD0001"}, results.append)
+    writer.submit_inventory({"Tea": 5}, results.append)
+    writer.submit_order({"id": "ORD0002"}, results.append)
+    writer.close()
+
+    assert results == [None, None, None]
+    assert store.saved == ["ORD0001", {"Tea": 5}, "ORD0002"]
+    assert store.closed
+
+
+def test_every_job_fails_when_the_store_cannot_be_opened():
+    error = OSError("data directory is gone")
+
+    def open_store():
+        raise error
+
+    woken = threading.Event()
+    results = []
+    writer = persistence.BackgroundWriter(open_store, notify=woken.set)
+    writer.submit_order({"id": "ORD0001"}, results.append)
+    assert woken.wait(5)
+    writer.poll()
+    # Jobs submitted after the failure are answered too
+    writer.submit_menu_item("Muffin", 6000, 12, results.append)
+    writer.submit_order({"id": "ORD0002"}, results.append)
+    writer.close()
+
+    assert results == [error, error, error]
+    assert not writer.thread.is_alive()
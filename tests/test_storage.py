@@ -0,0 +1,82 @@
+import pytest
+
+import order_log
+import storage
+from order_book import make_order
+
+
+@pytest.fixture(params=["text", "sqlite"])
+def store(request, data_dir):
+    store = storage.open_storage(request.param)
+    store.initialize()
+    yield store
+    store.close()
+
+
+def sale(seq, quantity, name="Tea", price=3000):
+    return make_order(f"ORD{seq:04d}", "Ali", [{"name": name, "quantity": quantity, "price": price}],
+                      price * quantity, "Completed", "2024-01-31 14:05:09")
+
+
+def test_commit_orders_saves_and_takes_stock(store):
+    before = store.load_inventory()["Tea"]
+    assert store.commit_orders([sale(1, 2), sale(2, 3)]) == [None, None]
+
+    assert store.load_inventory()["Tea"] == before - 5
+    assert [order["id"] for order in store.iter_orders()] == ["ORD0001", "ORD0002"]
+    assert store.read_order("ORD0002") == sale(2, 3)
+    assert store.next_order_seq() == 3
+
+
+def test_short_sale_is_refused_without_failing_the_batch(store):
+    before = store.load_inventory()["Tea"]
+    errors = store.commit_orders([sale(1, 2), sale(2, before), sale(3, 1)])
+
+    assert errors[0] is None and errors[2] is None
+    assert isinstance(errors[1], storage.StockError)
+    assert store.load_inventory()["Tea"] == before - 3
+    assert [order["id"] for order in store.iter_orders()] == ["ORD0001", "ORD0003"]
+
+
+def test_failed_save_gives_the_stock_back(store, monkeypatch):
+    before = store.load_inventory()
+
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+
+    with monkeypatch.context() as patch:
+        if store.name == "text":
+            patch.setattr(order_log, "append_orders", fail)
+        else:
+            patch.setattr(store, "_insert_order", fail)
+        with pytest.raises(OSError):
+            store.commit_orders([sale(1, 2), sale(2, 1)])
+
+    assert store.load_inventory() == before
+    assert list(store.iter_orders()) == []
+
+
+def test_saved_orders_are_not_failed_by_the_catch_up(store, monkeypatch):
+    if store.name != "text":
+        pytest.skip("SQLite catches up in the sale's transaction")
+
+    def fail():
+        raise RuntimeError("catch-up failed")
+
+    monkeypatch.setattr(store, "_rollups", fail)
+    monkeypatch.setattr(store, "_search", fail)
+    assert store.commit_orders([sale(1, 1)]) == [None]
+    assert [order["id"] for order in store.iter_orders()] == ["ORD0001"]
+
+
+def test_both_backends_page_the_same(data_dir):
+    pages = []
+    for backend in ("text", "sqlite"):
+        store = storage.open_storage(backend)
+        store.initialize()
+        try:
+            store.commit_orders([sale(seq, 1) for seq in range(1, 8)])
+            pages.append([summary["id"] for summary in store.order_page(2, 3, descending=False)])
+        finally:
+            store.close()
+    assert pages == [["ORD0003", "ORD0004", "ORD0005"]] * 2